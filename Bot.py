@@ -1,3 +1,4 @@
+import importlib
 import os
 import sys
 import time
@@ -14,17 +15,13 @@ from database.Database import Database
 from enums import TradeSignals
 from enums.EntryMode import EntryMode
 from enums.TradeSignals import TradeSignals
-# from strategies.ScalpEmaRsiAdx import ScalpEmaRsiAdx
-# from strategies.MACD import MACD
-# from strategies.UltimateScalper import UltimateScalper
-from strategies.ScalpEmaRsiAdx import ScalpEmaRsiAdx
-from strategies.MACD import MACD
-from strategies.UltimateScalper import UltimateScalper
 from exchange.ExchangeBybit import ExchangeBybit
 from logging_.Logger import Logger
+from logging_.StartupProfile import StartupProfile
 from telegram_.TelegramBot import TelegramBot
 from trade_entry.LimitEntry import LimitEntry
 from trade_entry.MarketEntry import MarketEntry
+from trade_entry.TradeEntryTask import TradeEntryTask
 
 
 class Bot:
@@ -37,6 +34,9 @@ class Bot:
     # If Bot crashes it will try to restart itself in 30 seconds
     RESTART_DELAY = 30
 
+    # On exit, maximum time in seconds we wait for a running trade entry to abort
+    ENTRY_TASK_EXIT_TIMEOUT = 30
+
     def __init__(self):
         self._logger = Logger.get_module_logger(__name__)
         self._config = Configuration.get_config()
@@ -51,39 +51,91 @@ class Bot:
         self._last_throttle_start_time = 0.0
         self.throttle_secs = self._config['bot']['throttle_secs']
 
+        # Trade entry running in the background, None when no entry is in progress
+        self._entry_task = None
+        self._closed = False
+
+        with StartupProfile.phase('strategy_import'):
+            strategy_class = self.get_strategy_class(self._config['strategy']['name'])
+
         if self._config['strategy']['name'] == 'UltimateScalper':
             self._exchange = ExchangeBybit(extra_interval='1m')
         else:
             self._exchange = ExchangeBybit()
 
-        self.db = Database(self._exchange)
-        self._position = Position(self.db, self._exchange)
-        self._wallet = WalletUSDT(self._exchange)
+        with StartupProfile.phase('database'):
+            self.db = Database(self._exchange)
+        sync_interval_secs = self._config['database'].get('sync_interval_secs', 0)
+        if sync_interval_secs:
+            self.db.start_periodic_sync([self.pair], sync_interval_secs)
+        with StartupProfile.phase('position_wallet'):
+            self._position = Position(self.db, self._exchange)
+            self._wallet = WalletUSDT(self._exchange)
         self._logger.info(f'{self._wallet.to_string()}')
-        self.strategy = globals()[self._config['strategy']['name']](self.db, self._exchange)
+        with StartupProfile.phase('strategy'):
+            self.strategy = strategy_class(self.db, self._exchange)
         self._logger.info(f'Trading Settings:\n' + rapidjson.dumps(self._config['trading'], indent=2))
         self._logger.info(f'Limit Entry Settings:\n' + rapidjson.dumps(self._config['limit_entry'], indent=2))
+        self._logger.info(StartupProfile.to_string())
+
+    # Only the strategy used is imported, with its dependencies (talib, ...).
+    # The strategy class has the name of its module: strategies/<name>.py
+    @staticmethod
+    def get_strategy_class(name):
+        module = importlib.import_module(f'strategies.{name}')
+        return getattr(module, name)
 
     # Heart of the Bot. Work done at each iteration.
     def run(self):
-        # Check for an entry signal
+        # Check for an entry signal.
+        # Candles and indicators keep being refreshed while a trade entry is running in the background.
         df, signal = self.strategy.find_entry()
+        signal_time = time.perf_counter()
+
+        if self._entry_task:
+            self.check_entry_task(signal)
 
-        # Check if we received an entry signal and that we are not in an open position
+        # Check if we received an entry signal, that no trade entry is running and that we are not in an open position
         if signal['Signal'] in [TradeSignals.EnterLong, TradeSignals.EnterShort] \
+                and not self._entry_task \
                 and not self._position.currently_in_position():
             # Bot.beep(5, 2500, 100)
-            df_print = df.drop(columns=['start', 'end', 'timestamp'], axis=1)
-            self._logger.info(f'\n{df_print.round(2).tail(10).to_string()} \n')
+            self._logger.info(Logger.lazy_dataframe(df, drop_columns=['start', 'end', 'timestamp']))
             self._logger.info(f"{signal['Signal']}: {rapidjson.dumps(signal, indent=2)}")
-            self.enter_trade(signal)
+            self.enter_trade(signal, signal_time)
 
-    def enter_trade(self, signal):
+    def enter_trade(self, signal, signal_time=None):
         entry_mode = self._config['trading']['trade_entry_mode']
         if entry_mode == EntryMode.Taker:
-            qty, avg_price = MarketEntry(self.db, self._exchange, self._position, signal).enter_trade()
+            trade_entry = MarketEntry(self.db, self._exchange, self._position, signal)
         elif entry_mode == EntryMode.Maker:
-            qty, avg_price = LimitEntry(self.db, self._exchange, self._position, signal).enter_trade()
+            trade_entry = LimitEntry(self.db, self._exchange, self._position, signal)
+        trade_entry.signal_time = signal_time
+        self._entry_task = TradeEntryTask(trade_entry).start()
+
+    def check_entry_task(self, signal):
+        """
+            Poll the trade entry running in the background.
+             - When the entry is completed, the task is released so that a new entry can start.
+             - When a new opposing signal is received, the running entry is asked to abort.
+        """
+        task = self._entry_task
+        if not task.is_running():
+            self._entry_task = None
+            if task.exception:
+                raise task.exception
+            return
+
+        if signal['Signal'] in [TradeSignals.EnterLong, TradeSignals.EnterShort] \
+                and signal['Signal'] != task.signal['Signal']:
+            task.cancel(f"New opposing {signal['Signal']} signal received [{signal['OrderLinkId']}].")
+
+    def stop_entry_task(self, reason):
+        if self._entry_task and self._entry_task.is_running():
+            self._entry_task.cancel(reason)
+            if not self._entry_task.join(self.ENTRY_TASK_EXIT_TIMEOUT):
+                self._logger.error(f'Trade entry did not abort after {self.ENTRY_TASK_EXIT_TIMEOUT}s.')
+        self._entry_task = None
 
     def run_forever(self):
         self._logger.info(f"Starting Main Loop with throttling = {self.throttle_secs} sec.")
@@ -98,21 +150,39 @@ class Bot:
                     sys.stdout.flush()
         except KeyboardInterrupt as e:
             self._logger.info('\n')
+            self.stop_entry_task('Application terminated by user.')
             self.db.sync_all_tables([self.pair])
+            self.close()
             self._logger.info("Application Terminated by User.")
         except (websocket.WebSocketTimeoutException,
                 websocket.WebSocketAddressException,
                 pybit.exceptions.FailedRequestError) as e:
             self._logger.exception(e)
+            # The entry thread is a daemon, it would die with the process, leaving an order without tp/sl
+            self.stop_entry_task(f'Bot crashed: {e.__class__.__name__}.')
+            # restart() does not return, the finally clause would not run
+            self.close()
             self._logger.error(f"Bot Crashed. Restart in {self.RESTART_DELAY} seconds")
             TelegramBot.send_to_group(f"Application crashed. {str(e)}\n{traceback.format_exc()}")
             TelegramBot.send_to_group(f"Bot Crashed. Restart in {self.RESTART_DELAY} seconds")
             self.restart(self.RESTART_DELAY)
         except Exception as e:
             self._logger.exception(e)
+            self.stop_entry_task(f'Bot crashed: {e.__class__.__name__}.')
             # TelegramBot.send_to_group(f'Application crashed. {str(e)}\n{traceback.format_exc()}')
             # Bot.beep(1, 500, 2000)
             raise e
+        finally:
+            # The database writer is a daemon thread: flush the queued writes on every exit, a crash included
+            self.close()
+
+    def close(self):
+        """ Flush the queued database writes and the recorded market data. Only the first call closes. """
+        if self._closed:
+            return
+        self._closed = True
+        self.db.close()
+        self._exchange.close_recorder()
 
     def throttle(self, func: Callable[..., Any], throttle_secs: float, *args, **kwargs) -> Any:
         """
@@ -178,6 +248,9 @@ class Bot:
         # print("sys.executable was", sys.executable)
         self._logger.error(f"restarting in {nb_seconds} seconds ...")
         time.sleep(nb_seconds)
+        # execv does not run the exit handlers, send the queued messages and write the queued log records first
+        TelegramBot.flush()
+        Logger.stop()
         os.execv(sys.executable, ['python'] + sys.argv)
 
 
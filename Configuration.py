@@ -2,8 +2,6 @@ import logging
 import sys
 
 import rapidjson
-from jsonschema import validate
-from jsonschema.exceptions import SchemaError, ValidationError
 
 import constants
 
@@ -19,6 +17,9 @@ class Configuration:
 
     @classmethod
     def load_config_file(cls):
+        # Imported here, only needed once
+        from jsonschema import validate
+        from jsonschema.exceptions import SchemaError, ValidationError
         schema = constants.CONFIG_SCHEMA
         try:
             # Convert json to python object.
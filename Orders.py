@@ -23,6 +23,8 @@ class Order:
         self.close_on_trigger = False
         self.reduce_only = reduce_only
         self.leaves_qty = 0
+        # time.perf_counter() of the signal for the first order of a trade entry, to measure the signal to wire time
+        self.signal_time = None
 
     def to_string(self):
         if self.order_id:
@@ -92,6 +94,21 @@ class Orders:
     """
     def place_order(self, order, reason=''):
         result = self.exchange.place_order(order)
+        return self.process_placed_order(order, result, reason)
+
+    # Orders placed in parallel, returns the result of each order, None when rejected.
+    # With return_exceptions, a failed order returns its exception, the placed orders are still processed.
+    def place_orders(self, orders, reason='', return_exceptions=False):
+        results = self.exchange.place_orders(orders, return_exceptions=True)
+        results = [result if isinstance(result, Exception) else self.process_placed_order(order, result, reason)
+                   for order, result in zip(orders, results)]
+        if not return_exceptions:
+            errors = [r for r in results if isinstance(r, Exception)]
+            if errors:
+                raise errors[0]
+        return results
+
+    def process_placed_order(self, order, result, reason):
         if result:
             order.order_id = result['order_id']
             # result['reason'] = reason
@@ -84,13 +84,100 @@ CONFIG_SCHEMA = {
                 'market_type': {'type': 'string', 'enum': MARKET_TYPES},
                 'pair': {'type': 'string'},
                 'stake_currency': {'type': 'string'},
+                'paper_trading': {
+                    'type': 'object',
+                    'properties': {
+                        'enable': {'type': 'boolean', 'default': False},
+                        'balance': {'type': 'number', 'exclusiveMinimum': 0, 'default': 10000}
+                    },
+                    'required': ['enable']
+                },
+                'recorder': {
+                    'type': 'object',
+                    'properties': {
+                        'enable': {'type': 'boolean', 'default': False},
+                        'path': {'type': 'string', 'default': 'recordings'}
+                    },
+                    'required': ['enable']
+                },
+                'replay': {
+                    'type': 'object',
+                    'properties': {
+                        'enable': {'type': 'boolean', 'default': False},
+                        'file': {'type': 'string'},
+                        'speed': {'type': 'number', 'minimum': 0, 'default': 1}
+                    },
+                    'required': ['enable']
+                },
+                # Instruments and account settings kept across restarts, see exchange/ExchangeCache.py
+                'cache': {
+                    'type': 'object',
+                    'properties': {
+                        'enable': {'type': 'boolean', 'default': False},
+                        'path': {'type': 'string', 'default': 'data/exchange_cache.json'},
+                        'instruments_ttl_secs': {'type': 'number', 'minimum': 0, 'default': 3600},
+                        'settings_ttl_secs': {'type': 'number', 'minimum': 0, 'default': 86400}
+                    },
+                    'required': ['enable']
+                },
+                'local_server': {
+                    'type': 'object',
+                    'properties': {
+                        'enable': {'type': 'boolean', 'default': False},
+                        'host': {'type': 'string', 'default': '127.0.0.1'},
+                        'port': {'type': 'integer', 'minimum': 1, 'maximum': 65535, 'default': 8090}
+                    },
+                    'required': ['enable']
+                },
                 'http': {
                     'type': 'object',
                     'properties': {
                         'linear_testnet': {'type': 'string', 'format': 'uri'},
                         'linear_mainnet': {'type': 'string', 'format': 'uri'},
                         'linear_mainnet2': {'type': 'string', 'format': 'uri'},
-                        'timeout': {'type': 'integer', 'minimum': 0}
+                        'timeout': {'type': 'integer', 'minimum': 0},
+                        'order_timeout': {'type': 'number', 'exclusiveMinimum': 0},
+                        # Requests wait for the limit of their endpoint, see pybit/ratelimit.py
+                        'client_rate_limit': {'type': 'boolean', 'default': False},
+                        # Part of each limit the history requests leave to the others
+                        'rate_limit_reserve': {'type': 'number', 'minimum': 0, 'maximum': 1, 'default': 0.2},
+                        # Backoff, deadline per endpoint and circuit breaker, see pybit/retry.py
+                        'retry_policy': {
+                            'type': 'object',
+                            'properties': {
+                                'enable': {'type': 'boolean', 'default': False},
+                                'failure_threshold': {'type': 'integer', 'minimum': 1, 'default': 5},
+                                'cooldown_secs': {'type': 'number', 'minimum': 0, 'default': 10}
+                            },
+                            'required': ['enable']
+                        },
+                        # Offset to the server clock for the signed timestamps, see pybit/clock.py
+                        'clock_sync': {
+                            'type': 'object',
+                            'properties': {
+                                'enable': {'type': 'boolean', 'default': False},
+                                'interval_secs': {'type': 'number', 'minimum': 1, 'default': 300}
+                            },
+                            'required': ['enable']
+                        },
+                        'endpoint_selection': {
+                            'type': 'object',
+                            'properties': {
+                                'enable': {'type': 'boolean', 'default': False},
+                                'interval_secs': {'type': 'number', 'minimum': 1, 'default': 60},
+                                'hedge': {'type': 'boolean', 'default': False},
+                                'hedge_min_secs': {'type': 'number', 'minimum': 0, 'default': 0.05}
+                            },
+                            'required': ['enable']
+                        },
+                        'keep_warm': {
+                            'type': 'object',
+                            'properties': {
+                                'enable': {'type': 'boolean', 'default': False},
+                                'interval_secs': {'type': 'number', 'minimum': 1, 'default': 15}
+                            },
+                            'required': ['enable']
+                        }
                     },
                     'required': ['timeout']
                 },
@@ -111,11 +198,29 @@ CONFIG_SCHEMA = {
         'database': {
             'type': 'object',
             'properties': {
+                # postgresql: server database, sqlite: embedded database in <path>/<db_name>.sqlite
+                'backend': {'type': 'string', 'enum': ['postgresql', 'sqlite'], 'default': 'postgresql'},
+                'path': {'type': 'string', 'default': 'data'},
+                # Folder of the Parquet copies of the tables, see database.Analytics
+                'analytics_path': {'type': 'string', 'default': 'data/analytics'},
+                # Save all the private order, execution and position events
+                'event_journal': {'type': 'boolean', 'default': False},
+                # Save the candles, and optionally the top of book, received on the live feed
+                'market_data': {
+                    'type': 'object',
+                    'properties': {
+                        'enable': {'type': 'boolean', 'default': False},
+                        'top_of_book': {'type': 'boolean', 'default': False}
+                    },
+                    'required': ['enable']
+                },
                 'db_name': {'type': 'string', 'default': 'CryptoMaker'},
                 'address': {'type': 'string', 'default': 'localhost'},
                 'port': {'type': 'integer', 'default': 5432},
                 'username': {'type': 'string', 'default': 'postgres'},
-                'password': {'type': 'string', 'default': 'postgres'}
+                'password': {'type': 'string', 'default': 'postgres'},
+                # Sync the exchange history tables in the background every sync_interval_secs, 0 to disable
+                'sync_interval_secs': {'type': 'integer', 'minimum': 0, 'default': 0}
             },
             'required': ['db_name', 'address', 'port', 'username', 'password']
         },
@@ -124,14 +229,21 @@ CONFIG_SCHEMA = {
             'properties': {
                 'logging_level': {'type': 'string', 'enum': LOGGING_LEVELS},
                 'debug_file_path': {'type': 'string'},
-                'output_file_path': {'type': 'string'}
+                'output_file_path': {'type': 'string'},
+                # Rotate the debug file at this size, the old files are compressed. 0: no rotation.
+                'debug_file_max_mb': {'type': 'number', 'minimum': 0, 'default': 0},
+                'debug_file_backups': {'type': 'integer', 'minimum': 1, 'default': 10}
             },
             'required': ['logging_level', 'debug_file_path', 'output_file_path']
         },
         'telegram': {
             'type': 'object',
             'properties': {
-                'enable': {'type': 'boolean', 'default': False}
+                'enable': {'type': 'boolean', 'default': False},
+                # Messages waiting to be sent, the low priority ones are dropped first when it is full
+                'queue_size': {'type': 'integer', 'minimum': 1, 'default': 100},
+                # Minimum time between 2 messages, the messages queued meanwhile are sent together
+                'min_interval_secs': {'type': 'number', 'minimum': 0, 'default': 3}
             },
             'required': ['enable']
         }
@@ -0,0 +1,93 @@
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from Configuration import Configuration
+from logging_.Logger import Logger
+
+"""
+    Analytical copy of the database tables, for research and reports.
+
+    The tables of the operational database (Postgres or SQLite, see database.StorageBackend) are exported
+    to Parquet files, one per table, and queried with DuckDB. Nothing is read from the operational
+    database while querying, the bot is not slowed down by large analytical queries.
+    Optional dependencies: pyarrow (Parquet) and duckdb (queries).
+
+    config.json, 'database' section: "analytics_path", folder of the Parquet files (default data/analytics)
+
+    Usage:
+        python -m database.Analytics export
+        python -m database.Analytics query "SELECT symbol, sum(closed_pnl) FROM ClosedPnL GROUP BY symbol"
+"""
+
+
+class Analytics:
+    ANALYTICS_PATH = 'data/analytics'
+
+    def __init__(self, path=None):
+        self._logger = Logger.get_module_logger(__name__)
+        self.path = path if path else Configuration.get_config()['database'].get('analytics_path',
+                                                                                  self.ANALYTICS_PATH)
+
+    def parquet_file(self, table_name):
+        return os.path.join(self.path, f'{table_name}.parquet')
+
+    def table_names(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(f[:-len('.parquet')] for f in os.listdir(self.path) if f.endswith('.parquet'))
+
+    # Export the tables of the operational database. The files are replaced atomically.
+    def export(self, db, table_names=None):
+        os.makedirs(self.path, exist_ok=True)
+        if table_names is None:
+            table_names = [db.TRADE_SIGNALS_TBL_NAME, db.ORDERS_TBL_NAME, db.CLOSED_PNL_TBL_NAME,
+                           db.USER_TRADES_TBL_NAME, db.COND_ORDERS_TBL_NAME]
+        for table_name in table_names:
+            start = time.time()
+            with db.engine.connect() as connection:
+                df = pd.read_sql_table(table_name, connection, schema=db.backend.schema)
+            tmp_file = self.parquet_file(table_name) + '.tmp'
+            df.to_parquet(tmp_file, index=False)
+            os.replace(tmp_file, self.parquet_file(table_name))
+            self._logger.info(f'Exported {len(df)} {table_name} rows in {time.time() - start:.2f}s.')
+
+    # DuckDB connection with one view per exported table
+    def connect(self):
+        import duckdb
+        connection = duckdb.connect()
+        for table_name in self.table_names():
+            connection.execute(f'CREATE VIEW "{table_name}" AS '
+                               f'SELECT * FROM read_parquet(\'{self.parquet_file(table_name)}\')')
+        return connection
+
+    def query(self, sql):
+        connection = self.connect()
+        try:
+            return connection.execute(sql).df()
+        finally:
+            connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analytical copy of the database tables.')
+    parser.add_argument('command', choices=['export', 'query'])
+    parser.add_argument('sql', nargs='?')
+    args = parser.parse_args()
+
+    analytics = Analytics()
+    if args.command == 'export':
+        from database.Database import Database
+        db = Database(None)
+        try:
+            analytics.export(db)
+        finally:
+            db.close()
+    else:
+        print(analytics.query(args.sql).to_string())
+
+
+if __name__ == '__main__':
+    main()
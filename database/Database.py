@@ -1,78 +1,137 @@
-import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import pandas as pd
 import sqlalchemy as sa
 import arrow
 from sqlalchemy import Column, Table, Integer, String, Float, DateTime, BigInteger
 import datetime as dt
 
 import constants
-from enums.BybitEnums import OrderStatus
+from enums.BybitEnums import OrderStatus, StopOrderStatus
 from exchange.ExchangeBybit import ExchangeBybit
 from logging_.Logger import Logger
-from sqlalchemy_utils import database_exists
 from sqlalchemy.engine.reflection import Inspector
 from Configuration import Configuration
+from database.EventJournal import EventJournal
+from database.MarketDataStore import MarketDataStore
+from database.StorageBackend import get_storage_backend
+from database.WriteBehindQueue import WriteBehindQueue
 
 
 class Database:
-    """
-        TODO: Replace all => self.engine.has_table(connection, table_name)
-              by => self.inspector.has_table(table_name, schema='public')
-    """
-    URL_TEMPLATE = 'postgresql://<username>:<password>@<address>:<port>/<db_name>'
-
     # Table Names
     TRADE_SIGNALS_TBL_NAME = 'TradeSignals'
     ORDERS_TBL_NAME = 'Orders'
     CLOSED_PNL_TBL_NAME = 'ClosedPnL'
     USER_TRADES_TBL_NAME = 'UserTrades'
     COND_ORDERS_TBL_NAME = 'CondOrders'
+    SYNC_CURSORS_TBL_NAME = 'SyncCursors'
+
+    # Each sync fetches again the records of the last SYNC_OVERLAP_SECS before the cursor,
+    # in case some were not available yet on Bybit at the time of the previous sync
+    SYNC_OVERLAP_SECS = 60
+
+    # Order statuses that will not change anymore
+    FINAL_ORDER_STATUSES = [OrderStatus.Filled, OrderStatus.Cancelled, OrderStatus.Rejected]
+    FINAL_COND_ORDER_STATUSES = [StopOrderStatus.Triggered, StopOrderStatus.Cancelled, StopOrderStatus.Rejected,
+                                 StopOrderStatus.Deactivated]
+
+    # Sync workers. Each table is fetched from its own Bybit endpoint, at most SYNC_CALLS_PER_TABLE pairs
+    # at a time are synced for a table so the per endpoint rate limits are not hit.
+    SYNC_MAX_WORKERS = 4
+    SYNC_CALLS_PER_TABLE = 2
 
     def __init__(self, exchange):
         self._logger = Logger.get_module_logger(__name__)
         self._config = Configuration.get_config()
         self._exchange = exchange
         self.name = self._config['database']['db_name']
+        # Postgres server or embedded SQLite file, see database.StorageBackend
+        self.backend = get_storage_backend(self._config['database'])
         self.confirm_db_name()
-        self.db_url = self.get_db_url()
-        self.validate_db()
-        self._logger.info(f"Connection to {self.name} database successful.")
-        self.engine = sa.create_engine(self.db_url)
+        self.db_url = self.backend.get_url()
+        self.backend.validate()
+        self._logger.info(f"Connection to {self.name} {self.backend.name} database successful.")
+        self.engine = self.backend.create_engine()
         self.inspector = Inspector.from_engine(self.engine)
         self.metadata = sa.MetaData(self.engine)
+        # Table objects by name, reflected once. See get_table().
+        self._tables = {}
         self.init_tables()
-
+        self.prepare_statements()
+        # Inserts/updates done on the trading path are written in the background
+        self.write_queue = WriteBehindQueue(self.engine)
+        self._sync_table_semaphores = {}
+        self._sync_lock = threading.Lock()
+        self._sync_thread = None
+        self._sync_stop = threading.Event()
+        # Candles and top of book of the live feed, see MarketDataStore
+        self.market_data = None
+        market_data_config = self._config['database'].get('market_data', {})
+        if market_data_config.get('enable', False) and exchange is not None:
+            self.market_data = MarketDataStore(self, top_of_book=market_data_config.get('top_of_book', False))
+            exchange.ws_public.add_listener(self.market_data.listener(exchange.ws_public))
+        # Private order/execution/position events, see EventJournal
+        self.event_journal = None
+        if self._config['database'].get('event_journal', False) and exchange is not None:
+            self.event_journal = EventJournal(self)
+            exchange.ws_private.add_listener(self.event_journal.listener())
+
+    def close(self):
+        """ Stop the periodic sync and flush the pending writes. Call before exiting the application. """
+        self.stop_periodic_sync()
+        self.write_queue.close()
+        if self.market_data:
+            self.market_data.close()
+
+    # Warn if running on testnet with what looks like the production database. Does not block the startup.
     def confirm_db_name(self):
-        # Switch to test database if user forgot to change it
         if self._config['exchange']['testnet'] and 'test' not in self.name.lower():
-            while True:
-                self._logger.info(f'You are running on Testnet. The db_name does not appear to be the test database.')
-                answer = input(f'Please confirm that you wish to continue with db_name={self.name} (y/n): ')
-                if answer in ['y', 'n']:
-                    break
-            if answer == 'n':
-                self._logger.error(f'Please update the config.json with the correct db_name.')
-                sys.exit(0)
-
-    def get_db_url(self):
-        url = self.URL_TEMPLATE.replace('<db_name>', self.name)
-        url = url.replace('<address>', self._config['database']['address'])
-        url = url.replace('<port>', str(self._config['database']['port']))
-        url = url.replace('<username>', self._config['database']['username'])
-        url = url.replace('<password>', self._config['database']['password'])
-        return url
-
-    def validate_db(self):
-        if not database_exists(self.db_url):
-            msg = f'{self.db_url} database does not exists.'
-            raise Exception(msg)
-
-    # Get table object by table name.
+            self._logger.warning(f'You are running on Testnet. The db_name={self.name} does not appear to be '
+                                 f'the test database. Update the config.json if this is not intended.')
+
+    # Get table object by table name. The schema is reflected from the database on the first call only.
     def get_table(self, table_name):
-        table = sa.Table(table_name, self.metadata, autoload=True, autoload_with=self.engine)
+        table = self._tables.get(table_name)
+        if table is None:
+            table = sa.Table(table_name, self.metadata, autoload=True, autoload_with=self.engine)
+            self._tables[table_name] = self.backend.adapt_table(table)
         return table
 
+    def prepare_statements(self):
+        """ Statements executed on the trading path, built once """
+        self.insert_trade_signal_stmt = self.get_table(self.TRADE_SIGNALS_TBL_NAME).insert()
+
+        orders = self.get_table(self.ORDERS_TBL_NAME)
+        # Insert or update: the same order can be saved again after it has been updated (status, fills, ...)
+        upsert = self.backend.insert(orders)
+        self.upsert_order_stmt = upsert.on_conflict_do_update(
+            index_elements=[orders.c.order_id],
+            set_={c.name: upsert.excluded[c.name] for c in orders.columns if c.name != 'order_id'}
+        )
+        self.update_order_stop_loss_stmt = orders.update() \
+            .where(orders.c.order_id == sa.bindparam('b_order_id')) \
+            .values(stop_loss=sa.bindparam('b_stop_loss'))
+
+        # Sync statements: existing rows are skipped (ON CONFLICT DO NOTHING) or updated for orders
+        cond_orders = self.get_table(self.COND_ORDERS_TBL_NAME)
+        upsert = self.backend.insert(cond_orders)
+        self.upsert_cond_order_stmt = upsert.on_conflict_do_update(
+            index_elements=[cond_orders.c.stop_order_id],
+            set_={c.name: upsert.excluded[c.name] for c in cond_orders.columns if c.name != 'stop_order_id'}
+        )
+        self.insert_closed_pnl_stmt = self.backend.insert(self.get_table(self.CLOSED_PNL_TBL_NAME)) \
+            .on_conflict_do_nothing(index_elements=['id'])
+        self.insert_user_trade_stmt = self.backend.insert(self.get_table(self.USER_TRADES_TBL_NAME)) \
+            .on_conflict_do_nothing(index_elements=['exec_id'])
+        sync_cursors = self.get_table(self.SYNC_CURSORS_TBL_NAME)
+        upsert = self.backend.insert(sync_cursors)
+        self.upsert_sync_cursor_stmt = upsert.on_conflict_do_update(
+            index_elements=[sync_cursors.c.table_name, sync_cursors.c.pair],
+            set_={'cursor_time': upsert.excluded.cursor_time, 'updated_at': upsert.excluded.updated_at}
+        )
+
     # Execute a SQL query on the database
     def exec_sql_query(self, query):
         with self.engine.connect() as connection:
@@ -82,7 +141,7 @@ class Database:
                     self._logger.info(f'SQL Query Result: {row}')
 
     def table_name_exists(self, name):
-        return self.inspector.has_table(name, schema='public')
+        return self.inspector.has_table(name, schema=self.backend.schema)
 
     # Create tables if they don't exist
     def init_tables(self):
@@ -91,13 +150,139 @@ class Database:
         self.init_closed_pnl_table()
         self.init_user_trades_table()
         self.init_conditional_orders_table()
+        self.init_sync_cursors_table()
+        for table_name in [self.TRADE_SIGNALS_TBL_NAME, self.ORDERS_TBL_NAME, self.CLOSED_PNL_TBL_NAME,
+                           self.USER_TRADES_TBL_NAME, self.COND_ORDERS_TBL_NAME, self.SYNC_CURSORS_TBL_NAME]:
+            self.get_table(table_name)
+
+    # Sync all the tables of all the pairs from Bybit, using a pool of max_workers threads.
+    # The workers share the connection pool of the engine. Returns the sync time of each table in seconds.
+    def sync_all_tables(self, pairs, max_workers=SYNC_MAX_WORKERS):
+        sync_functions = {
+            self.ORDERS_TBL_NAME: self.sync_all_order_records,
+            self.CLOSED_PNL_TBL_NAME: self.sync_all_closed_pnl_records,
+            self.USER_TRADES_TBL_NAME: self.sync_all_user_trade_records,
+            self.COND_ORDERS_TBL_NAME: self.sync_all_conditional_order_records
+        }
+        # Pair by pair, so the first tasks run on different endpoints
+        tasks = [(pair, table_name) for pair in pairs for table_name in sync_functions]
+        timings = {table_name: 0.0 for table_name in sync_functions}
+
+        # Only one sync at a time, a periodic sync and the sync at exit could overlap
+        with self._sync_lock:
+            for table_name in sync_functions:
+                if table_name not in self._sync_table_semaphores:
+                    self._sync_table_semaphores[table_name] = threading.BoundedSemaphore(self.SYNC_CALLS_PER_TABLE)
+            start = time.time()
+            self._logger.info(f'Syncing {len(sync_functions)} tables for {", ".join(pairs)}.')
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='DatabaseSync') as executor:
+                futures = {executor.submit(self._sync_table, sync_functions[table_name], table_name, pair):
+                           (pair, table_name) for pair, table_name in tasks}
+                for i, future in enumerate(as_completed(futures), 1):
+                    pair, table_name = futures[future]
+                    try:
+                        nb_records, elapsed = future.result()
+                    except Exception as e:
+                        self._logger.error(f'[{i}/{len(tasks)}] {pair} {table_name} sync failed: {e}')
+                        continue
+                    timings[table_name] += elapsed
+                    self._logger.info(f'[{i}/{len(tasks)}] {pair} {table_name}: '
+                                      f'{nb_records} records in {elapsed:.2f}s.')
+            self._logger.info(f'Sync completed in {time.time() - start:.2f}s. '
+                              + ', '.join(f'{t}: {e:.2f}s' for t, e in timings.items()))
+        return timings
+
+    def _sync_table(self, sync_function, table_name, pair):
+        with self._sync_table_semaphores[table_name]:
+            start = time.time()
+            nb_records = sync_function(pair)
+            return nb_records, time.time() - start
+
+    # Sync the tables every interval_secs in a background thread, while the bot is trading
+    def start_periodic_sync(self, pairs, interval_secs):
+        if self._sync_thread:
+            return
+        self._sync_stop.clear()
+        self._sync_thread = threading.Thread(target=self._run_periodic_sync, args=(pairs, interval_secs),
+                                             name='PeriodicDatabaseSync', daemon=True)
+        self._sync_thread.start()
+        self._logger.info(f'Database sync every {interval_secs}s started.')
+
+    def stop_periodic_sync(self):
+        if self._sync_thread:
+            self._sync_stop.set()
+            self._sync_thread.join()
+            self._sync_thread = None
+
+    def _run_periodic_sync(self, pairs, interval_secs):
+        while not self._sync_stop.wait(interval_secs):
+            try:
+                self.sync_all_tables(pairs)
+            except Exception as e:
+                # The next sync resumes from the cursors
+                self._logger.exception(e)
+
+    # Keep only the keys of the records that are columns of the table
+    @staticmethod
+    def table_records(table, dict_list):
+        columns = [c.name for c in table.columns]
+        return [{k: r.get(k) for k in columns} for r in dict_list]
+
+    """
+        -----------------------------------------------------------------------------
+           Sync Cursors
+           Per table and pair, the time up to which the records have been synced from Bybit.
+           A sync only fetches the records more recent than the cursor.
+        -----------------------------------------------------------------------------
+    """
 
-    def sync_all_tables(self, pairs):
-        for pair in pairs:
-            self.sync_all_order_records(pair)
-            self.sync_all_closed_pnl_records(pair)
-            self.sync_all_user_trade_records(pair)
-            self.sync_all_conditional_order_records(pair)
+    def init_sync_cursors_table(self):
+        if not self.table_name_exists(self.SYNC_CURSORS_TBL_NAME):
+            # Create a table with the appropriate Columns
+            table = Table(self.SYNC_CURSORS_TBL_NAME, self.metadata,
+                          Column('table_name', String, nullable=False, primary_key=True),
+                          Column('pair', String, nullable=False, primary_key=True),
+                          Column('cursor_time', DateTime, nullable=False),
+                          Column('updated_at', DateTime, nullable=False)
+                          )
+            self.metadata.create_all()
+
+    # Timestamp in seconds to fetch the records from, None if the table was never synced for this pair
+    def get_sync_cursor(self, table_name, pair):
+        table = self.get_table(self.SYNC_CURSORS_TBL_NAME)
+        with self.engine.connect() as connection:
+            cursor_time = connection.execute(
+                sa.select([table.c.cursor_time])
+                .where(sa.and_(table.c.table_name == table_name, table.c.pair == pair))
+            ).scalar()
+        if cursor_time is None:
+            return None
+        return cursor_time.timestamp() - self.SYNC_OVERLAP_SECS
+
+    # Saved in the transaction of the inserts, so the cursor never gets ahead of the data
+    def set_sync_cursor(self, connection, table_name, pair, cursor_time):
+        connection.execute(self.upsert_sync_cursor_stmt, {
+            'table_name': table_name,
+            'pair': pair,
+            'cursor_time': cursor_time,
+            'updated_at': dt.datetime.now().strftime(constants.DATETIME_FMT)
+        })
+
+    # Write the synced records and move the cursor forward, in one transaction
+    def save_synced_records(self, table_name, statement, pair, dict_list, cursor_time):
+        table = self.get_table(table_name)
+        with self.engine.begin() as connection:
+            connection.execute(statement, self.table_records(table, dict_list))
+            self.set_sync_cursor(connection, table_name, pair, cursor_time)
+        self._logger.debug(f'{len(dict_list)} {pair} records synced in {table_name}, cursor at {cursor_time}.')
+        return len(dict_list)
+
+    # Orders can still change until they reach a final status: the next sync starts
+    # at the oldest order not final yet, or after the newest order if they are all final
+    @staticmethod
+    def order_sync_cursor_time(dict_list, final_statuses):
+        pending = [r['created_time'] for r in dict_list if r['order_status'] not in final_statuses]
+        return min(pending) if pending else max(r['created_time'] for r in dict_list)
 
     """
         -----------------------------------------------------------------------------
@@ -106,29 +291,26 @@ class Database:
     """
 
     def init_trade_signals_table(self):
-        with self.engine.connect() as connection:
-            if not self.engine.has_table(connection, self.TRADE_SIGNALS_TBL_NAME):
-                # Create a table with the appropriate Columns
-                table = Table(self.TRADE_SIGNALS_TBL_NAME, self.metadata,
-                              Column('OrderLinkId', String, nullable=False, index=True),
-                              Column('DateTime', DateTime, nullable=False, index=True),
-                              Column('Pair', String, nullable=False),
-                              Column('Interval', String, nullable=False),
-                              Column('Signal', String, nullable=False),
-                              Column('Side', String, nullable=False),
-                              Column('EntryPrice', Float, nullable=False),
-                              Column('Strategy', String, nullable=False),
-                              Column('IndicatorValues', String, nullable=False),
-                              Column('Timestamp', BigInteger, nullable=False)
-                              )
-                self.metadata.create_all()
+        if not self.table_name_exists(self.TRADE_SIGNALS_TBL_NAME):
+            # Create a table with the appropriate Columns
+            table = Table(self.TRADE_SIGNALS_TBL_NAME, self.metadata,
+                          Column('OrderLinkId', String, nullable=False, index=True),
+                          Column('DateTime', DateTime, nullable=False, index=True),
+                          Column('Pair', String, nullable=False),
+                          Column('Interval', String, nullable=False),
+                          Column('Signal', String, nullable=False),
+                          Column('Side', String, nullable=False),
+                          Column('EntryPrice', Float, nullable=False),
+                          Column('Strategy', String, nullable=False),
+                          Column('IndicatorValues', String, nullable=False),
+                          Column('Timestamp', BigInteger, nullable=False)
+                          )
+            self.metadata.create_all()
 
     # Insert trade signals using a list of dictionary
-    # Assuming the table exists
+    # Assuming the table exists. The insert is queued, it does not block the caller.
     def add_trade_signals_dict(self, dict_list):
-        table = self.get_table(self.TRADE_SIGNALS_TBL_NAME)
-        with self.engine.connect() as connection:
-            connection.execute(table.insert(), dict_list)
+        self.write_queue.put(self.insert_trade_signal_stmt, dict_list)
 
     """
         -----------------------------------------------------------------------------
@@ -136,71 +318,51 @@ class Database:
         -----------------------------------------------------------------------------
     """
     def init_orders_table(self):
-        with self.engine.connect() as connection:
-            if not self.engine.has_table(connection, self.ORDERS_TBL_NAME):
-                # Create a table with the appropriate Columns
-                table = Table(self.ORDERS_TBL_NAME, self.metadata,
-                              Column('order_id', String, index=True, nullable=False, primary_key=True),
-                              Column('user_id', String, nullable=False),
-                              Column('symbol', String, nullable=False),
-                              Column('side', String, nullable=False),
-                              # Column('reason', String),
-                              Column('order_type', String, nullable=False),
-                              Column('price', Float, nullable=False),
-                              Column('qty', Float, nullable=False),
-                              Column('time_in_force', String, nullable=False),
-                              Column('order_status', String, nullable=False),
-                              Column('take_profit', Float),
-                              Column('stop_loss', Float),
-                              Column('last_exec_price', Float),
-                              Column('cum_exec_qty', Float),
-                              Column('cum_exec_value', Float),
-                              Column('cum_exec_fee', Float),
-                              Column('order_link_id', String),
-                              Column('reduce_only', String, nullable=False),
-                              Column('close_on_trigger', String, nullable=False),
-                              Column('created_time', DateTime, index=True, nullable=False),
-                              Column('updated_time', DateTime, index=True, nullable=False)
-                              )
-                self.metadata.create_all()
-
-    # Insert orders using a list of dictionary
-    # Assuming the table exists
+        if not self.table_name_exists(self.ORDERS_TBL_NAME):
+            # Create a table with the appropriate Columns
+            table = Table(self.ORDERS_TBL_NAME, self.metadata,
+                          Column('order_id', String, index=True, nullable=False, primary_key=True),
+                          Column('user_id', String, nullable=False),
+                          Column('symbol', String, nullable=False),
+                          Column('side', String, nullable=False),
+                          # Column('reason', String),
+                          Column('order_type', String, nullable=False),
+                          Column('price', Float, nullable=False),
+                          Column('qty', Float, nullable=False),
+                          Column('time_in_force', String, nullable=False),
+                          Column('order_status', String, nullable=False),
+                          Column('take_profit', Float),
+                          Column('stop_loss', Float),
+                          Column('last_exec_price', Float),
+                          Column('cum_exec_qty', Float),
+                          Column('cum_exec_value', Float),
+                          Column('cum_exec_fee', Float),
+                          Column('order_link_id', String),
+                          Column('reduce_only', String, nullable=False),
+                          Column('close_on_trigger', String, nullable=False),
+                          Column('created_time', DateTime, index=True, nullable=False),
+                          Column('updated_time', DateTime, index=True, nullable=False)
+                          )
+            self.metadata.create_all()
+
+    # Insert or update orders using a list of dictionary
+    # Assuming the table exists. The upsert is queued, it does not block the caller.
     def add_order_dict(self, dict_list):
-        table = self.get_table(self.ORDERS_TBL_NAME)
-        with self.engine.connect() as connection:
-            connection.execute(table.insert(), dict_list)
+        self.write_queue.put(self.upsert_order_stmt, dict_list)
 
+    # Queued after the inserts, so it also applies to an order added by add_order_dict() and not written yet
     def update_order_stop_loss_by_id(self, order_id, new_stop_loss):
-        table = self.get_table(self.ORDERS_TBL_NAME)
-        update_statement = table.update().where(table.c.order_id == order_id).values(stop_loss=new_stop_loss)
-        with self.engine.connect() as connection:
-            connection.execute(update_statement)
+        self.write_queue.put(self.update_order_stop_loss_stmt, {'b_order_id': order_id, 'b_stop_loss': new_stop_loss})
 
     def sync_all_order_records(self, pair):
-        self._logger.info(f'Syncing all {pair} Order records.')
-        table = self.get_table(self.ORDERS_TBL_NAME)
-        dict_list = self._exchange.get_all_order_records(pair)
+        self._logger.debug(f'Syncing {pair} Order records.')
+        start_time = self.get_sync_cursor(self.ORDERS_TBL_NAME, pair)
+        dict_list = self._exchange.get_all_order_records(pair, start_time=start_time)
         if dict_list:
-            records_df = pd.DataFrame(dict_list)
-
-            with self.engine.connect() as connection:
-                # Delete all rows in the table that do not have a status of Filled or Cancelled
-                # These orders might have an updated version so we re-insert
-                connection.execute(table.delete().where(
-                    table.c.symbol == pair and
-                    table.c.order_status not in [OrderStatus.Filled, OrderStatus.Cancelled])
-                )
-
-                # Get list of PK (order_id) in the table to not insert already existing rows
-                query = f'SELECT "order_id" FROM public."{self.ORDERS_TBL_NAME}"'
-                existing_ids_list = pd.read_sql(query, connection)['order_id'].tolist()
-
-                # Delete rows that already exist in the db
-                df = records_df[~records_df['order_id'].isin(existing_ids_list)]
-
-                if len(df) > 0:
-                    connection.execute(table.insert(), df.to_dict('records'))
+            # Orders already in the table are updated, their status may have changed since they were saved
+            return self.save_synced_records(self.ORDERS_TBL_NAME, self.upsert_order_stmt, pair, dict_list,
+                                            self.order_sync_cursor_time(dict_list, self.FINAL_ORDER_STATUSES))
+        return 0
 
     """
         -----------------------------------------------------------------------------
@@ -208,61 +370,46 @@ class Database:
         -----------------------------------------------------------------------------
     """
     def init_closed_pnl_table(self):
-        with self.engine.connect() as connection:
-            if not self.engine.has_table(connection, self.CLOSED_PNL_TBL_NAME):
-                # Create a table with the appropriate Columns
-                table = Table(self.CLOSED_PNL_TBL_NAME, self.metadata,
-                              Column('id', Integer, index=True, nullable=False, primary_key=True),
-                              Column('user_id', Integer, index=True, nullable=False),
-                              Column('symbol', String, nullable=False),
-                              Column('order_id', String, index=True, nullable=False),
-                              Column('side', String, nullable=False),
-                              Column('qty', Float, nullable=False),
-                              Column('order_price', Float, nullable=False),
-                              Column('order_type', String, nullable=False),
-                              Column('exec_type', String, nullable=False),
-                              Column('closed_size', Float, nullable=False),
-                              # Closed position value
-                              Column('cum_entry_value', Float, nullable=False),
-                              # Average entry price
-                              Column('avg_entry_price', Float, nullable=False),
-                              # Cumulative trading value of position closing orders
-                              Column('cum_exit_value', Float, nullable=False),
-                              # Average exit price
-                              Column('avg_exit_price', Float, nullable=False),
-                              # Closed Profit and Loss
-                              Column('closed_pnl', Float, nullable=False),
-                              # The number of fills in a single order
-                              Column('fill_count', Integer, nullable=False),
-                              Column('leverage', Float, nullable=False),
-                              Column('created_at', DateTime, index=True, nullable=False)
-                              )
-                self.metadata.create_all()
-
-    # Sync all Closed P&L entries for this pair found on Bybit
-    # Insert Closed P&L contained in a list of dictionaries
-    # Assuming the table exists, inserting only none existing entries
+        if not self.table_name_exists(self.CLOSED_PNL_TBL_NAME):
+            # Create a table with the appropriate Columns
+            table = Table(self.CLOSED_PNL_TBL_NAME, self.metadata,
+                          Column('id', Integer, index=True, nullable=False, primary_key=True),
+                          Column('user_id', Integer, index=True, nullable=False),
+                          Column('symbol', String, nullable=False),
+                          Column('order_id', String, index=True, nullable=False),
+                          Column('side', String, nullable=False),
+                          Column('qty', Float, nullable=False),
+                          Column('order_price', Float, nullable=False),
+                          Column('order_type', String, nullable=False),
+                          Column('exec_type', String, nullable=False),
+                          Column('closed_size', Float, nullable=False),
+                          # Closed position value
+                          Column('cum_entry_value', Float, nullable=False),
+                          # Average entry price
+                          Column('avg_entry_price', Float, nullable=False),
+                          # Cumulative trading value of position closing orders
+                          Column('cum_exit_value', Float, nullable=False),
+                          # Average exit price
+                          Column('avg_exit_price', Float, nullable=False),
+                          # Closed Profit and Loss
+                          Column('closed_pnl', Float, nullable=False),
+                          # The number of fills in a single order
+                          Column('fill_count', Integer, nullable=False),
+                          Column('leverage', Float, nullable=False),
+                          Column('created_at', DateTime, index=True, nullable=False)
+                          )
+            self.metadata.create_all()
+
+    # Sync the Closed P&L entries for this pair found on Bybit, since the last sync
+    # Inserting only none existing entries
     def sync_all_closed_pnl_records(self, pair):
-        self._logger.info(f'Syncing all {pair} Closed P&L records.')
-        table = self.get_table(self.CLOSED_PNL_TBL_NAME)
-        dict_list = self._exchange.get_all_closed_pnl_records(pair)
+        self._logger.debug(f'Syncing {pair} Closed P&L records.')
+        start_time = self.get_sync_cursor(self.CLOSED_PNL_TBL_NAME, pair)
+        dict_list = self._exchange.get_all_closed_pnl_records(pair, start_time=start_time)
         if dict_list:
-            records_df = pd.DataFrame(dict_list)
-
-            # Delete all rows in the table
-            # with self.engine.connect() as connection:
-            #     connection.execute(table.delete())
-
-            # Get list of PK (Id) in the table to not insert already existing rows
-            query = f'SELECT "id" FROM public."{self.CLOSED_PNL_TBL_NAME}"'
-            with self.engine.connect() as connection:
-                existing_ids_list = pd.read_sql(query, connection)['id'].tolist()
-
-                # Delete rows that already exist in the db
-                df = records_df[~records_df['id'].isin(existing_ids_list)]
-
-                if len(df) > 0:
-                    connection.execute(table.insert(), df.to_dict('records'))
+            return self.save_synced_records(self.CLOSED_PNL_TBL_NAME, self.insert_closed_pnl_stmt, pair, dict_list,
+                                            max(r['created_at'] for r in dict_list))
+        return 0
 
     """
         -----------------------------------------------------------------------------
@@ -270,56 +417,47 @@ class Database:
         -----------------------------------------------------------------------------
     """
     def init_user_trades_table(self):
-        with self.engine.connect() as connection:
-            if not self.engine.has_table(connection, self.USER_TRADES_TBL_NAME):
-                # Create a table with the appropriate Columns
-                table = Table(self.USER_TRADES_TBL_NAME, self.metadata,
-                              Column('exec_id', String, nullable=False, index=True),
-                              Column('order_id', String, index=True, nullable=False),
-                              Column('order_link_id', String),
-                              Column('side', String, nullable=False),
-                              Column('symbol', String, nullable=False),
-                              # Column('price', Float),  # Abandoned!!
-                              Column('order_price', Float, nullable=False),
-                              Column('order_qty', Float, nullable=False),
-                              Column('order_type', String, nullable=False),  # OrderType Enum
-                              Column('fee_rate', Float),
-                              Column('exec_price', Float),
-                              Column('exec_type', String, nullable=False),  # ExecType Enum
-                              Column('exec_qty', Float, nullable=False),
-                              Column('exec_fee', Float, nullable=False),
-                              Column('exec_value', Float, nullable=False),
-                              Column('leaves_qty', Float),
-                              # The corresponding closing size of the closing order
-                              Column('closed_size', Float),
-                              # Liquidity Enum, only valid while exec_type is Trade, AdlTrade, BustTrade
-                              Column('last_liquidity_ind', String),
-                              # Column('trade_time', DateTime, index=True, nullable=False),
-                              Column('trade_time_ms', DateTime, index=True, nullable=False)
-                              )
-                self.metadata.create_all()
+        if not self.table_name_exists(self.USER_TRADES_TBL_NAME):
+            # Create a table with the appropriate Columns
+            table = Table(self.USER_TRADES_TBL_NAME, self.metadata,
+                          Column('exec_id', String, nullable=False, index=True),
+                          Column('order_id', String, index=True, nullable=False),
+                          Column('order_link_id', String),
+                          Column('side', String, nullable=False),
+                          Column('symbol', String, nullable=False),
+                          # Column('price', Float),  # Abandoned!!
+                          Column('order_price', Float, nullable=False),
+                          Column('order_qty', Float, nullable=False),
+                          Column('order_type', String, nullable=False),  # OrderType Enum
+                          Column('fee_rate', Float),
+                          Column('exec_price', Float),
+                          Column('exec_type', String, nullable=False),  # ExecType Enum
+                          Column('exec_qty', Float, nullable=False),
+                          Column('exec_fee', Float, nullable=False),
+                          Column('exec_value', Float, nullable=False),
+                          Column('leaves_qty', Float),
+                          # The corresponding closing size of the closing order
+                          Column('closed_size', Float),
+                          # Liquidity Enum, only valid while exec_type is Trade, AdlTrade, BustTrade
+                          Column('last_liquidity_ind', String),
+                          # Column('trade_time', DateTime, index=True, nullable=False),
+                          Column('trade_time_ms', DateTime, index=True, nullable=False)
+                          )
+            self.metadata.create_all()
+        # exec_id must be unique for the ON CONFLICT of the sync. Tables created before did not have the index.
+        with self.engine.begin() as connection:
+            connection.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "ux_{self.USER_TRADES_TBL_NAME}_exec_id" '
+                               f'ON "{self.USER_TRADES_TBL_NAME}" ("exec_id")')
 
     def sync_all_user_trade_records(self, pair):
-        self._logger.info(f'Syncing all {pair} User Trade records.')
-        table = self.get_table(self.USER_TRADES_TBL_NAME)
-        dict_list = self._exchange.get_user_trades_records(pair)
+        self._logger.debug(f'Syncing {pair} User Trade records.')
+        start_time = self.get_sync_cursor(self.USER_TRADES_TBL_NAME, pair)
+        dict_list = self._exchange.get_user_trades_records(pair, start_time=start_time)
         if dict_list:
-            to_insert_df = pd.DataFrame(dict_list)
-            to_insert_df = to_insert_df.drop(['order_link_id', 'price', 'trade_time'], axis=1)
-
-            # records_df.sort_values(['order_id'], inplace=True)
-            # print(records_df.to_string()); exit(1)
-
-            # Get list of PK exec_id in the table to not re-insert (already existing rows)
-            query = f'SELECT "exec_id" FROM public."{self.USER_TRADES_TBL_NAME}"'
-            with self.engine.connect() as connection:
-                existing_ids_list = pd.read_sql(query, connection)['exec_id'].tolist()
-
-                # Delete rows that already exist in the db
-                df = to_insert_df[~to_insert_df['exec_id'].isin(existing_ids_list)]
-
-                if len(df) > 0:
-                    connection.execute(table.insert(), df.to_dict('records'))
+            # order_link_id, price and trade_time are not saved
+            return self.save_synced_records(self.USER_TRADES_TBL_NAME, self.insert_user_trade_stmt, pair, dict_list,
+                                            max(r['trade_time_ms'] for r in dict_list))
+        return 0
 
     """
         -----------------------------------------------------------------------------
@@ -327,55 +465,38 @@ class Database:
         -----------------------------------------------------------------------------
     """
     def init_conditional_orders_table(self):
-        with self.engine.connect() as connection:
-            if not self.engine.has_table(connection, self.COND_ORDERS_TBL_NAME):
-                # Create a table with the appropriate Columns
-                table = Table(self.COND_ORDERS_TBL_NAME, self.metadata,
-                              Column('stop_order_id', String, index=True, nullable=False, primary_key=True),
-                              Column('user_id', String, nullable=False),
-                              Column('symbol', String, nullable=False),
-                              Column('side', String, nullable=False),
-                              Column('order_type', String, nullable=False),
-                              Column('price', Float, nullable=False),
-                              Column('qty', Float, nullable=False),
-                              Column('time_in_force', String, nullable=False),
-                              Column('order_status', String, nullable=False),
-                              Column('trigger_price', Float, nullable=False),
-                              Column('order_link_id', String),
-                              Column('created_time', DateTime, index=True, nullable=False),
-                              Column('updated_time', DateTime, index=True, nullable=False),
-                              Column('take_profit', Float),
-                              Column('stop_loss', Float),
-                              Column('tp_trigger_by', String),
-                              Column('sl_trigger_by', String),
-                              Column('base_price', Float),
-                              Column('trigger_by', String),
-                              Column('reduce_only', String, nullable=False),
-                              Column('close_on_trigger', String, nullable=False),
-                              )
-                self.metadata.create_all()
+        if not self.table_name_exists(self.COND_ORDERS_TBL_NAME):
+            # Create a table with the appropriate Columns
+            table = Table(self.COND_ORDERS_TBL_NAME, self.metadata,
+                          Column('stop_order_id', String, index=True, nullable=False, primary_key=True),
+                          Column('user_id', String, nullable=False),
+                          Column('symbol', String, nullable=False),
+                          Column('side', String, nullable=False),
+                          Column('order_type', String, nullable=False),
+                          Column('price', Float, nullable=False),
+                          Column('qty', Float, nullable=False),
+                          Column('time_in_force', String, nullable=False),
+                          Column('order_status', String, nullable=False),
+                          Column('trigger_price', Float, nullable=False),
+                          Column('order_link_id', String),
+                          Column('created_time', DateTime, index=True, nullable=False),
+                          Column('updated_time', DateTime, index=True, nullable=False),
+                          Column('take_profit', Float),
+                          Column('stop_loss', Float),
+                          Column('tp_trigger_by', String),
+                          Column('sl_trigger_by', String),
+                          Column('base_price', Float),
+                          Column('trigger_by', String),
+                          Column('reduce_only', String, nullable=False),
+                          Column('close_on_trigger', String, nullable=False),
+                          )
+            self.metadata.create_all()
 
     def sync_all_conditional_order_records(self, pair):
-        self._logger.info(f'Syncing all {pair} Conditional Order records.')
-        table = self.get_table(self.COND_ORDERS_TBL_NAME)
-        dict_list = self._exchange.get_all_conditional_order_records(pair)
+        self._logger.debug(f'Syncing {pair} Conditional Order records.')
+        start_time = self.get_sync_cursor(self.COND_ORDERS_TBL_NAME, pair)
+        dict_list = self._exchange.get_all_conditional_order_records(pair, start_time=start_time)
         if dict_list:
-            records_df = pd.DataFrame(dict_list)
-
-            with self.engine.connect() as connection:
-                # Delete all rows in the table that do not have a status of Filled or Cancelled
-                # These orders might have an updated version so we re-insert
-                connection.execute(table.delete().where(
-                    table.c.symbol == pair and
-                    table.c.order_status not in [OrderStatus.Filled, OrderStatus.Cancelled])
-                )
-
-                # Get list of PK (order_id) in the table to not insert already existing rows
-                query = f'SELECT "stop_order_id" FROM public."{self.COND_ORDERS_TBL_NAME}"'
-                existing_ids_list = pd.read_sql(query, connection)['stop_order_id'].tolist()
-
-                # Delete rows that already exist in the db
-                df = records_df[~records_df['stop_order_id'].isin(existing_ids_list)]
-
-                if len(df) > 0:
-                    connection.execute(table.insert(), df.to_dict('records'))
\ No newline at end of file
+            return self.save_synced_records(self.COND_ORDERS_TBL_NAME, self.upsert_cond_order_stmt, pair, dict_list,
+                                            self.order_sync_cursor_time(dict_list, self.FINAL_COND_ORDER_STATUSES))
+        return 0
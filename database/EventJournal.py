@@ -0,0 +1,107 @@
+import datetime as dt
+import time
+
+import pandas as pd
+import rapidjson
+import sqlalchemy as sa
+from sqlalchemy import Column, Table, String, Float, DateTime, BigInteger
+
+import constants
+
+
+class EventJournal:
+    """
+        Append-only journal of the private websocket events: order, execution and position.
+
+        Every item of every message is saved with its local receive time, so the life of an order can be
+        followed after the fact: signal (TradeSignals) => order ack => amends => fills => cancel,
+        with the latency between each step. No REST request is made.
+
+        The websocket listener only builds the rows. They are written in batches by the write-behind queue
+        of the Database.
+
+        config.json, 'database' section: "event_journal": true
+    """
+    EVENT_JOURNAL_TBL_NAME = 'EventJournal'
+
+    # For each topic: fields used for the status, price, qty and exchange time columns
+    TOPIC_FIELDS = {
+        'order': ('order_status', 'price', 'qty', 'update_time'),
+        'execution': ('exec_type', 'exec_price', 'exec_qty', 'trade_time'),
+        'position': ('position_status', 'entry_price', 'size', None)
+    }
+
+    def __init__(self, db):
+        self._db = db
+        self.init_event_journal_table()
+        self.insert_event_stmt = db.get_table(self.EVENT_JOURNAL_TBL_NAME).insert()
+
+    def init_event_journal_table(self):
+        if not self._db.table_name_exists(self.EVENT_JOURNAL_TBL_NAME):
+            # Create a table with the appropriate Columns
+            table = Table(self.EVENT_JOURNAL_TBL_NAME, self._db.metadata,
+                          Column('received_at', DateTime, index=True, nullable=False),
+                          # Local receive time, in microseconds
+                          Column('received_ts', BigInteger, nullable=False),
+                          Column('topic', String, nullable=False),
+                          Column('symbol', String),
+                          Column('order_id', String, index=True),
+                          Column('order_link_id', String, index=True),
+                          Column('exec_id', String),
+                          # order_status, exec_type or position_status
+                          Column('status', String),
+                          Column('side', String),
+                          Column('price', Float),
+                          Column('qty', Float),
+                          # Time of the event on the exchange, as received
+                          Column('exchange_time', String),
+                          # The whole event
+                          Column('data', String, nullable=False)
+                          )
+            self._db.metadata.create_all()
+
+    def listener(self):
+        """ Listener to register on the private pybit.WebSocket with add_listener() """
+        def journal_message(message, msg_json):
+            if isinstance(msg_json, dict) and msg_json.get('topic') in self.TOPIC_FIELDS:
+                self.add_events(msg_json['topic'], msg_json['data'], time.time())
+        return journal_message
+
+    def add_events(self, topic, items, received_ts):
+        status_field, price_field, qty_field, time_field = self.TOPIC_FIELDS[topic]
+        received_at = dt.datetime.fromtimestamp(received_ts).strftime(constants.DATETIME_FMT_MS)
+        rows = [{
+            'received_at': received_at,
+            'received_ts': int(received_ts * 1e6),
+            'topic': topic,
+            'symbol': item.get('symbol'),
+            'order_id': item.get('order_id'),
+            'order_link_id': item.get('order_link_id'),
+            'exec_id': item.get('exec_id'),
+            'status': item.get(status_field),
+            'side': item.get('side'),
+            'price': self._float(item.get(price_field)),
+            'qty': self._float(item.get(qty_field)),
+            'exchange_time': str(item[time_field]) if time_field and item.get(time_field) is not None else None,
+            'data': rapidjson.dumps(item, default=str)
+        } for item in items]
+        if rows:
+            self._db.write_queue.put(self.insert_event_stmt, rows)
+
+    # Events of an order (order_id or order_link_id), in the order they were received
+    def get_order_events(self, order_id=None, order_link_id=None):
+        table = self._db.get_table(self.EVENT_JOURNAL_TBL_NAME)
+        column, value = (table.c.order_id, order_id) if order_id else (table.c.order_link_id, order_link_id)
+        query = sa.select([table]).where(column == value).order_by(table.c.received_ts)
+        with self._db.engine.connect() as connection:
+            df = pd.read_sql(query, connection)
+        # Seconds since the first event of the order
+        df['elapsed'] = (df['received_ts'] - df['received_ts'].min()) / 1e6
+        return df
+
+    @staticmethod
+    def _float(value):
+        try:
+            return float(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
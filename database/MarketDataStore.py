@@ -0,0 +1,201 @@
+import datetime as dt
+import threading
+
+import sqlalchemy as sa
+from sqlalchemy import Column, Table, String, Float, DateTime, BigInteger
+
+from exchange.ExchangeBybit import ExchangeBybit
+from logging_.Logger import Logger
+
+
+class MarketDataStore:
+    """
+        Saves the market data seen by the bot on the public websocket:
+            - Candles: the confirmed candles of the subscribed candle topics, one row per candle
+            - TopOfBook (optional): best bid/ask of orderBookL2_25, one row each time it changes
+
+        The websocket listener only appends rows to a buffer. A background thread writes the buffer every
+        flush_secs with COPY (see StorageBackend.bulk_insert), in one transaction.
+        On Postgres the tables are partitioned by time: Candles by month, TopOfBook by day.
+        The partitions are created when the first row of their period is written.
+
+        config.json, 'database' section: "market_data": {"enable": true, "top_of_book": false}
+    """
+    CANDLES_TBL_NAME = 'Candles'
+    TOP_OF_BOOK_TBL_NAME = 'TopOfBook'
+    FLUSH_SECS = 5
+
+    # Candle topic period => interval of the bot, '1' => '1m'
+    PERIOD_INTERVALS = {period: interval for interval, period in ExchangeBybit.interval_map.items()}
+
+    def __init__(self, db, top_of_book=False, flush_secs=FLUSH_SECS):
+        self._logger = Logger.get_module_logger(__name__)
+        self._db = db
+        self.top_of_book = top_of_book
+        self.flush_secs = flush_secs
+        self.init_candles_table()
+        if top_of_book:
+            self.init_top_of_book_table()
+        self._candles_table = db.get_table(self.CANDLES_TBL_NAME)
+        self._top_of_book_table = db.get_table(self.TOP_OF_BOOK_TBL_NAME) if top_of_book else None
+
+        self._candles = []
+        self._top_of_book = []
+        self._last_top = {}
+        self._partitions = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self.nb_candles = 0
+        self.nb_top_of_book = 0
+
+        self._thread = threading.Thread(target=self._run, name='MarketDataStore', daemon=True)
+        self._thread.start()
+
+    def init_candles_table(self):
+        if not self._db.table_name_exists(self.CANDLES_TBL_NAME):
+            # Create a table with the appropriate Columns
+            table = Table(self.CANDLES_TBL_NAME, self._db.metadata,
+                          Column('pair', String, nullable=False),
+                          Column('interval', String, nullable=False),
+                          Column('start', DateTime, nullable=False),
+                          Column('end', DateTime, nullable=False),
+                          Column('open', Float, nullable=False),
+                          Column('high', Float, nullable=False),
+                          Column('low', Float, nullable=False),
+                          Column('close', Float, nullable=False),
+                          Column('volume', Float, nullable=False),
+                          Column('turnover', Float),
+                          # Exchange timestamp of the confirmed candle, in microseconds
+                          Column('timestamp', BigInteger, nullable=False),
+                          sa.PrimaryKeyConstraint('pair', 'interval', 'start'),
+                          postgresql_partition_by='RANGE (start)'
+                          )
+            self._db.metadata.create_all()
+
+    def init_top_of_book_table(self):
+        if not self._db.table_name_exists(self.TOP_OF_BOOK_TBL_NAME):
+            # Create a table with the appropriate Columns
+            table = Table(self.TOP_OF_BOOK_TBL_NAME, self._db.metadata,
+                          Column('pair', String, nullable=False),
+                          Column('time', DateTime, nullable=False),
+                          Column('bid_price', Float, nullable=False),
+                          Column('bid_size', Float, nullable=False),
+                          Column('ask_price', Float, nullable=False),
+                          Column('ask_size', Float, nullable=False),
+                          # Exchange timestamp of the orderbook update, in microseconds
+                          Column('timestamp_e6', BigInteger, nullable=False),
+                          sa.Index(f'ix_{self.TOP_OF_BOOK_TBL_NAME}_pair_time', 'pair', 'time'),
+                          postgresql_partition_by='RANGE (time)'
+                          )
+            self._db.metadata.create_all()
+
+    def listener(self, ws):
+        """ Listener to register on the public pybit.WebSocket with add_listener() """
+        def store_message(message, msg_json):
+            topic = msg_json.get('topic', '') if isinstance(msg_json, dict) else ''
+            if topic.startswith('candle.'):
+                self.add_candles(topic, msg_json['data'])
+            elif self.top_of_book and topic.startswith('orderBook'):
+                # The websocket has already applied the message to its orderbook
+                self.add_top_of_book(topic.split('.')[-1], ws.data[topic])
+        return store_message
+
+    def add_candles(self, topic, candles):
+        _, period, pair = topic.split('.')
+        interval = self.PERIOD_INTERVALS.get(period, period)
+        rows = [(pair, interval,
+                 dt.datetime.fromtimestamp(int(c['start'])), dt.datetime.fromtimestamp(int(c['end'])),
+                 float(c['open']), float(c['high']), float(c['low']), float(c['close']),
+                 float(c['volume']), float(c['turnover']) if c.get('turnover') is not None else None,
+                 int(c['timestamp']))
+                for c in candles if c['confirm']]
+        if rows:
+            with self._lock:
+                self._candles.extend(rows)
+
+    def add_top_of_book(self, pair, data):
+        order_book = data.get('order_book')
+        if not order_book:
+            return
+        # Sorted by side then price: the best bid is the last Buy, the best ask the first Sell
+        for i, entry in enumerate(order_book):
+            if entry['side'] == 'Sell':
+                break
+        else:
+            return
+        if i == 0:
+            return
+        bid, ask = order_book[i - 1], order_book[i]
+        top = (float(bid['price']), float(bid['size']), float(ask['price']), float(ask['size']))
+        if top == self._last_top.get(pair):
+            return
+        self._last_top[pair] = top
+        timestamp_e6 = int(data.get('timestamp_e6', 0))
+        row = (pair, dt.datetime.fromtimestamp(timestamp_e6 / 1e6)) + top + (timestamp_e6,)
+        with self._lock:
+            self._top_of_book.append(row)
+
+    def flush(self):
+        with self._lock:
+            candles, self._candles = self._candles, []
+            top_of_book, self._top_of_book = self._top_of_book, []
+        if not candles and not top_of_book:
+            return
+        backend = self._db.backend
+        partitions = []
+        try:
+            with self._db.engine.begin() as connection:
+                if candles:
+                    partitions += self.create_partitions(connection, self.CANDLES_TBL_NAME, [r[2] for r in candles],
+                                                         monthly=True)
+                    # A candle can be received again after a websocket reconnection
+                    backend.bulk_insert(connection, self._candles_table, candles, ignore_conflicts=True)
+                if top_of_book:
+                    partitions += self.create_partitions(connection, self.TOP_OF_BOOK_TBL_NAME,
+                                                         [r[1] for r in top_of_book])
+                    backend.bulk_insert(connection, self._top_of_book_table, top_of_book)
+        except (sa.exc.OperationalError, sa.exc.InterfaceError) as e:
+            # Kept for the next flush
+            with self._lock:
+                self._candles[:0] = candles
+                self._top_of_book[:0] = top_of_book
+            self._logger.error(f'Market data not saved, database unreachable: {str(e).splitlines()[0]}')
+            return
+        # Only known once committed, the creation of the partitions is rolled back with the inserts
+        self._partitions.update(partitions)
+        self.nb_candles += len(candles)
+        self.nb_top_of_book += len(top_of_book)
+
+    # One partition per month or per day, covering the times of the rows. Returns the partitions created.
+    def create_partitions(self, connection, table_name, times, monthly=False):
+        created = []
+        for day in sorted({t.date().replace(day=1) if monthly else t.date() for t in times}):
+            if monthly:
+                partition_name = f'{table_name}_{day:%Y%m}'
+                end = (day + dt.timedelta(days=32)).replace(day=1)
+            else:
+                partition_name = f'{table_name}_{day:%Y%m%d}'
+                end = day + dt.timedelta(days=1)
+            if partition_name not in self._partitions:
+                self._db.backend.create_partition(connection, table_name, partition_name, day, end)
+                created.append(partition_name)
+        return created
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self._logger.info(f'Market data saved: {self.nb_candles} candles, {self.nb_top_of_book} top of book updates.')
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_secs)
+            try:
+                self.flush()
+            except Exception as e:
+                # A bad batch must not stop the writer, its rows are dropped
+                self._logger.exception(e)
@@ -0,0 +1,152 @@
+import csv
+import datetime as dt
+import io
+import os
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy_utils import database_exists
+
+"""
+    Storage backends of the Database. The tables and statements are the same for all the backends,
+    a backend only provides the engine, the dialect specific INSERT (for ON CONFLICT), the schema and
+    the column type adaptations of its dialect.
+
+    config.json, 'database' section:
+        "backend": "postgresql" (default), uses db_name, address, port, username and password
+        "backend": "sqlite", embedded database in the file <path>/<db_name>.sqlite, no server needed
+"""
+
+
+class TextDateTime(sa.types.TypeDecorator):
+    """
+        DateTime accepting the datetime strings used by the bot ('2022-01-01 00:00:00[.123]').
+        Postgres converts them itself, the SQLite DateTime type only accepts datetime objects.
+    """
+    impl = sa.DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            return dt.datetime.fromisoformat(value)
+        return value
+
+
+class PostgresBackend:
+    name = 'postgresql'
+    schema = 'public'
+    URL_TEMPLATE = 'postgresql://<username>:<password>@<address>:<port>/<db_name>'
+
+    def __init__(self, db_config):
+        self._db_config = db_config
+
+    @staticmethod
+    def insert(table):
+        return postgresql.insert(table)
+
+    def get_url(self):
+        url = self.URL_TEMPLATE.replace('<db_name>', self._db_config['db_name'])
+        url = url.replace('<address>', self._db_config['address'])
+        url = url.replace('<port>', str(self._db_config['port']))
+        url = url.replace('<username>', self._db_config['username'])
+        url = url.replace('<password>', self._db_config['password'])
+        return url
+
+    def validate(self):
+        if not database_exists(self.get_url()):
+            msg = f'{self.get_url()} database does not exists.'
+            raise Exception(msg)
+
+    def create_engine(self):
+        # compiled_cache: the compiled SQL of the prepared statements is reused across executions
+        return sa.create_engine(self.get_url(), execution_options={'compiled_cache': {}})
+
+    def adapt_table(self, table):
+        return table
+
+    # Insert rows (tuples in the column order of the table) with COPY.
+    # ignore_conflicts: COPY into a temporary staging table, then INSERT ... ON CONFLICT DO NOTHING.
+    def bulk_insert(self, connection, table, rows, ignore_conflicts=False):
+        columns = ', '.join(f'"{c.name}"' for c in table.columns)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        try:
+            if ignore_conflicts:
+                staging = f'staging_{table.name}'
+                cursor.execute(f'CREATE TEMPORARY TABLE IF NOT EXISTS "{staging}" (LIKE "{table.name}") '
+                               f'ON COMMIT DELETE ROWS')
+                cursor.copy_expert(f'COPY "{staging}" ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+                cursor.execute(f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{staging}" '
+                               f'ON CONFLICT DO NOTHING')
+            else:
+                cursor.copy_expert(f'COPY "{table.name}" ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+        finally:
+            cursor.close()
+
+    # Partition of a table created with postgresql_partition_by='RANGE (<column>)', for [start, end)
+    def create_partition(self, connection, table_name, partition_name, start, end):
+        connection.execute(f'CREATE TABLE IF NOT EXISTS "{partition_name}" PARTITION OF "{table_name}" '
+                           f'FOR VALUES FROM (\'{start}\') TO (\'{end}\')')
+
+
+class SqliteBackend:
+    name = 'sqlite'
+    schema = None
+    # Seconds a writer waits for the lock of another writer (write-behind queue, sync workers)
+    BUSY_TIMEOUT = 30
+
+    def __init__(self, db_config):
+        self._db_config = db_config
+        self.file_name = os.path.join(db_config.get('path', 'data'), f'{db_config["db_name"]}.sqlite')
+
+    @staticmethod
+    def insert(table):
+        return sqlite.insert(table)
+
+    def get_url(self):
+        return f'sqlite:///{self.file_name}'
+
+    def validate(self):
+        # The database file is created on the first connection
+        if os.path.dirname(self.file_name):
+            os.makedirs(os.path.dirname(self.file_name), exist_ok=True)
+
+    def create_engine(self):
+        engine = sa.create_engine(self.get_url(), execution_options={'compiled_cache': {}},
+                                  connect_args={'timeout': self.BUSY_TIMEOUT, 'check_same_thread': False})
+
+        # WAL: readers do not block the writer and a commit does not wait for a full fsync
+        @sa.event.listens_for(engine, 'connect')
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.close()
+
+        return engine
+
+    def adapt_table(self, table):
+        # DateTime columns accepting the datetime strings of the bot
+        for column in table.columns:
+            if isinstance(column.type, sa.DateTime) and not isinstance(column.type, TextDateTime):
+                column.type = TextDateTime()
+        return table
+
+    # No COPY in SQLite, a single executemany in the transaction is the fastest way
+    def bulk_insert(self, connection, table, rows, ignore_conflicts=False):
+        statement = self.insert(table).on_conflict_do_nothing() if ignore_conflicts else table.insert()
+        names = [c.name for c in table.columns]
+        connection.execute(statement, [dict(zip(names, row)) for row in rows])
+
+    # Tables are not partitioned in SQLite
+    def create_partition(self, connection, table_name, partition_name, start, end):
+        pass
+
+
+BACKENDS = {backend.name: backend for backend in [PostgresBackend, SqliteBackend]}
+
+
+def get_storage_backend(db_config):
+    return BACKENDS[db_config.get('backend', PostgresBackend.name)](db_config)
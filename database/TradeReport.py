@@ -0,0 +1,247 @@
+import argparse
+import datetime as dt
+import time
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+from sqlalchemy import Column, Table, String, Float, DateTime, Integer, Boolean
+
+from enums.BybitEnums import OrderSide
+from logging_.Logger import Logger
+
+"""
+    Trade statistics compiled from the database, per strategy: win rate, expectancy, drawdown, fees,
+    maker/taker ratio and entry slippage, and the equity curve.
+
+    A trade is a row of TradeSignals with at least one entry fill. The rows of the other tables are linked
+    to their trade by order_link_id ('<OrderLinkId>.<n>' for entries, '<OrderLinkId>.TP.<n>' for take profits).
+    Rows without order_link_id (stop losses) belong to the last trade opened before them on the same pair.
+
+    The trades are materialized in the ReportTrades table, one row per trade. A refresh only recomputes the
+    trades since the high-water mark, the oldest trade still open (see SyncCursors). The report itself only
+    reads ReportTrades.
+
+    Run from the main folder of CryptoMaker:
+        python -m database.TradeReport [--rebuild] [--equity equity.csv]
+"""
+
+
+class TradeReport:
+    REPORT_TRADES_TBL_NAME = 'ReportTrades'
+    # Key of the high-water mark of ReportTrades in the SyncCursors table
+    CURSOR_PAIR = 'ALL'
+
+    MAKER = 'AddedLiquidity'
+    TAKER = 'RemovedLiquidity'
+
+    def __init__(self, db):
+        self._logger = Logger.get_module_logger(__name__)
+        self._db = db
+        self.init_report_trades_table()
+
+    def init_report_trades_table(self):
+        if not self._db.table_name_exists(self.REPORT_TRADES_TBL_NAME):
+            # Create a table with the appropriate Columns
+            table = Table(self.REPORT_TRADES_TBL_NAME, self._db.metadata,
+                          Column('OrderLinkId', String, nullable=False, primary_key=True),
+                          Column('DateTime', DateTime, index=True, nullable=False),
+                          Column('Pair', String, nullable=False),
+                          Column('Strategy', String, nullable=False),
+                          Column('Side', String, nullable=False),
+                          # Price of the signal
+                          Column('EntryPrice', Float, nullable=False),
+                          Column('entry_qty', Float, nullable=False),
+                          Column('avg_entry_price', Float, nullable=False),
+                          # Average entry price compared to the signal price. Positive: entered at a worse price.
+                          Column('slippage_bps', Float, nullable=False),
+                          Column('exit_qty', Float, nullable=False),
+                          Column('pnl', Float, nullable=False),
+                          Column('fees', Float, nullable=False),
+                          Column('maker_qty', Float, nullable=False),
+                          Column('taker_qty', Float, nullable=False),
+                          Column('nb_fills', Integer, nullable=False),
+                          Column('closed_at', DateTime),
+                          Column('is_open', Boolean, nullable=False)
+                          )
+            self._db.metadata.create_all()
+
+    def _read(self, table_name, time_column, since):
+        table = self._db.get_table(table_name)
+        query = sa.select([table])
+        if since is not None:
+            query = query.where(table.c[time_column] >= since)
+        with self._db.engine.connect() as connection:
+            return pd.read_sql(query, connection)
+
+    def refresh(self, rebuild=False):
+        """ Recompute the trades since the high-water mark and save them in ReportTrades """
+        start = time.time()
+        db = self._db
+        cursor_ts = None if rebuild else db.get_sync_cursor(self.REPORT_TRADES_TBL_NAME, self.CURSOR_PAIR)
+        since = dt.datetime.fromtimestamp(cursor_ts) if cursor_ts is not None else None
+
+        trades = self.compute_trades(
+            self._read(db.TRADE_SIGNALS_TBL_NAME, 'DateTime', since),
+            self._read(db.ORDERS_TBL_NAME, 'created_time', since),
+            self._read(db.USER_TRADES_TBL_NAME, 'trade_time_ms', since),
+            self._read(db.CLOSED_PNL_TBL_NAME, 'created_at', since)
+        )
+
+        table = db.get_table(self.REPORT_TRADES_TBL_NAME)
+        with db.engine.begin() as connection:
+            delete = table.delete()
+            if since is not None:
+                delete = delete.where(table.c.DateTime >= since)
+            connection.execute(delete)
+            if len(trades) > 0:
+                records = trades.astype(object).where(trades.notna(), None).to_dict('records')
+                connection.execute(table.insert(), records)
+                # Next refresh starts at the oldest open trade, or at the last trade if they are all closed
+                open_trades = trades[trades['is_open']]
+                cursor_time = open_trades['DateTime'].min() if len(open_trades) > 0 else trades['DateTime'].max()
+                db.set_sync_cursor(connection, self.REPORT_TRADES_TBL_NAME, self.CURSOR_PAIR,
+                                   pd.Timestamp(cursor_time).to_pydatetime())
+        self._logger.info(f'{len(trades)} trades refreshed since {since} in {time.time() - start:.2f}s.')
+
+    @classmethod
+    def compute_trades(cls, signals, orders, user_trades, closed_pnl):
+        """ One row per trade, see the ReportTrades table. All the arguments are DataFrames of the tables. """
+        if len(signals) == 0 or len(user_trades) == 0:
+            return pd.DataFrame()
+
+        link_ids = orders.set_index('order_id')['order_link_id'] if len(orders) > 0 else pd.Series(dtype=object)
+        fills = cls._with_signal_ids(user_trades, link_ids)
+        is_entry = fills['signal_id'].isin(signals['OrderLinkId']) \
+            & ~fills['order_link_id'].str.contains('.TP.', regex=False)
+
+        trades = signals[signals['OrderLinkId'].isin(fills.loc[is_entry, 'signal_id'])]
+        trades = trades[['OrderLinkId', 'DateTime', 'Pair', 'Strategy', 'Side', 'EntryPrice']] \
+            .drop_duplicates('OrderLinkId').sort_values('DateTime').reset_index(drop=True)
+        if len(trades) == 0:
+            return pd.DataFrame()
+
+        entries = fills[is_entry]
+        entries = entries.assign(trade_id=entries['signal_id'], exec_cost=entries['exec_price'] * entries['exec_qty'])
+        entry = entries.groupby('trade_id').agg(entry_qty=('exec_qty', 'sum'), entry_cost=('exec_cost', 'sum'))
+
+        fills = cls._link_to_trades(fills, trades, 'trade_time_ms')
+        fills = fills.assign(maker_qty=np.where(fills['last_liquidity_ind'] == cls.MAKER, fills['exec_qty'], 0.0),
+                             taker_qty=np.where(fills['last_liquidity_ind'] == cls.TAKER, fills['exec_qty'], 0.0))
+        all_fills = fills.groupby('trade_id').agg(fees=('exec_fee', 'sum'), maker_qty=('maker_qty', 'sum'),
+                                                  taker_qty=('taker_qty', 'sum'), nb_fills=('exec_id', 'count'))
+        trades = trades.set_index('OrderLinkId', drop=False).join(entry).join(all_fills)
+
+        if len(closed_pnl) > 0:
+            pnl = cls._link_to_trades(cls._with_signal_ids(closed_pnl, link_ids), trades, 'created_at')
+            exits = pnl.groupby('trade_id').agg(exit_qty=('closed_size', 'sum'), pnl=('closed_pnl', 'sum'),
+                                                closed_at=('created_at', 'max'))
+            trades = trades.join(exits)
+        else:
+            trades = trades.assign(exit_qty=0.0, pnl=0.0, closed_at=pd.NaT)
+
+        trades = trades.reset_index(drop=True)
+        for column in ['exit_qty', 'pnl', 'fees', 'maker_qty', 'taker_qty', 'nb_fills']:
+            trades[column] = trades[column].fillna(0)
+        trades['nb_fills'] = trades['nb_fills'].astype(int)
+        trades['avg_entry_price'] = trades['entry_cost'] / trades['entry_qty']
+        direction = np.where(trades['Side'] == OrderSide.Buy, 1.0, -1.0)
+        trades['slippage_bps'] = (trades['avg_entry_price'] - trades['EntryPrice']) / trades['EntryPrice'] \
+            * 1e4 * direction
+        trades['is_open'] = trades['exit_qty'] < trades['entry_qty'] - 1e-9
+        return trades.drop(columns=['entry_cost'])
+
+    @staticmethod
+    def _with_signal_ids(df, link_ids):
+        """ order_link_id of the order of each row, and signal_id: the OrderLinkId of the signal it comes from """
+        df = df.copy()
+        df['order_link_id'] = df['order_id'].map(link_ids).fillna('').astype(str)
+        df['signal_id'] = df['order_link_id'].str.split('.', n=1).str[0]
+        return df
+
+    @staticmethod
+    def _link_to_trades(df, trades, time_column):
+        """ trade_id column: the trade of the signal_id, or the last trade opened on the pair before the row """
+        df = df.copy()
+        df['trade_id'] = df['signal_id'].where(df['signal_id'].isin(trades['OrderLinkId']))
+        unlinked = df[df['trade_id'].isna()]
+        if len(unlinked) > 0:
+            unlinked = unlinked.assign(_time=pd.to_datetime(unlinked[time_column])).sort_values('_time')
+            opened = trades.reset_index(drop=True)[['DateTime', 'Pair', 'OrderLinkId']]
+            opened = opened.assign(_time=pd.to_datetime(opened['DateTime'])).sort_values('_time')
+            asof = pd.merge_asof(unlinked[['_time', 'symbol']].reset_index(), opened[['_time', 'Pair', 'OrderLinkId']],
+                                 on='_time', left_by='symbol', right_by='Pair', direction='backward')
+            df.loc[asof['index'], 'trade_id'] = asof['OrderLinkId'].values
+        return df[df['trade_id'].notna()]
+
+    def load_trades(self):
+        table = self._db.get_table(self.REPORT_TRADES_TBL_NAME)
+        with self._db.engine.connect() as connection:
+            return pd.read_sql(sa.select([table]).order_by(table.c.DateTime), connection)
+
+    @staticmethod
+    def equity_curve(trades):
+        """ Cumulative closed P&L per strategy and overall, at the close time of each trade """
+        closed = trades[~trades['is_open']].sort_values('closed_at')
+        curve = closed[['closed_at', 'Strategy', 'OrderLinkId', 'pnl']].copy()
+        curve['strategy_equity'] = closed.groupby('Strategy')['pnl'].cumsum()
+        curve['equity'] = closed['pnl'].cumsum()
+        return curve.reset_index(drop=True)
+
+    @staticmethod
+    def statistics(trades):
+        """ Per strategy statistics of the closed trades """
+        closed = trades[~trades['is_open']].sort_values('closed_at').copy()
+        if len(closed) == 0:
+            return pd.DataFrame()
+        by_strategy = closed.groupby('Strategy')
+        closed['equity'] = by_strategy['pnl'].cumsum()
+        # Drawdown from the highest equity reached, starting from 0
+        closed['drawdown'] = closed.groupby('Strategy')['equity'].cummax().clip(lower=0) - closed['equity']
+        closed['win'] = closed['pnl'] > 0
+        closed['win_pnl'] = closed['pnl'].where(closed['win'], 0.0)
+        closed['loss_pnl'] = closed['pnl'].where(~closed['win'], 0.0)
+        closed['slippage_cost'] = closed['slippage_bps'] * closed['entry_qty'] * closed['avg_entry_price']
+        closed['entry_value'] = closed['entry_qty'] * closed['avg_entry_price']
+
+        stats = closed.groupby('Strategy').agg(
+            trades=('pnl', 'count'), wins=('win', 'sum'), pnl=('pnl', 'sum'),
+            win_pnl=('win_pnl', 'sum'), loss_pnl=('loss_pnl', 'sum'), max_drawdown=('drawdown', 'max'),
+            fees=('fees', 'sum'), maker_qty=('maker_qty', 'sum'), taker_qty=('taker_qty', 'sum'),
+            slippage_cost=('slippage_cost', 'sum'), entry_value=('entry_value', 'sum'))
+        losses = stats['trades'] - stats['wins']
+        stats['win_rate'] = stats['wins'] / stats['trades']
+        stats['avg_win'] = (stats['win_pnl'] / stats['wins']).fillna(0)
+        stats['avg_loss'] = (stats['loss_pnl'] / losses).fillna(0)
+        # Average P&L per trade
+        stats['expectancy'] = stats['pnl'] / stats['trades']
+        stats['maker_ratio'] = stats['maker_qty'] / (stats['maker_qty'] + stats['taker_qty'])
+        # Entry value weighted average slippage
+        stats['slippage_bps'] = stats['slippage_cost'] / stats['entry_value']
+        return stats[['trades', 'win_rate', 'pnl', 'expectancy', 'avg_win', 'avg_loss', 'max_drawdown', 'fees',
+                      'maker_ratio', 'slippage_bps']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Trade statistics per strategy.')
+    parser.add_argument('--rebuild', action='store_true', help='recompute all the trades')
+    parser.add_argument('--equity', help='write the equity curve to this csv file')
+    args = parser.parse_args()
+
+    from database.Database import Database
+    db = Database(None)
+    try:
+        report = TradeReport(db)
+        report.refresh(rebuild=args.rebuild)
+        trades = report.load_trades()
+        print(TradeReport.statistics(trades).to_string(float_format=lambda x: f'{x:.4f}'))
+        open_trades = trades['is_open'].sum() if len(trades) > 0 else 0
+        print(f'{len(trades)} trades, {open_trades} open.')
+        if args.equity:
+            TradeReport.equity_curve(trades).to_csv(args.equity, index=False)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import deque
+
+import sqlalchemy as sa
+
+from logging_.Logger import Logger
+
+
+class WriteBehindQueue:
+    """
+        Database writes done in a background thread, so the trading path never waits for Postgres.
+
+        put() only appends a statement and its parameters to an in-memory queue. A writer thread flushes
+        the queue when it holds batch_size operations or every flush_secs. A flush runs in a single
+        transaction, consecutive operations with the same statement are sent as one executemany.
+        Statements are prepared once by the Database, their compiled form is cached by the engine.
+        When the database is unreachable the transaction is rolled back and the operations stay queued,
+        they are retried every retry_secs. When the flush fails for another reason (a bad row), its operations
+        are written again one at a time: only the failing ones are dropped.
+        Above max_queued operations, the oldest ones not being flushed are dropped.
+    """
+    BATCH_SIZE = 100
+    FLUSH_SECS = 1.0
+    RETRY_SECS = 5.0
+    MAX_QUEUED = 100000
+
+    def __init__(self, engine, batch_size=BATCH_SIZE, flush_secs=FLUSH_SECS, retry_secs=RETRY_SECS,
+                 max_queued=MAX_QUEUED):
+        self._logger = Logger.get_module_logger(__name__)
+        self._engine = engine
+        self.batch_size = batch_size
+        self.flush_secs = flush_secs
+        self.retry_secs = retry_secs
+        self.max_queued = max_queued
+
+        # Operations as (statement, list of parameter dicts), in the order they were queued
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._failing_since = None
+        # Operations at the head of the queue being written by flush(), never dropped by put()
+        self._in_flight = 0
+        self.nb_dropped = 0
+
+        self._thread = threading.Thread(target=self._run, name='WriteBehindQueue', daemon=True)
+        self._thread.start()
+
+    def put(self, statement, params):
+        """ Queue the execution of statement with params: a dict or a list of dicts """
+        if isinstance(params, dict):
+            params = [params]
+        with self._lock:
+            self._queue.append((statement, params))
+            if len(self._queue) > self.max_queued:
+                del self._queue[self._in_flight]
+                self.nb_dropped += 1
+                if self.nb_dropped % 1000 == 1:
+                    self._logger.error(f'Database write queue is full, {self.nb_dropped} operations dropped.')
+            if len(self._queue) >= self.batch_size:
+                self._wake.set()
+
+    def size(self):
+        return len(self._queue)
+
+    def flush(self):
+        """ Write all the queued operations. Returns False if the database could not be reached. """
+        with self._flush_lock:
+            with self._lock:
+                operations = list(self._queue)
+                self._in_flight = len(operations)
+            try:
+                if not operations:
+                    return True
+                try:
+                    with self._engine.begin() as connection:
+                        self._execute(connection, operations)
+                except (sa.exc.OperationalError, sa.exc.InterfaceError) as e:
+                    self._on_unreachable(e, len(operations))
+                    return False
+                except Exception as e:
+                    self._logger.error(f'Database write of {len(operations)} operations failed, written one at a time: '
+                                       f'{e.__class__.__name__}: {str(e).splitlines()[0]}')
+                    return self._flush_one_at_a_time(operations)
+
+                self._release(len(operations))
+                self._on_reachable(len(operations))
+                return True
+            finally:
+                with self._lock:
+                    self._in_flight = 0
+
+    def _flush_one_at_a_time(self, operations):
+        """ Each operation in its own transaction, the failing ones are dropped """
+        for operation in operations:
+            try:
+                with self._engine.begin() as connection:
+                    self._execute(connection, [operation])
+            except (sa.exc.OperationalError, sa.exc.InterfaceError) as e:
+                # The operations not written yet stay queued
+                self._on_unreachable(e, self._in_flight)
+                return False
+            except Exception as e:
+                self._logger.error(f'Database write operation dropped: {e.__class__.__name__}: '
+                                   f'{str(e).splitlines()[0]}')
+            self._release(1)
+        self._on_reachable(len(operations))
+        return True
+
+    @staticmethod
+    def _execute(connection, operations):
+        i = 0
+        while i < len(operations):
+            statement, params = operations[i]
+            # Batch the consecutive operations using the same statement
+            batch = list(params)
+            i += 1
+            while i < len(operations) and operations[i][0] is statement:
+                batch.extend(operations[i][1])
+                i += 1
+            connection.execute(statement, batch)
+
+    # Remove the first nb operations being flushed, written or dropped
+    def _release(self, nb):
+        with self._lock:
+            for _ in range(nb):
+                self._queue.popleft()
+            self._in_flight -= nb
+
+    def _on_unreachable(self, e, nb_operations):
+        if not self._failing_since:
+            self._failing_since = time.time()
+            self._logger.error(f'Database unreachable, {nb_operations} write operations kept in queue: '
+                               f'{e.__class__.__name__}: {str(e).splitlines()[0]}')
+
+    def _on_reachable(self, nb_operations):
+        if self._failing_since:
+            self._logger.info(f'Database reachable again after {time.time() - self._failing_since:.0f}s, '
+                              f'{nb_operations} queued write operations flushed.')
+            self._failing_since = None
+
+    def close(self, timeout=10):
+        """ Stop the writer thread and flush what is left, retrying for up to timeout seconds """
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        deadline = time.time() + timeout
+        while not self.flush() and time.time() < deadline:
+            time.sleep(min(self.retry_secs, max(0.0, deadline - time.time())))
+        if self._queue:
+            self._logger.error(f'{len(self._queue)} database write operations lost at shutdown.')
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_secs)
+            self._wake.clear()
+            try:
+                if not self.flush():
+                    self._wake.wait(self.retry_secs)
+            except Exception as e:
+                # The writer must not stop. A bad record is already dropped by flush(), on its own.
+                self._logger.exception(e)
+                self._wake.wait(self.retry_secs)
@@ -0,0 +1,77 @@
+import sys
+import time
+
+import sqlalchemy as sa
+
+from database.Database import Database
+from database.WriteBehindQueue import WriteBehindQueue
+
+"""
+    Micro-benchmark of the inserts done on the trading path (trade signals).
+    Inserts into a temporary copy of the TradeSignals table, dropped at the end.
+
+    Run from the main folder of CryptoMaker:
+        python -m database.benchmark_inserts [nb_rows]
+"""
+
+BENCH_TBL_NAME = 'BenchmarkTradeSignals'
+
+
+def make_signal(i):
+    return {
+        'OrderLinkId': f'bench-{i}',
+        'DateTime': '2022-01-01 00:00:00',
+        'Pair': 'BTCUSDT',
+        'Interval': '5m',
+        'Signal': 'Long',
+        'Side': 'Buy',
+        'EntryPrice': 40000.0 + i,
+        'Strategy': 'Benchmark',
+        'IndicatorValues': '{"rsi": 50.0}',
+        'Timestamp': 1640995200000 + i
+    }
+
+
+def report(name, nb_rows, elapsed):
+    print(f'{name:55} {nb_rows / elapsed:10.0f} inserts/s  {elapsed / nb_rows * 1e6:10.1f} us/insert')
+
+
+def main():
+    nb_rows = 1000 if len(sys.argv) <= 1 else int(sys.argv[1])
+    db = Database(None)
+    db.close()
+    columns = [c.copy() for c in db.get_table(db.TRADE_SIGNALS_TBL_NAME).columns]
+    table = sa.Table(BENCH_TBL_NAME, sa.MetaData(), *columns)
+    table.create(db.engine, checkfirst=True)
+    print(f'Inserting {nb_rows} rows into {BENCH_TBL_NAME}.')
+    try:
+        # Before: the table is reflected for each insert, then inserted with its own connection
+        start = time.perf_counter()
+        for i in range(nb_rows):
+            reflected = sa.Table(BENCH_TBL_NAME, sa.MetaData(), autoload=True, autoload_with=db.engine)
+            with db.engine.connect() as connection:
+                connection.execute(reflected.insert(), make_signal(i))
+        report('Reflect table + insert, one connection per insert', nb_rows, time.perf_counter() - start)
+
+        # Cached table and prepared statement, still one insert per call
+        statement = table.insert()
+        start = time.perf_counter()
+        for i in range(nb_rows):
+            with db.engine.connect() as connection:
+                connection.execute(statement, make_signal(i))
+        report('Prepared statement, one connection per insert', nb_rows, time.perf_counter() - start)
+
+        # Write-behind queue: time seen by the caller, then time until everything is written
+        queue = WriteBehindQueue(db.engine, flush_secs=3600)
+        start = time.perf_counter()
+        for i in range(nb_rows):
+            queue.put(statement, make_signal(i))
+        report('Write-behind queue, caller side', nb_rows, time.perf_counter() - start)
+        queue.close()
+        report('Write-behind queue, until flushed (batched)', nb_rows, time.perf_counter() - start)
+    finally:
+        table.drop(db.engine)
+
+
+if __name__ == '__main__':
+    main()
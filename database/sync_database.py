@@ -1,23 +1,38 @@
-import sys
+import argparse
+import time
 
 from database.Database import Database
 from exchange.ExchangeBybit import ExchangeBybit
 
 """
-    For this code to run properly in PyCharm you need to set your 'Working Directory' 
+    For this code to run properly in PyCharm you need to set your 'Working Directory'
     to the main folder of CryptoMaker in your Run Configuration at the top right of the window.
-"""
 
-#PAIR = 'ETHUSDT'
+    Usage:
+        python -m database.sync_database [pairs ...] [--workers N] [--every SECS]
+"""
 
 pairs = ['BTCUSDT', 'ETHUSDT']
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Sync the Orders, ClosedPnL, UserTrades and CondOrders tables.')
+    parser.add_argument('pairs', nargs='*', default=pairs)
+    parser.add_argument('--workers', type=int, default=Database.SYNC_MAX_WORKERS, help='number of sync threads')
+    parser.add_argument('--every', type=int, default=0, help='keep syncing every SECS seconds')
+    args = parser.parse_args()
+
     exchange = ExchangeBybit()
     db = Database(exchange)
-    #pair = PAIR if len(sys.argv) <= 1 else sys.argv[1]
-    db.sync_all_tables(pairs)
+    try:
+        db.sync_all_tables(args.pairs, max_workers=args.workers)
+        while args.every:
+            time.sleep(args.every)
+            db.sync_all_tables(args.pairs, max_workers=args.workers)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()
 
 
 if __name__ == '__main__':
@@ -46,6 +46,15 @@ class OrderStatus:
     PendingCancel = 'PendingCancel'
 
 
+class StopOrderStatus:
+    Active = 'Active'
+    Untriggered = 'Untriggered'
+    Triggered = 'Triggered'
+    Cancelled = 'Cancelled'
+    Rejected = 'Rejected'
+    Deactivated = 'Deactivated'
+
+
 class StopOrderType:
     TakeProfit = 'TakeProfit'
     StopLoss = 'StopLoss'
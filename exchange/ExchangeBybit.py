@@ -1,3 +1,8 @@
+import collections
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import arrow
 import pandas as pd
 import rapidjson
@@ -10,10 +15,20 @@ import pybit
 import utils
 from enums.SignalMode import SignalMode
 from logging_.Logger import Logger
+from logging_.StartupProfile import StartupProfile
 from Configuration import Configuration
 from Orders import Order
 from enums.BybitEnums import OrderType
+from exchange.ExchangeCache import ExchangeCache
+from exchange.MarketDataRecorder import MarketDataRecorder
+from exchange.MarketDataReplayer import MarketDataReplayer
+from exchange.PaperTrading import PaperTrading
 from pybit import HTTP, WebSocket
+from pybit.clock import ServerClock
+from pybit.endpoints import EndpointSelector
+from pybit.keepalive import ConnectionKeeper
+from pybit.ratelimit import RateLimiter
+from pybit.retry import RetryPolicy
 
 
 class ExchangeBybit:
@@ -96,6 +111,11 @@ class ExchangeBybit:
     ws_public = None
     ws_private = None
 
+    # Server clock estimate, see pybit/clock.py
+    clock = None
+    endpoint_selector = None
+    connection_keeper = None
+
     # Bybit WS only support: ['1', '3', '5', '15', '30', '60', '120', '240', '360', 'D', 'W', 'M']
     interval_map = {
         '1m': '1', '3m': '3', '5m': '5', '15m': '15', '30m': '30',
@@ -116,6 +136,8 @@ class ExchangeBybit:
         self.pair = self._config['exchange']['pair']
         self.stake_currency = self._config['exchange']['stake_currency']
         self.validate_pair()
+        # Last signal to wire times of the entry orders, in ms
+        self.signal_to_wire = collections.deque(maxlen=100)
 
         # Testnet/Mainnet
         if self._config['exchange']['testnet']:
@@ -134,21 +156,92 @@ class ExchangeBybit:
             self.api_key = api_keys.BYBIT_API_KEY
             self.api_secret = api_keys.BYBIT_API_SECRET
 
+        # Local stand-in server (exchange/LocalBybitServer.py), used for offline runs and load tests
+        local_server = self._config['exchange'].get('local_server', {})
+        if local_server.get('enable', False):
+            self.name = self.name + '-Local'
+            address = f"{local_server.get('host', '127.0.0.1')}:{local_server.get('port', 8090)}"
+            self._http_endpoint = f'http://{address}'
+            self._ws_endpoint_public = f'ws://{address}/realtime_public'
+            self._ws_endpoint_private = f'ws://{address}/realtime_private'
+
         # Market type hardcoded for linear
         if self._config['exchange']['market_type'] != 'linear':
             msg = f"Unsupported market type [{self._config['exchange']['market_type']}]."
             self._logger.error(msg)
             raise Exception(msg)
 
+        # Paper trading: orders are simulated against the live orderbook and trades
+        self.paper_trading = None
+        paper_config = self._config['exchange'].get('paper_trading', {})
+        if paper_config.get('enable', False):
+            self.name = self.name + '-Paper'
+            self.paper_trading = PaperTrading(self.pair, self.stake_currency,
+                                              balance=paper_config.get('balance', 10000),
+                                              leverage_long=self._config['trading']['leverage_long'],
+                                              leverage_short=self._config['trading']['leverage_short'])
+            self._logger.info(f"Paper trading enabled with a {paper_config.get('balance', 10000)} "
+                              f"{self.stake_currency} balance. No real orders will be placed.")
+
+        # Replay of a recorded session on the public websocket. Orders are simulated by paper trading.
+        self.replayer = None
+        replay_config = self._config['exchange'].get('replay', {})
+        if replay_config.get('enable', False):
+            if not self.paper_trading:
+                msg = 'Replay requires paper_trading to be enabled, signals of a replay cannot place real orders.'
+                self._logger.error(msg)
+                raise Exception(msg)
+            self.name = self.name + '-Replay'
+            self.replayer = MarketDataReplayer(replay_config['file'], speed=replay_config.get('speed', 1))
+
+        # Recording of all the websocket messages received
+        self.recorder = None
+        recorder_config = self._config['exchange'].get('recorder', {})
+        if recorder_config.get('enable', False):
+            file_name = f"{recorder_config.get('path', 'recordings')}/" \
+                        f"{self.pair}-{dt.datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.mdl"
+            self.recorder = MarketDataRecorder(file_name)
+
+        # Instruments and account settings kept across restarts
+        self.cache = None
+        cache_config = self._config['exchange'].get('cache', {})
+        if cache_config.get('enable', False):
+            self.cache = ExchangeCache(self._http_endpoint, f'{self.name}:{self.api_key}',
+                                       file_name=cache_config.get('path', ExchangeCache.CACHE_FILE),
+                                       instruments_ttl_secs=cache_config.get('instruments_ttl_secs',
+                                                                             ExchangeCache.INSTRUMENTS_TTL_SECS),
+                                       settings_ttl_secs=cache_config.get('settings_ttl_secs',
+                                                                          ExchangeCache.SETTINGS_TTL_SECS))
+
         # HTTP Session
-        self.create_http_session()
-        self.reset_trading_settings(self.pair)
-        self.pair_details_dict = self.get_pair_details()
+        with StartupProfile.phase('exchange.http_session'):
+            self.create_http_session()
 
-        # Connect websockets and subscribe to topics
         self._public_topics = self.build_public_topics_list()
         self._private_topics = self.build_private_topics_list()
 
+        # The trading settings, the pair details and the websocket connections are independent:
+        # they are done concurrently, the startup takes as long as the slowest of them.
+        with StartupProfile.phase('exchange.init'), \
+                ThreadPoolExecutor(max_workers=3, thread_name_prefix='ExchangeInit') as executor:
+            settings = executor.submit(self.timed, 'exchange.trading_settings', self.reset_trading_settings,
+                                       self.pair)
+            pair_details = executor.submit(self.timed, 'exchange.pair_details', self.get_pair_details)
+            websockets = executor.submit(self.timed, 'exchange.websockets', self.connect_websockets, pair_details)
+            self.pair_details_dict = pair_details.result()
+            settings.result()
+            websockets.result()
+
+    @staticmethod
+    def timed(phase, func, *args):
+        with StartupProfile.phase(phase):
+            return func(*args)
+
+    # Connect websockets and subscribe to topics
+    def connect_websockets(self, pair_details):
+        # The paper trading engine needs the instrument before receiving the orderbook and the trades
+        if self.paper_trading:
+            self.paper_trading.engine.set_instrument(pair_details.result())
         self.subscribe_to_topics()
 
     def validate_pair(self):
@@ -165,8 +258,32 @@ class ExchangeBybit:
 
     def subscribe_to_topics(self):
         logger = Logger.get_module_logger('pybit')
-        # public subscriptions
-        self.ws_public = WebSocket(
+        if self.paper_trading:
+            self.ws_public = self.create_public_websocket(logger)
+            self.paper_trading.attach_public_websocket(self.ws_public,
+                                                       orderbook_topic=self.get_orderbook25_topic(self.pair),
+                                                       trade_topic=self.get_trade_topic(self.pair))
+            self.ws_private = self.paper_trading.create_private_websocket(self._private_topics, logger)
+        else:
+            # Both connections are opened at the same time
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix='WebSocketConnect') as executor:
+                ws_public = executor.submit(self.create_public_websocket, logger)
+                ws_private = executor.submit(self.create_private_websocket, logger)
+                self.ws_public = ws_public.result()
+                self.ws_private = ws_private.result()
+
+        if self.recorder:
+            self.ws_public.add_listener(self.recorder.listener('public'))
+            self.ws_private.add_listener(self.recorder.listener('private'))
+
+        if self.replayer:
+            self.replayer.start()
+
+    # public subscriptions
+    def create_public_websocket(self, logger):
+        if self.replayer:
+            return self.replayer.create_websocket('public', self._ws_endpoint_public, self._public_topics, logger)
+        return WebSocket(
             self._ws_endpoint_public,
             subscriptions=self._public_topics,
             ping_interval=25,
@@ -175,8 +292,9 @@ class ExchangeBybit:
             logger=logger
         )
 
-        # private subscriptions, connect with authentication
-        self.ws_private = WebSocket(
+    # private subscriptions, connect with authentication
+    def create_private_websocket(self, logger):
+        return WebSocket(
             self._ws_endpoint_private,
             subscriptions=self._private_topics,
             api_key=self.api_key,
@@ -184,9 +302,15 @@ class ExchangeBybit:
             ping_interval=25,
             ping_timeout=24,
             max_data_length=500,
-            logger=logger
+            logger=logger,
+            clock=self.clock
         )
 
+    def close_recorder(self):
+        """ Write the messages still buffered by the recorder """
+        if self.recorder:
+            self.recorder.close()
+
     def build_public_topics_list(self):
         topic_list = [
             self.get_candle_topic(self.pair, self.interval),
@@ -194,6 +318,9 @@ class ExchangeBybit:
         ]
         if self.extra_interval and self.extra_interval not in topic_list:
             topic_list.append(self.get_candle_topic(self.pair, self.extra_interval))
+        # The paper trading engine needs the trade tape to simulate fills
+        if self.paper_trading:
+            topic_list.append(self.get_trade_topic(self.pair))
         return topic_list
 
     def build_private_topics_list(self):
@@ -251,10 +378,21 @@ class ExchangeBybit:
         max_retries = 4  # default is 3
         retry_delay = 3  # default is 3 seconds
         request_timeout = self._config['exchange']['http']['timeout']  # default is 10 seconds
+        # Orders with an order_link_id are looked up before being sent again, they can use a short timeout
+        order_timeout = self._config['exchange']['http'].get('order_timeout')
         log_requests = True
         logging_level = self._config['logging']['logging_level']  # default is logging_.INFO
         spot = False  # spot or futures
         logger = Logger.get_module_logger('pybit')
+        rate_limiter = None
+        if self._config['exchange']['http'].get('client_rate_limit', False):
+            rate_limiter = RateLimiter(reserve_ratio=self._config['exchange']['http'].get('rate_limit_reserve', 0.2),
+                                       logger=logger)
+        retry_policy = None
+        retry_config = self._config['exchange']['http'].get('retry_policy', {})
+        if retry_config.get('enable', False):
+            retry_policy = RetryPolicy(failure_threshold=retry_config.get('failure_threshold', 5),
+                                       cooldown_secs=retry_config.get('cooldown_secs', 10))
 
         # Authenticated
         self.session_auth = HTTP(
@@ -268,7 +406,42 @@ class ExchangeBybit:
             log_requests=log_requests,
             logging_level=logging_level,
             logger=logger,
-            spot=spot)
+            spot=spot,
+            rate_limiter=rate_limiter,
+            retry_policy=retry_policy,
+            order_timeout=order_timeout)
+
+        # Offset of the local clock to the server clock, applied to the signed timestamps of HTTP and websocket
+        clock_config = self._config['exchange']['http'].get('clock_sync', {})
+        if clock_config.get('enable', False) and not self.paper_trading:
+            self.clock = ServerClock(self.session_auth.client, self._http_endpoint,
+                                     interval_secs=clock_config.get('interval_secs', 300), logger=logger)
+            self.clock.start()
+            self.session_auth.clock = self.clock
+
+        # Mainnet is served by 2 hosts: the REST requests go to the fastest. The websockets stay on mainnet2.
+        http_config = self._config['exchange']['http']
+        selection_config = http_config.get('endpoint_selection', {})
+        if selection_config.get('enable', False) and not self.paper_trading \
+                and self._http_endpoint == http_config['linear_mainnet2']:
+            self.endpoint_selector = EndpointSelector(
+                self.session_auth.client, [http_config['linear_mainnet2'], http_config['linear_mainnet']],
+                interval_secs=selection_config.get('interval_secs', 60),
+                hedge=selection_config.get('hedge', False),
+                hedge_min_secs=selection_config.get('hedge_min_secs', 0.05),
+                logger=logger)
+            self.endpoint_selector.start()
+            self.session_auth.endpoint_selector = self.endpoint_selector
+
+        # A signal can come after a long idle period, the order should not wait for a new TLS connection
+        keep_warm_config = http_config.get('keep_warm', {})
+        if keep_warm_config.get('enable', False) and not self.paper_trading:
+            self.connection_keeper = ConnectionKeeper(self.session_auth,
+                                                      interval_secs=keep_warm_config.get('interval_secs', 15),
+                                                      logger=logger)
+            self.connection_keeper.start()
+        if self.paper_trading:
+            self.session_auth = self.paper_trading.create_http_session(self.session_auth)
         # Unauthenticated
         # self.session_unauthenticated = HTTP(
         #     endpoint=self._http_endpoint,
@@ -308,16 +481,39 @@ class ExchangeBybit:
                     'qty_step': 0.01
                 }
             }
+            With the exchange cache, the cached details are returned. When they are stale,
+            they are refreshed in the background.
         """
+        if self.cache:
+            pair_details, fresh = self.cache.get_instrument(self.pair)
+            if pair_details:
+                if not fresh:
+                    threading.Thread(target=self.refresh_pair_details, name='InstrumentsRefresh',
+                                     daemon=True).start()
+                return pair_details
+        return self.query_pair_details()
+
+    # Details of all the symbols are downloaded, and cached
+    def query_pair_details(self):
         data = self.session_auth.query_symbol()
         if data:
             _list = data['result']
             if _list:
+                if self.cache:
+                    self.cache.set_instruments(_list)
                 for i in _list:
                     if i['name'] == self.pair:
                         return i
         return None
 
+    def refresh_pair_details(self):
+        try:
+            pair_details = self.query_pair_details()
+            if pair_details:
+                self.pair_details_dict = pair_details
+        except Exception as e:
+            self._logger.error(f'Unable to refresh the instruments: {e}')
+
     def get_candle_data(self, pair, from_time, to_time, interval, verbose=False):
         """
             get_candle_data(): from_time, to_time must be timestamps
@@ -432,21 +628,9 @@ class ExchangeBybit:
         return None
 
     # Get all orders with all statuses for this pair stored on Bybit
-    def get_all_order_records(self, pair):
-        list_records = []
-        page = 1
-        while True:
-            result = self.session_auth.get_active_order(
-                symbol=pair,
-                order='asc',
-                page=page,
-                limit=50  # Limit for data size per page, max size is 50
-            )
-            if result and result['result']['data']:
-                list_records = list_records + result['result']['data']
-                page += 1
-            else:
-                break
+    # start_time: timestamp in seconds, only the orders created since then are returned
+    def get_all_order_records(self, pair, start_time=None):
+        list_records = self._get_records_created_since(self.session_auth.get_active_order, pair, start_time)
         if list_records:
             # Convert created_at timestamp to datetime string
             df = pd.DataFrame(list_records)
@@ -460,21 +644,9 @@ class ExchangeBybit:
         return None
 
     # Get all conditional orders with all statuses for this pair stored on Bybit
-    def get_all_conditional_order_records(self, pair):
-        list_records = []
-        page = 1
-        while True:
-            result = self.session_auth.get_conditional_order(
-                symbol=pair,
-                order='asc',
-                page=page,
-                limit=50  # Limit for data size per page, max size is 50
-            )
-            if result and result['result']['data']:
-                list_records = list_records + result['result']['data']
-                page += 1
-            else:
-                break
+    # start_time: timestamp in seconds, only the orders created since then are returned
+    def get_all_conditional_order_records(self, pair, start_time=None):
+        list_records = self._get_records_created_since(self.session_auth.get_conditional_order, pair, start_time)
         if list_records:
             # Convert created_at timestamp to datetime string
             df = pd.DataFrame(list_records)
@@ -487,6 +659,35 @@ class ExchangeBybit:
             return dict_list
         return None
 
+    # Page through the order list endpoints (get_active_order, get_conditional_order).
+    # Without start_time all the records are returned, oldest first. With start_time the newest pages are read
+    # first, and paging stops at the first page reaching orders created before start_time.
+    @staticmethod
+    def _get_records_created_since(get_orders, pair, start_time=None):
+        list_records = []
+        page = 1
+        while True:
+            result = get_orders(
+                symbol=pair,
+                order='asc' if start_time is None else 'desc',
+                page=page,
+                limit=50  # Limit for data size per page, max size is 50
+            )
+            if not result or not result['result']['data']:
+                break
+            data = result['result']['data']
+            if start_time is None:
+                list_records.extend(data)
+            else:
+                recent = [r for r in data if arrow.get(r['created_time']).timestamp() >= start_time]
+                list_records.extend(recent)
+                if len(recent) < len(data):
+                    break
+            page += 1
+        if start_time is not None:
+            list_records.reverse()
+        return list_records
+
     # Get active order by id, using websocket or realtime http method
     def get_order_by_id_hybrid(self, pair, order_id):
         data = self.ws_private.fetch(self.order_topic_name)
@@ -541,40 +742,83 @@ class ExchangeBybit:
         """
         data = None
         try:
-            if o.order_type == OrderType.Market:
-                data = self.session_auth.place_active_order(
-                    side=o.side,
-                    symbol=o.symbol,
-                    order_type=o.order_type,
-                    qty=o.qty,
-                    take_profit=o.take_profit,
-                    stop_loss=o.stop_loss,
-                    time_in_force=o.time_in_force,
-                    close_on_trigger=False,
-                    reduce_only=o.reduce_only,
-                    order_link_id=o.order_link_id
-                )
-            elif o.order_type == OrderType.Limit:
-                data = self.session_auth.place_active_order(
-                    side=o.side,
-                    symbol=o.symbol,
-                    order_type=o.order_type,
-                    qty=o.qty,
-                    price=o.price,
-                    take_profit=o.take_profit,
-                    stop_loss=o.stop_loss,
-                    time_in_force=o.time_in_force,
-                    close_on_trigger=False,
-                    reduce_only=o.reduce_only,
-                    order_link_id=o.order_link_id
-                )
+            if o.order_type in [OrderType.Market, OrderType.Limit]:
+                data = self.session_auth.place_active_order(**self.get_order_params(o))
         except pybit.exceptions.InvalidRequestError as e:
             # 130125: Current position is zero, cannot fix reduce-only order qty
             if e.status_code not in [130125]:
                 self._logger.exception(e)
                 raise e
+        if data and o.signal_time is not None and not self.paper_trading:
+            self.log_signal_to_wire(o)
         return data['result'] if data else None
 
+    @staticmethod
+    def get_order_params(o: Order):
+        params = {
+            'side': o.side,
+            'symbol': o.symbol,
+            'order_type': o.order_type,
+            'qty': o.qty,
+            'take_profit': o.take_profit,
+            'stop_loss': o.stop_loss,
+            'time_in_force': o.time_in_force,
+            'close_on_trigger': False,
+            'reduce_only': o.reduce_only,
+            'order_link_id': o.order_link_id
+        }
+        # No price for market orders
+        if o.order_type == OrderType.Limit:
+            params['price'] = o.price
+        return params
+
+    def place_orders(self, orders: list, return_exceptions=False):
+        """
+            Place several active orders in parallel (take profit ladder, ...). See place_order().
+            Returns the result of each order, in the same order, None for an order rejected with 130125.
+            With return_exceptions, a failed order returns its exception, so that the caller can still record
+            the orders that were placed. Otherwise the first error is raised.
+        """
+        params = [self.get_order_params(o) for o in orders]
+        results = self.get_bulk_results(
+            'place_orders', params, self.session_auth.place_active_order_bulk(params, return_exceptions=True),
+            ignored_codes=[130125])
+        results = [r if isinstance(r, Exception) else r['result'] if r and r['ret_code'] == 0 else None
+                   for r in results]
+        if not return_exceptions:
+            errors = [r for r in results if isinstance(r, Exception)]
+            if errors:
+                raise errors[0]
+        return results
+
+    def get_bulk_results(self, name, params, results, ignored_codes):
+        """
+            Errors of a bulk request. An InvalidRequestError of ignored_codes becomes a result with its
+            ret_code and ret_msg, like the single requests. All the other errors are logged together and
+            left in the results: every request of the batch has completed, none is left in flight.
+        """
+        errors = []
+        for i, result in enumerate(results):
+            if isinstance(result, pybit.exceptions.InvalidRequestError) and result.status_code in ignored_codes:
+                results[i] = dict(params[i], ret_code=result.status_code, ret_msg=result.message)
+                self._logger.error(results[i])
+            elif isinstance(result, Exception):
+                errors.append(result)
+        if errors:
+            self._logger.error(f'{name}: {len(errors)} of {len(params)} requests failed:\n' +
+                               '\n'.join(str(e) for e in errors))
+        return results
+
+    # Time from the detection of the signal to the order request sent on the connection
+    def log_signal_to_wire(self, o: Order):
+        sent_at = self.session_auth.get_sent_at()
+        if sent_at is None:
+            return
+        ms = (sent_at - o.signal_time) * 1000
+        self.signal_to_wire.append(ms)
+        self._logger.info(f'Signal to wire: {ms:.1f}ms [{o.order_link_id}], median of the last '
+                          f'{len(self.signal_to_wire)}: {statistics.median(self.signal_to_wire):.1f}ms')
+
     def replace_active_order(self, **kwargs):
         """
             replace_active_order() can modify/amend your active orders.
@@ -797,17 +1041,19 @@ class ExchangeBybit:
         return result['result']
 
     # Return a dictionary with all Closed P&L records
-    def get_all_closed_pnl_records(self, pair):
-        start_time = dt.datetime(2000, 1, 1).timestamp()  # Make sure we pick up everything available
+    # start_time: timestamp in seconds, only the records created since then are returned
+    def get_all_closed_pnl_records(self, pair, start_time=None):
+        if start_time is None:
+            start_time = dt.datetime(2000, 1, 1).timestamp()  # Make sure we pick up everything available
         end_time = dt.datetime(2030, 1, 1).timestamp()  # Make sure we pick up everything available
         list_records = []
         page = 1
         while True:
             # Start timestamp point for result, in seconds
             # End timestamp point for result, in seconds
-            result = self._get_closed_profit_and_loss(pair, start_time, end_time, page=page)
+            result = self._get_closed_profit_and_loss(pair, int(start_time), end_time, page=page)
             if result['data']:
-                list_records = list_records + result['data']
+                list_records.extend(result['data'])
                 page += 1
             else:
                 break
@@ -821,16 +1067,18 @@ class ExchangeBybit:
             return dict_list
         return None
 
-    # Get all orders with all statuses for this pair stored on Bybit
-    def get_user_trades_records(self, pair):
-        start_time = dt.datetime(2000, 1, 1).timestamp()  # Make sure we pick up everything available
+    # Get all user trades (executions) for this pair stored on Bybit
+    # start_time: timestamp in seconds, only the trades executed since then are returned
+    def get_user_trades_records(self, pair, start_time=None):
+        if start_time is None:
+            start_time = dt.datetime(2000, 1, 1).timestamp()  # Make sure we pick up everything available
         end_time = dt.datetime(2030, 1, 1).timestamp()  # Make sure we pick up everything available
         list_records = []
         page = 1
         while True:
             result = self.session_auth.user_trade_records(
                 symbol=pair,
-                start_time=start_time,
+                start_time=int(start_time),
                 end_time=end_time,
                 page=page,
                 # Limit for data size per page, max size is 200.
@@ -838,7 +1086,7 @@ class ExchangeBybit:
                 limit=200
             )
             if result and result['result']['data']:
-                list_records = list_records + result['result']['data']
+                list_records.extend(result['result']['data'])
                 page += 1
             else:
                 break
@@ -861,70 +1109,66 @@ class ExchangeBybit:
              - Cross/Isolated Margin Switch
              - Leverage
              - Full/Partial Position TP/SL Mode Switch
+            With the exchange cache, the settings already applied are not sent again (see ExchangeCache).
         """
         # 1. Position Mode Switch
         # If you are in One-Way Mode, you can only open one position on Buy or Sell side;
         # If you are in Hedge Mode, you can open both Buy and Sell side positions simultaneously.
-        try:
-            # MergedSingle: One-Way Mode; BothSide: Hedge Mode
-            mode = 'BothSide'
-            res = self.session_auth.position_mode_switch(
-                symbol=pair,
-                # Probable bug on Bybit 'MergedSingle' does not work here. Mode gets rejected an invalid character...
-                mode=mode
-            )
-            self._logger.info(f'[Position Mode] has been set to: {mode}')
-        except pybit.exceptions.InvalidRequestError as e:
-            if e.status_code not in [30083]:  # 30083 Position mode not modified
-                self._logger.exception(e)
-                raise e
+        # MergedSingle: One-Way Mode; BothSide: Hedge Mode
+        mode = 'BothSide'
+        if not self.is_setting_applied(pair, 'position_mode', mode):
+            try:
+                res = self.session_auth.position_mode_switch(
+                    symbol=pair,
+                    # Probable bug on Bybit 'MergedSingle' does not work here. Mode gets rejected an invalid character...
+                    mode=mode
+                )
+                self._logger.info(f'[Position Mode] has been set to: {mode}')
+            except pybit.exceptions.InvalidRequestError as e:
+                if e.status_code not in [30083]:  # 30083 Position mode not modified
+                    self._logger.exception(e)
+                    raise e
+            self.set_setting_applied(pair, 'position_mode', mode)
 
         # 2. Set Auto Add Margin
         # Set auto add margin, or Auto-Margin Replenishment.
-        try:
-            auto_margin = False
-            res = self.session_auth.set_auto_add_margin(
-                symbol=pair,
-                side="Buy",
-                auto_add_margin=auto_margin
-            )
-            self._logger.info(f'[Set Auto Add Margin] for Long has been set to: {auto_margin}')
-        except pybit.exceptions.InvalidRequestError as e:
-            if e.status_code not in [130060]:  # 130060	autoAddMargin not changed
-                self._logger.exception(e)
-                raise e
-        try:
-            auto_margin = False
-            res = self.session_auth.set_auto_add_margin(
-                symbol=pair,
-                side="Sell",
-                auto_add_margin=auto_margin
-            )
-            self._logger.info(f'[Set Auto Add Margin] for Short has been set to: {auto_margin}')
-        except pybit.exceptions.InvalidRequestError as e:
-            if e.status_code not in [130060]:  # 130060	autoAddMargin not changed
-                self._logger.exception(e)
-                raise e
+        auto_margin = False
+        for side, side_name in [('Buy', 'Long'), ('Sell', 'Short')]:
+            if not self.is_setting_applied(pair, f'auto_add_margin_{side}', auto_margin):
+                try:
+                    res = self.session_auth.set_auto_add_margin(
+                        symbol=pair,
+                        side=side,
+                        auto_add_margin=auto_margin
+                    )
+                    self._logger.info(f'[Set Auto Add Margin] for {side_name} has been set to: {auto_margin}')
+                except pybit.exceptions.InvalidRequestError as e:
+                    if e.status_code not in [130060]:  # 130060	autoAddMargin not changed
+                        self._logger.exception(e)
+                        raise e
+                self.set_setting_applied(pair, f'auto_add_margin_{side}', auto_margin)
 
         # 3. Cross/Isolated Margin Switch
         # Switch Cross/Isolated; must set leverage value when switching from Cross to Isolated
-        try:
-            is_isolated = True
-            buy_l = 1
-            sell_l = 1
-            res = self.session_auth.cross_isolated_margin_switch(
-                symbol=pair,
-                is_isolated=is_isolated,
-                buy_leverage=buy_l,
-                sell_leverage=sell_l
-            )
-            self._logger.info(f'[Isolated Mode] has been set to: {is_isolated}')
-            self._logger.info(f'[Buy Leverage] has been set to: {buy_l}x')
-            self._logger.info(f'[Sell Leverage] has been set to: {sell_l}x')
-        except pybit.exceptions.InvalidRequestError as e:
-            if e.status_code not in [130056]:  # 130056	Isolated not modified
-                self._logger.exception(e)
-                raise e
+        is_isolated = True
+        if not self.is_setting_applied(pair, 'is_isolated', is_isolated):
+            try:
+                buy_l = 1
+                sell_l = 1
+                res = self.session_auth.cross_isolated_margin_switch(
+                    symbol=pair,
+                    is_isolated=is_isolated,
+                    buy_leverage=buy_l,
+                    sell_leverage=sell_l
+                )
+                self._logger.info(f'[Isolated Mode] has been set to: {is_isolated}')
+                self._logger.info(f'[Buy Leverage] has been set to: {buy_l}x')
+                self._logger.info(f'[Sell Leverage] has been set to: {sell_l}x')
+            except pybit.exceptions.InvalidRequestError as e:
+                if e.status_code not in [130056]:  # 130056	Isolated not modified
+                    self._logger.exception(e)
+                    raise e
+            self.set_setting_applied(pair, 'is_isolated', is_isolated)
 
         # 4. Full/Partial Position TP/SL Mode Switch
         """
@@ -933,14 +1177,26 @@ class ExchangeBybit:
             like in (1, 2, 3) above. In this case we look at the message instead of the error code.
             * We also modified the pybit code to not do any retries when this happens. *
         """
-        try:
-            tp_sl_mode = 'Full'
-            res = self.session_auth.full_partial_position_tp_sl_switch(
-                symbol=pair,
-                tp_sl_mode=tp_sl_mode  # Possible values: Full or Partial
-            )
-            self._logger.info(f'[Position TP/SL Mode] has been set to: {tp_sl_mode}')
-        except pybit.exceptions.InvalidRequestError as e:
-            if 'same tp sl mode' not in e.message:
-                self._logger.exception(e)
-                raise e
+        tp_sl_mode = 'Full'
+        if not self.is_setting_applied(pair, 'tp_sl_mode', tp_sl_mode):
+            try:
+                res = self.session_auth.full_partial_position_tp_sl_switch(
+                    symbol=pair,
+                    tp_sl_mode=tp_sl_mode  # Possible values: Full or Partial
+                )
+                self._logger.info(f'[Position TP/SL Mode] has been set to: {tp_sl_mode}')
+            except pybit.exceptions.InvalidRequestError as e:
+                if 'same tp sl mode' not in e.message:
+                    self._logger.exception(e)
+                    raise e
+            self.set_setting_applied(pair, 'tp_sl_mode', tp_sl_mode)
+
+    def is_setting_applied(self, pair, name, value):
+        if self.cache and self.cache.is_setting_applied(pair, name, value):
+            self._logger.debug(f'[{name}] already set to: {value}')
+            return True
+        return False
+
+    def set_setting_applied(self, pair, name, value):
+        if self.cache:
+            self.cache.set_setting_applied(pair, name, value)
@@ -0,0 +1,98 @@
+"""
+    Local cache of exchange data that rarely changes, kept across restarts in a json file:
+
+    - instruments: details of all the symbols (query_symbol), per HTTP endpoint.
+      Fresh for instruments_ttl_secs. A stale copy is still used at startup while it is refreshed in the background.
+    - settings: account settings last applied per pair (position mode, auto add margin, isolated margin, tp/sl mode),
+      per endpoint and account (exchange name and API key, a paper trading account is not the real one).
+      A setting already applied within settings_ttl_secs is not sent again.
+      Settings changed outside the bot (website, other application) are only reapplied once their record expires.
+
+    {
+        "instruments": {"<endpoint>": {"updated_at": 1650000000.0, "symbols": {"BTCUSDT": {...}, ...}}},
+        "settings": {"<endpoint>:<account hash>": {"BTCUSDT": {"position_mode": ["BothSide", 1650000000.0], ...}}}
+    }
+"""
+import hashlib
+import os
+import threading
+import time
+
+import rapidjson
+
+from logging_.Logger import Logger
+
+
+class ExchangeCache:
+    CACHE_FILE = 'data/exchange_cache.json'
+    INSTRUMENTS_TTL_SECS = 3600
+    SETTINGS_TTL_SECS = 86400
+
+    def __init__(self, endpoint, account, file_name=CACHE_FILE, instruments_ttl_secs=INSTRUMENTS_TTL_SECS,
+                 settings_ttl_secs=SETTINGS_TTL_SECS):
+        self._logger = Logger.get_module_logger(__name__)
+        self.file_name = file_name
+        self.instruments_ttl_secs = instruments_ttl_secs
+        self.settings_ttl_secs = settings_ttl_secs
+        self._endpoint = endpoint
+        # The account contains the API key, it is not written to the file
+        self._account = f'{endpoint}:{hashlib.sha256(account.encode()).hexdigest()[:16]}'
+        self._lock = threading.Lock()
+        self._cache = self.load()
+
+    def load(self):
+        try:
+            with open(self.file_name) as f:
+                cache = rapidjson.load(f)
+            return cache if isinstance(cache, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (rapidjson.JSONDecodeError, OSError) as e:
+            self._logger.error(f'Exchange cache [{self.file_name}] ignored: {e}')
+            return {}
+
+    # Written to a temporary file first, a crash cannot leave a truncated cache
+    def save(self):
+        with self._lock:
+            content = rapidjson.dumps(self._cache)
+        if os.path.dirname(self.file_name):
+            os.makedirs(os.path.dirname(self.file_name), exist_ok=True)
+        tmp_file = f'{self.file_name}.{threading.get_ident()}.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write(content)
+        os.replace(tmp_file, self.file_name)
+
+    # Returns (details of the symbol or None, whether the instruments are fresh)
+    def get_instrument(self, symbol):
+        with self._lock:
+            instruments = self._cache.get('instruments', {}).get(self._endpoint)
+        if not instruments:
+            return None, False
+        fresh = time.time() - instruments.get('updated_at', 0) < self.instruments_ttl_secs
+        return instruments.get('symbols', {}).get(symbol), fresh
+
+    def set_instruments(self, symbols):
+        with self._lock:
+            self._cache.setdefault('instruments', {})[self._endpoint] = {
+                'updated_at': time.time(),
+                'symbols': {s['name']: s for s in symbols}
+            }
+        self.save()
+
+    # Whether the setting has been applied with this value within settings_ttl_secs
+    def is_setting_applied(self, pair, name, value):
+        with self._lock:
+            applied = self._cache.get('settings', {}).get(self._account, {}).get(pair, {}).get(name)
+        return applied is not None and applied[0] == value and time.time() - applied[1] < self.settings_ttl_secs
+
+    def set_setting_applied(self, pair, name, value):
+        with self._lock:
+            settings = self._cache.setdefault('settings', {}).setdefault(self._account, {})
+            settings.setdefault(pair, {})[name] = [value, time.time()]
+        self.save()
+
+    # To force all the settings of the pair to be sent again
+    def clear_settings(self, pair):
+        with self._lock:
+            self._cache.get('settings', {}).get(self._account, {}).pop(pair, None)
+        self.save()
@@ -0,0 +1,673 @@
+"""
+    Local stand-in for the Bybit linear perpetual API. Runs the bot end to end without network,
+    to benchmark it at realistic or stressed message rates.
+
+    A single port serves:
+     - REST: the subset of public/private v2 linear endpoints called by pybit.HTTP through ExchangeBybit
+     - WebSocket /realtime_public: candle.<interval>.<pair>, orderBookL2_25.<pair>, trade.<pair>
+     - WebSocket /realtime_private: order, execution, position, wallet
+
+    The market is a synthetic random walk: an orderBookL2_25 book, a trade tape and the candles
+    built from it, with a few days of 1m candle history for query_kline(). Private orders are
+    executed by exchange.MatchingEngine against that market, the same engine used for paper trading.
+    Orders of the bot are not shown in the public book.
+
+    Latency and push rates are configurable:
+        python -m exchange.LocalBybitServer --pair BTCUSDT --port 8090 --latency-ms 20 --jitter-ms 10 \\
+               --ws-latency-ms 5 --book-rate 10 --trade-rate 5 --candle-rate 1
+
+    Then enable exchange.local_server in config.json and start the bot.
+    API keys and signatures are not verified.
+"""
+import argparse
+import base64
+import datetime as dt
+import hashlib
+import json
+import math
+import queue
+import random
+import struct
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+
+from exchange.MatchingEngine import MatchingEngine
+from exchange.PaperTrading import PaperHTTP
+from logging_.Logger import Logger
+from pybit.exceptions import InvalidRequestError
+
+# Instruments known by the server. Values close to Bybit's, start_price only seeds the random walk.
+INSTRUMENTS = {
+    'BTCUSDT': {'start_price': 40000.0, 'tick_size': '0.5', 'qty_step': 0.001, 'max_trading_qty': 100,
+                'max_leverage': 100},
+    'ETHUSDT': {'start_price': 3000.0, 'tick_size': '0.05', 'qty_step': 0.01, 'max_trading_qty': 1000,
+                'max_leverage': 50},
+}
+
+# Kline intervals in minutes, as used by query_kline and the candle topics
+INTERVAL_MINUTES = {
+    '1': 1, '3': 3, '5': 5, '15': 15, '30': 30, '60': 60, '120': 120, '240': 240, '360': 360,
+    '720': 720, 'D': 1440
+}
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+# Authentication parameters added by pybit.HTTP._auth(), not passed to the engine
+AUTH_PARAMS = ['api_key', 'recv_window', 'timestamp', 'sign']
+
+
+def pair_details(pair):
+    """ Instrument in the format returned by query_symbol """
+    instrument = INSTRUMENTS[pair]
+    return {
+        'name': pair,
+        'alias': pair,
+        'status': 'Trading',
+        'base_currency': pair.replace('USDT', ''),
+        'quote_currency': 'USDT',
+        'price_scale': 2,
+        'taker_fee': '0.00075',
+        'maker_fee': '-0.00025',
+        'funding_interval': 480,
+        'leverage_filter': {'min_leverage': 1, 'max_leverage': instrument['max_leverage'], 'leverage_step': '0.01'},
+        'price_filter': {'min_price': instrument['tick_size'], 'max_price': '999999', 'tick_size': instrument['tick_size']},
+        'lot_size_filter': {
+            'max_trading_qty': instrument['max_trading_qty'],
+            'min_trading_qty': instrument['qty_step'],
+            'qty_step': instrument['qty_step'],
+            'post_only_max_trading_qty': str(instrument['max_trading_qty'] * 10)
+        }
+    }
+
+
+class MarketSimulator:
+    """
+        Synthetic market: random walk driven by the trade tape.
+        Prices are kept in integer ticks. The best bid is self.bid, the best ask is self.bid + 1.
+        A trade that takes the whole best level moves the book by one tick.
+    """
+    BOOK_DEPTH = 25
+    # Volatility of the 1m closes of the generated history
+    SIGMA_1M = 0.0008
+
+    def __init__(self, pair, start_price, history_days, rng):
+        instrument = INSTRUMENTS[pair]
+        self.pair = pair
+        self.rng = rng
+        self.tick_size = float(instrument['tick_size'])
+        self.qty_step = float(instrument['qty_step'])
+        self.decimals = max(0, -int(math.floor(math.log10(self.tick_size))))
+        self.avg_level_size = self.qty_step * 500
+
+        # 1m candles [start, open, high, low, close, volume], contiguous from self.candles[0][0]
+        self.candles = []
+        self.current = None
+        self._generate_history(start_price, history_days)
+
+        self.bid = int(round(self.current[4] / self.tick_size))
+        self.bids = {}
+        self.asks = {}
+        for i in range(self.BOOK_DEPTH):
+            self.bids[self.bid - i] = self._new_level_size()
+            self.asks[self.bid + 1 + i] = self._new_level_size()
+        self.cross_seq = 1
+
+    def _generate_history(self, start_price, history_days):
+        now_minute = int(time.time() // 60 * 60)
+        price = start_price
+        for start in range(now_minute - int(history_days * 86400), now_minute, 60):
+            open_ = price
+            price = self._round_price(price * math.exp(self.rng.gauss(0, self.SIGMA_1M)))
+            high = self._round_price(max(open_, price) * (1 + abs(self.rng.gauss(0, self.SIGMA_1M / 2))))
+            low = self._round_price(min(open_, price) * (1 - abs(self.rng.gauss(0, self.SIGMA_1M / 2))))
+            volume = round(self.rng.expovariate(1 / (self.avg_level_size * 20)), 3)
+            self.candles.append([start, open_, high, low, price, volume])
+        self.current = [now_minute, price, price, price, price, 0.0]
+
+    def _round_price(self, price):
+        return round(round(price / self.tick_size) * self.tick_size, self.decimals)
+
+    def _new_level_size(self):
+        size = self.rng.expovariate(1 / self.avg_level_size) + self.qty_step
+        return round(round(size / self.qty_step) * self.qty_step, 8)
+
+    def price_str(self, ticks):
+        return f'{ticks * self.tick_size:.{self.decimals}f}'
+
+    def _entry(self, ticks, side, size=None):
+        entry = {'price': self.price_str(ticks), 'symbol': self.pair,
+                 'id': str(int(round(ticks * self.tick_size * 10000))), 'side': side}
+        if size is not None:
+            entry['size'] = size
+        return entry
+
+    def order_book(self):
+        """ Book sorted the way pybit.WebSocket stores it: Buy side then Sell side, ascending prices """
+        book = [self._entry(t, 'Buy', self.bids[t]) for t in sorted(self.bids)]
+        book.extend(self._entry(t, 'Sell', self.asks[t]) for t in sorted(self.asks))
+        return book
+
+    def step_book(self):
+        """ Random size changes on a few levels. Returns the orderBookL2_25 delta. """
+        update = []
+        for _ in range(self.rng.randint(1, 4)):
+            side = self.rng.choice(['Buy', 'Sell'])
+            levels = self.bids if side == 'Buy' else self.asks
+            ticks = self.rng.choice(list(levels))
+            levels[ticks] = round(max(self.qty_step, levels[ticks] * self.rng.uniform(0.5, 1.5)
+                                      // self.qty_step * self.qty_step), 8)
+            update.append(self._entry(ticks, side, levels[ticks]))
+        self.cross_seq += 1
+        return {'delete': [], 'update': update, 'insert': []}
+
+    def trade(self, now):
+        """
+            A random market order hitting the best level.
+            Returns the trade and the orderBookL2_25 delta it caused.
+        """
+        side = self.rng.choice(['Buy', 'Sell'])
+        ticks = self.bid + 1 if side == 'Buy' else self.bid
+        levels = self.asks if side == 'Buy' else self.bids
+        size = round(min(levels[ticks], self.qty_step + self.rng.expovariate(1 / (self.avg_level_size * 0.6))
+                         // self.qty_step * self.qty_step), 8)
+        delta = {'delete': [], 'update': [], 'insert': []}
+        levels[ticks] = round(levels[ticks] - size, 8)
+        if levels[ticks] < self.qty_step:
+            self._shift(1 if side == 'Buy' else -1, delta)
+        else:
+            delta['update'].append(self._entry(ticks, 'Sell' if side == 'Buy' else 'Buy', levels[ticks]))
+        self.cross_seq += 1
+
+        price = ticks * self.tick_size
+        self.current[2] = max(self.current[2], price)
+        self.current[3] = min(self.current[3], price)
+        tick_direction = 'ZeroPlusTick' if price == self.current[4] else \
+            'PlusTick' if price > self.current[4] else 'MinusTick'
+        self.current[4] = round(price, self.decimals)
+        self.current[5] = round(self.current[5] + size, 8)
+        trade = {
+            'symbol': self.pair,
+            'tick_direction': tick_direction,
+            'price': self.price_str(ticks),
+            'size': size,
+            'timestamp': dt.datetime.fromtimestamp(now, tz=dt.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+            'trade_time_ms': str(int(now * 1000)),
+            'side': side,
+            'trade_id': str(uuid.uuid4())
+        }
+        return trade, delta
+
+    def _shift(self, direction, delta):
+        """ Move the book one tick up (+1) or down (-1) after the best level has been taken """
+        if direction > 0:
+            del self.asks[self.bid + 1]
+            delta['delete'].append(self._entry(self.bid + 1, 'Sell'))
+            del self.bids[self.bid - self.BOOK_DEPTH + 1]
+            delta['delete'].append(self._entry(self.bid - self.BOOK_DEPTH + 1, 'Buy'))
+            self.bid += 1
+            self.bids[self.bid] = self._new_level_size()
+            delta['insert'].append(self._entry(self.bid, 'Buy', self.bids[self.bid]))
+            self.asks[self.bid + self.BOOK_DEPTH] = self._new_level_size()
+            delta['insert'].append(self._entry(self.bid + self.BOOK_DEPTH, 'Sell', self.asks[self.bid + self.BOOK_DEPTH]))
+        else:
+            del self.bids[self.bid]
+            delta['delete'].append(self._entry(self.bid, 'Buy'))
+            del self.asks[self.bid + self.BOOK_DEPTH]
+            delta['delete'].append(self._entry(self.bid + self.BOOK_DEPTH, 'Sell'))
+            self.bid -= 1
+            self.asks[self.bid + 1] = self._new_level_size()
+            delta['insert'].append(self._entry(self.bid + 1, 'Sell', self.asks[self.bid + 1]))
+            self.bids[self.bid - self.BOOK_DEPTH + 1] = self._new_level_size()
+            delta['insert'].append(self._entry(self.bid - self.BOOK_DEPTH + 1, 'Buy',
+                                               self.bids[self.bid - self.BOOK_DEPTH + 1]))
+
+    def roll_minute(self, now):
+        """ Close the current 1m candle if its minute is over. Returns True if a candle was closed. """
+        if now < self.current[0] + 60:
+            return False
+        while now >= self.current[0] + 60:
+            self.candles.append(self.current)
+            close = self.current[4]
+            self.current = [self.current[0] + 60, close, close, close, close, 0.0]
+        return True
+
+    def candle(self, minutes, start):
+        """ Aggregate the 1m candles of the period starting at 'start'. None if there is no data. """
+        first = (start - self.candles[0][0]) // 60
+        if first < 0:
+            first = 0
+        rows = self.candles[first: first + minutes]
+        if self.current[0] < start + minutes * 60 and self.current[0] >= start:
+            rows = rows + [self.current]
+        rows = [r for r in rows if start <= r[0] < start + minutes * 60]
+        if not rows:
+            return None
+        return [start, rows[0][1], max(r[2] for r in rows), min(r[3] for r in rows), rows[-1][4],
+                round(sum(r[5] for r in rows), 8)]
+
+    def period_start(self, minutes, timestamp):
+        return int(timestamp // (minutes * 60) * (minutes * 60))
+
+
+class WSClient:
+    """
+        One websocket connection. Messages are sent by a dedicated thread so the market loop never
+        blocks on a slow client, and to apply the simulated latency.
+    """
+
+    def __init__(self, handler, private, latency, jitter, rng):
+        self.handler = handler
+        self.private = private
+        self.topics = set()
+        self.alive = True
+        self._latency = latency
+        self._jitter = jitter
+        self._rng = rng
+        self._queue = queue.Queue()
+        self._send_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run_sender, daemon=True)
+        self._thread.start()
+
+    def send(self, text):
+        due = time.time() + self._latency + (self._rng.uniform(0, self._jitter) if self._jitter else 0)
+        self._queue.put((due, text))
+
+    def close(self):
+        self.alive = False
+        self._queue.put((0, None))
+
+    def send_frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([length])
+        elif length < 65536:
+            header += bytes([126]) + struct.pack('!H', length)
+        else:
+            header += bytes([127]) + struct.pack('!Q', length)
+        with self._send_lock:
+            self.handler.wfile.write(header + payload)
+
+    def _run_sender(self):
+        while self.alive:
+            due, text = self._queue.get()
+            if text is None:
+                break
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.send_frame(0x1, text.encode('utf-8'))
+            except OSError:
+                self.alive = False
+
+
+class LocalBybitServer:
+
+    def __init__(self, pair='BTCUSDT', host='127.0.0.1', port=8090, balance=10000.0, start_price=None,
+                 history_days=3, latency_ms=0.0, jitter_ms=0.0, ws_latency_ms=0.0, book_rate=10.0,
+                 trade_rate=5.0, candle_rate=1.0, stats_secs=10, seed=None):
+        """
+            latency_ms, jitter_ms: delay added to each REST response, jitter is uniform in [0, jitter_ms]
+            ws_latency_ms: delay added to each websocket push (the same jitter is applied)
+            book_rate: orderBookL2_25 deltas per second, not counting the ones caused by trades
+            trade_rate: average trades per second (Poisson)
+            candle_rate: unconfirmed candle pushes per second. Confirmed candles are pushed at the close.
+            Rates set to 0 disable the stream.
+            seed: seed of the market random walk. The simulated latencies are not part of it, they
+            are drawn by the request threads.
+        """
+        if pair not in INSTRUMENTS:
+            raise Exception(f'Unsupported pair [{pair}]. Supported pairs: {list(INSTRUMENTS.keys())}')
+        self._logger = Logger.get_module_logger(__name__)
+        self.pair = pair
+        self.host = host
+        self.port = port
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.ws_latency = ws_latency_ms / 1000
+        self.book_rate = book_rate
+        self.trade_rate = trade_rate
+        self.candle_rate = candle_rate
+        self.stats_secs = stats_secs
+        # Latency jitter, shared by the REST and websocket threads
+        self.rng = random.Random(seed)
+        # Only used by the market thread, so that a seed gives the same market on each run
+        self._market_rng = random.Random(seed)
+
+        self.pair_details = pair_details(pair)
+        self.market = MarketSimulator(pair, start_price or INSTRUMENTS[pair]['start_price'], history_days,
+                                      self._market_rng)
+        self.engine = MatchingEngine(pair, balance, listener=self._on_engine_event)
+        self.engine.set_instrument(self.pair_details)
+        self.rest = PaperHTTP(None, self.engine, 'USDT')
+
+        self._lock = threading.RLock()
+        self._clients = []
+        self._stop = threading.Event()
+        self._stats = {'rest': 0, 'ws': 0}
+
+        self.routes = {
+            '/v2/public/time': self._server_time,
+            '/v2/public/symbols': self._query_symbol,
+            '/public/linear/kline': self._query_kline,
+            '/private/linear/order/create': self.rest.place_active_order,
+            '/private/linear/order/replace': self.rest.replace_active_order,
+            '/private/linear/order/cancel': self.rest.cancel_active_order,
+            '/private/linear/order/cancel-all': self.rest.cancel_all_active_orders,
+            '/private/linear/order/search': self.rest.query_active_order,
+            '/private/linear/order/list': self.rest.get_active_order,
+            '/private/linear/stop-order/list': self.rest.get_conditional_order,
+            '/private/linear/position/list': self.rest.my_position,
+            '/private/linear/position/set-leverage': self.rest.set_leverage,
+            '/private/linear/position/trading-stop': self.rest.set_trading_stop,
+            '/private/linear/position/switch-mode': self.rest.position_mode_switch,
+            '/private/linear/position/set-auto-add-margin': self.rest.set_auto_add_margin,
+            '/private/linear/position/switch-isolated': self.rest.cross_isolated_margin_switch,
+            '/private/linear/tpsl/switch-mode': self.rest.full_partial_position_tp_sl_switch,
+            '/private/linear/trade/execution/list': self.rest.user_trade_records,
+            '/private/linear/trade/closed-pnl/list': self.rest.closed_profit_and_loss,
+            '/v2/private/wallet/balance': self.rest.get_wallet_balance,
+        }
+
+    def serve_forever(self):
+        server = ThreadingHTTPServer((self.host, self.port), self._handler_class())
+        server.daemon_threads = True
+        threading.Thread(target=self._run_market, name='LocalBybitMarket', daemon=True).start()
+        if self.stats_secs:
+            threading.Thread(target=self._run_stats, name='LocalBybitStats', daemon=True).start()
+        self._logger.info(f'Local Bybit server for {self.pair} listening on http://{self.host}:{self.port}, '
+                          f'ws://{self.host}:{self.port}/realtime_public, '
+                          f'ws://{self.host}:{self.port}/realtime_private')
+        try:
+            server.serve_forever()
+        finally:
+            self._stop.set()
+            server.server_close()
+
+    """
+        ----------------------------------------------------------------------------
+           REST
+        ----------------------------------------------------------------------------
+    """
+
+    @staticmethod
+    def _response(result):
+        return {'ret_code': 0, 'ret_msg': 'OK', 'ext_code': '', 'result': result, 'time_now': f'{time.time():.6f}'}
+
+    def handle_rest(self, path, params):
+        route = self.routes.get(path)
+        if route is None:
+            return {'ret_code': 10001, 'ret_msg': f'Unknown endpoint [{path}]', 'result': None,
+                    'time_now': f'{time.time():.6f}'}
+        for key in AUTH_PARAMS:
+            params.pop(key, None)
+        try:
+            response = route(**params)
+        except InvalidRequestError as e:
+            response = {'ret_code': e.status_code, 'ret_msg': e.message, 'ext_code': '', 'result': None,
+                        'time_now': f'{time.time():.6f}'}
+        except (KeyError, TypeError, ValueError) as e:
+            response = {'ret_code': 10001, 'ret_msg': f'params error: {e}', 'ext_code': '', 'result': None,
+                        'time_now': f'{time.time():.6f}'}
+        if path.startswith('/private'):
+            response['rate_limit_status'] = 99
+            response['rate_limit_reset_ms'] = int(time.time() * 1000)
+            response['rate_limit'] = 100
+        self._stats['rest'] += 1
+        return response
+
+    def _server_time(self, **kwargs):
+        return self._response({})
+
+    def _query_symbol(self, **kwargs):
+        return self._response([self.pair_details])
+
+    def _query_kline(self, symbol, interval, limit=200, **kwargs):
+        if interval not in INTERVAL_MINUTES:
+            raise InvalidRequestError(request='query_kline', message=f'invalid interval [{interval}]',
+                                      status_code=10001, time=dt.datetime.now(dt.timezone.utc).strftime("%H:%M:%S"))
+        minutes = INTERVAL_MINUTES[interval]
+        result = []
+        with self._lock:
+            start = max(self.market.period_start(minutes, int(float(kwargs['from']))), self.market.candles[0][0])
+            start = self.market.period_start(minutes, start)
+            while len(result) < min(int(limit), 200) and start <= self.market.current[0]:
+                candle = self.market.candle(minutes, start)
+                if candle:
+                    result.append({
+                        'id': len(result) + 1, 'symbol': symbol, 'period': interval, 'interval': interval,
+                        'start_at': start, 'open_time': start, 'open': candle[1], 'high': candle[2],
+                        'low': candle[3], 'close': candle[4], 'volume': candle[5],
+                        'turnover': round(candle[5] * candle[4], 4)
+                    })
+                start += minutes * 60
+        return self._response(result)
+
+    """
+        ----------------------------------------------------------------------------
+           WebSockets
+        ----------------------------------------------------------------------------
+    """
+
+    def serve_websocket(self, handler, private):
+        key = handler.headers.get('Sec-WebSocket-Key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        handler.send_response(101, 'Switching Protocols')
+        handler.send_header('Upgrade', 'websocket')
+        handler.send_header('Connection', 'Upgrade')
+        handler.send_header('Sec-WebSocket-Accept', accept)
+        handler.end_headers()
+
+        client = WSClient(handler, private, self.ws_latency, self.jitter, self.rng)
+        with self._lock:
+            self._clients.append(client)
+        try:
+            while client.alive:
+                opcode, payload = self._read_frame(handler.rfile)
+                if opcode is None or opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    client.send_frame(0xA, payload)
+                elif opcode == 0x1:
+                    self._on_ws_request(client, json.loads(payload.decode('utf-8')))
+        except (OSError, ValueError) as e:
+            self._logger.debug(f'WebSocket client disconnected: {e}')
+        finally:
+            client.close()
+            with self._lock:
+                self._clients.remove(client)
+
+    @staticmethod
+    def _read_frame(rfile):
+        header = rfile.read(2)
+        if len(header) < 2:
+            return None, None
+        opcode = header[0] & 0x0F
+        length = header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', rfile.read(8))[0]
+        mask = rfile.read(4) if header[1] & 0x80 else None
+        payload = rfile.read(length)
+        if mask:
+            payload = (int.from_bytes(payload, 'big') ^
+                       int.from_bytes((mask * (length // 4 + 1))[:length], 'big')).to_bytes(length, 'big')
+        return opcode, payload
+
+    def _on_ws_request(self, client, request):
+        op = request.get('op')
+        response = {'success': True, 'ret_msg': '', 'conn_id': str(id(client)), 'request': request}
+        if op == 'ping':
+            response['ret_msg'] = 'pong'
+            client.send(json.dumps(response))
+        elif op == 'auth':
+            client.send(json.dumps(response))
+        elif op == 'subscribe':
+            with self._lock:
+                client.send(json.dumps(response))
+                for topic in request.get('args', []):
+                    client.topics.add(topic)
+                    if topic.startswith('orderBookL2_25'):
+                        client.send(json.dumps({
+                            'topic': topic, 'type': 'snapshot', 'data': {'order_book': self.market.order_book()},
+                            'cross_seq': self.market.cross_seq, 'timestamp_e6': int(time.time() * 1e6)
+                        }))
+            if client.private:
+                self.engine.publish_account()
+        else:
+            response['success'] = False
+            response['ret_msg'] = f'unknown op [{op}]'
+            client.send(json.dumps(response))
+
+    def _broadcast(self, topic, message, private=False):
+        text = None
+        with self._lock:
+            for client in self._clients:
+                if client.private == private and topic in client.topics:
+                    text = text or json.dumps(message)
+                    client.send(text)
+                    self._stats['ws'] += 1
+
+    def _on_engine_event(self, topic, data):
+        self._broadcast(topic, {'topic': topic, 'action': 'update', 'data': data}, private=True)
+
+    """
+        ----------------------------------------------------------------------------
+           Market Loop
+        ----------------------------------------------------------------------------
+    """
+
+    def _run_market(self):
+        orderbook_topic = f'orderBookL2_25.{self.pair}'
+        trade_topic = f'trade.{self.pair}'
+        now = time.time()
+        next_book = now + 1 / self.book_rate if self.book_rate else math.inf
+        next_trade = now + self._market_rng.expovariate(self.trade_rate) if self.trade_rate else math.inf
+        next_candle = now + 1 / self.candle_rate if self.candle_rate else math.inf
+
+        while not self._stop.is_set():
+            now = time.time()
+            # The engine is never called with self._lock held: it takes its own lock, and REST threads
+            # holding the engine lock publish to the websocket clients under self._lock
+            if now >= next_trade:
+                with self._lock:
+                    trade, delta = self.market.trade(now)
+                    self._publish_delta(orderbook_topic, delta, now)
+                    self._broadcast(trade_topic, {'topic': trade_topic, 'data': [trade]})
+                    order_book = self.market.order_book()
+                self.engine.on_trade(trade['price'], trade['size'], trade['side'])
+                self.engine.update_book(order_book)
+                next_trade = now + self._market_rng.expovariate(self.trade_rate)
+            if now >= next_book:
+                with self._lock:
+                    self._publish_delta(orderbook_topic, self.market.step_book(), now)
+                    order_book = self.market.order_book()
+                self.engine.update_book(order_book)
+                next_book = max(next_book + 1 / self.book_rate, now)
+            with self._lock:
+                closed = self.market.roll_minute(now)
+            if closed or now >= next_candle:
+                self._publish_candles(closed, now)
+                if now >= next_candle:
+                    next_candle = max(next_candle + 1 / self.candle_rate, now)
+            time.sleep(max(0.0, min(next_book, next_trade, next_candle, self.market.current[0] + 60) - time.time()))
+
+    def _publish_delta(self, topic, delta, now):
+        self._broadcast(topic, {'topic': topic, 'type': 'delta', 'data': dict(delta, transactTimeE6=0),
+                                'cross_seq': self.market.cross_seq, 'timestamp_e6': int(now * 1e6)})
+
+    def _publish_candles(self, closed, now):
+        with self._lock:
+            topics = set(t for c in self._clients if not c.private for t in c.topics if t.startswith('candle.'))
+            for topic in topics:
+                interval = topic.split('.')[1]
+                minutes = INTERVAL_MINUTES[interval]
+                start = self.market.period_start(minutes, self.market.current[0])
+                # Confirmed candle of the period that just ended, then the new one
+                if closed and start == self.market.current[0]:
+                    previous = self.market.period_start(minutes, start - 1)
+                    self._broadcast(topic, self._candle_message(topic, interval, minutes, previous, True, now))
+                self._broadcast(topic, self._candle_message(topic, interval, minutes, start, False, now))
+
+    def _candle_message(self, topic, interval, minutes, start, confirm, now):
+        candle = self.market.candle(minutes, start)
+        return {'topic': topic, 'data': [{
+            'start': start, 'end': start + minutes * 60, 'period': interval,
+            'open': candle[1], 'close': candle[4], 'high': candle[2], 'low': candle[3],
+            'volume': str(candle[5]), 'turnover': str(round(candle[5] * candle[4], 4)),
+            'confirm': confirm, 'cross_seq': self.market.cross_seq, 'timestamp': int(now * 1e6)
+        }], 'timestamp_e6': int(now * 1e6)}
+
+    def _run_stats(self):
+        while not self._stop.wait(self.stats_secs):
+            rest, ws = self._stats['rest'], self._stats['ws']
+            self._stats['rest'] = self._stats['ws'] = 0
+            self._logger.info(f'{len(self._clients)} ws clients, {rest / self.stats_secs:.1f} REST req/s, '
+                              f'{ws / self.stats_secs:.1f} ws msg/s, last price {self.market.current[4]}')
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if self.headers.get('Upgrade', '').lower() == 'websocket':
+                    server.serve_websocket(self, private=url.path.endswith('private'))
+                    self.close_connection = True
+                    return
+                self._send_json(url.path, dict(parse_qsl(url.query)))
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                self._send_json(urlparse(self.path).path, json.loads(body) if body else {})
+
+            def _send_json(self, path, params):
+                if server.latency or server.jitter:
+                    time.sleep(server.latency + server.rng.uniform(0, server.jitter))
+                body = json.dumps(server.handle_rest(path, params)).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Bybit linear perpetual API.')
+    parser.add_argument('--pair', default='BTCUSDT', choices=list(INSTRUMENTS.keys()))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--balance', type=float, default=10000.0, help='USDT wallet balance')
+    parser.add_argument('--start-price', type=float, default=None)
+    parser.add_argument('--history-days', type=float, default=3, help='days of 1m candles available to query_kline')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='REST response latency')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='uniform jitter added to latencies')
+    parser.add_argument('--ws-latency-ms', type=float, default=0.0, help='websocket push latency')
+    parser.add_argument('--book-rate', type=float, default=10.0, help='orderbook deltas per second')
+    parser.add_argument('--trade-rate', type=float, default=5.0, help='average trades per second')
+    parser.add_argument('--candle-rate', type=float, default=1.0, help='candle pushes per second')
+    parser.add_argument('--stats-secs', type=int, default=10, help='message rate logging period, 0 to disable')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    LocalBybitServer(pair=args.pair, host=args.host, port=args.port, balance=args.balance,
+                     start_price=args.start_price, history_days=args.history_days, latency_ms=args.latency_ms,
+                     jitter_ms=args.jitter_ms, ws_latency_ms=args.ws_latency_ms, book_rate=args.book_rate,
+                     trade_rate=args.trade_rate, candle_rate=args.candle_rate, stats_secs=args.stats_secs,
+                     seed=args.seed).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+    Append-only recording of the websocket messages received by the bot, and the reader used to seek in it.
+
+    Log file (.mdl): a sequence of chunks. Each chunk is a CHUNK_HEADER followed by a zlib compressed payload
+    of records, one per line: "<timestamp>\\t<source>\\t<topic>\\t<raw message>\\n".
+        - timestamp: local reception time, in seconds
+        - source: name of the websocket, 'public' or 'private'
+        - topic: topic of the message, empty for subscription/auth/pong responses
+    Records are written in reception order, over all the sources.
+
+    Index file (.mdl.idx): one line per chunk "<first_ts> <last_ts> <offset> <count>". The index is written
+    after its chunk. Chunks missing from the index (crash) are found by scanning the chunk headers.
+"""
+import bisect
+import os
+import struct
+import threading
+import time
+import zlib
+
+from logging_.Logger import Logger
+
+MAGIC = b'MDL1'
+# magic, first_ts, last_ts, nb records, compressed payload length
+CHUNK_HEADER = struct.Struct('<4sddII')
+
+
+class MarketDataRecorder:
+    # A chunk is written when it holds CHUNK_SIZE bytes of messages or is FLUSH_SECS old
+    CHUNK_SIZE = 1 << 20
+    FLUSH_SECS = 5
+
+    def __init__(self, file_name, chunk_size=CHUNK_SIZE, flush_secs=FLUSH_SECS, compression_level=6):
+        self._logger = Logger.get_module_logger(__name__)
+        self.file_name = file_name
+        self.index_file_name = file_name + '.idx'
+        self.chunk_size = chunk_size
+        self.flush_secs = flush_secs
+        self.compression_level = compression_level
+        if os.path.dirname(file_name):
+            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+
+        self._records = []
+        self._size = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self.nb_records = 0
+        self.nb_chunks = 0
+
+        self._thread = threading.Thread(target=self._run, name='MarketDataRecorder', daemon=True)
+        self._thread.start()
+        self._logger.info(f'Recording websocket messages to {file_name}.')
+
+    def listener(self, source):
+        """ Listener to register on a pybit.WebSocket with add_listener() """
+        def record_message(message, msg_json):
+            topic = msg_json.get('topic', '') if isinstance(msg_json, dict) else ''
+            self.record(source, topic, message)
+        return record_message
+
+    def record(self, source, topic, message, timestamp=None):
+        """ Called from the websocket threads, only appends to the buffer """
+        # Newlines can only be whitespace in a JSON message
+        if '\n' in message:
+            message = message.replace('\n', ' ')
+        line = f'{time.time() if timestamp is None else timestamp:.6f}\t{source}\t{topic}\t{message}\n'
+        with self._lock:
+            self._records.append(line)
+            self._size += len(line)
+            if self._size >= self.chunk_size:
+                self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            records = self._records
+            self._records = []
+            self._size = 0
+        if not records:
+            return
+        first_ts = float(records[0][:records[0].index('\t')])
+        last_ts = float(records[-1][:records[-1].index('\t')])
+        payload = zlib.compress(''.join(records).encode('utf-8'), self.compression_level)
+        with self._write_lock:
+            with open(self.file_name, 'ab') as f:
+                offset = f.tell()
+                f.write(CHUNK_HEADER.pack(MAGIC, first_ts, last_ts, len(records), len(payload)))
+                f.write(payload)
+            with open(self.index_file_name, 'a') as f:
+                f.write(f'{first_ts:.6f} {last_ts:.6f} {offset} {len(records)}\n')
+            self.nb_records += len(records)
+            self.nb_chunks += 1
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self._logger.info(f'Recorded {self.nb_records} messages in {self.nb_chunks} chunks to {self.file_name}.')
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_secs)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                self._logger.exception(e)
+
+
+class MarketDataReader:
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        # Chunks as (first_ts, last_ts, offset, count), in file order
+        self.chunks = []
+        self._load_index()
+        self._last_ts = [c[1] for c in self.chunks]
+
+    def _load_index(self):
+        if os.path.exists(self.file_name + '.idx'):
+            with open(self.file_name + '.idx') as f:
+                for line in f:
+                    values = line.split()
+                    if len(values) == 4:
+                        self.chunks.append((float(values[0]), float(values[1]), int(values[2]), int(values[3])))
+        # Chunks written after the last indexed one
+        offset = 0
+        if self.chunks:
+            with open(self.file_name, 'rb') as f:
+                f.seek(self.chunks[-1][2])
+                header = f.read(CHUNK_HEADER.size)
+            offset = self.chunks[-1][2] + CHUNK_HEADER.size + CHUNK_HEADER.unpack(header)[4]
+        self.chunks.extend(self._scan(offset))
+
+    def _scan(self, offset):
+        chunks = []
+        file_size = os.path.getsize(self.file_name)
+        with open(self.file_name, 'rb') as f:
+            f.seek(offset)
+            while offset + CHUNK_HEADER.size <= file_size:
+                magic, first_ts, last_ts, count, length = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+                # Truncated or corrupted chunk at the end of the file
+                if magic != MAGIC or offset + CHUNK_HEADER.size + length > file_size:
+                    break
+                chunks.append((first_ts, last_ts, offset, count))
+                offset += CHUNK_HEADER.size + length
+                f.seek(offset)
+        return chunks
+
+    def time_range(self):
+        if not self.chunks:
+            return None, None
+        return self.chunks[0][0], self.chunks[-1][1]
+
+    def nb_records(self):
+        return sum(c[3] for c in self.chunks)
+
+    def read(self, start=None, end=None, sources=None, topics=None):
+        """
+            Yields (timestamp, source, topic, message) in recording order.
+            start/end: timestamps, the first chunk is found with the index
+            sources/topics: optional collections used to filter records before returning them
+        """
+        first = bisect.bisect_left(self._last_ts, start) if start is not None else 0
+        with open(self.file_name, 'rb') as f:
+            for first_ts, last_ts, offset, count in self.chunks[first:]:
+                if end is not None and first_ts > end:
+                    return
+                f.seek(offset)
+                length = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))[4]
+                for line in zlib.decompress(f.read(length)).decode('utf-8').split('\n')[:-1]:
+                    ts, source, topic, message = line.split('\t', 3)
+                    ts = float(ts)
+                    if start is not None and ts < start:
+                        continue
+                    if end is not None and ts > end:
+                        return
+                    if (sources is None or source in sources) and (topics is None or topic in topics):
+                        yield ts, source, topic, message
@@ -0,0 +1,138 @@
+"""
+    Replays a recording of exchange.MarketDataRecorder into pybit.WebSocket consumers.
+
+    The messages go through the regular WebSocket._on_message(), so CandleHandler, Orderbook, strategies, ...
+    see them exactly like during the recorded session. A single thread delivers all the sources in recording
+    order, the replay is deterministic.
+
+    speed: 1 = real time, N = N times faster, 0 = as fast as possible.
+
+    Usage:
+        python -m exchange.MarketDataReplayer data/recordings/BTCUSDT-20220101-000000.mdl --info
+        python -m exchange.MarketDataReplayer data/recordings/BTCUSDT-20220101-000000.mdl --bench
+"""
+import argparse
+import datetime as dt
+import logging
+import threading
+import time
+
+from exchange.MarketDataRecorder import MarketDataReader
+from logging_.Logger import Logger
+from pybit import WebSocket
+
+
+class ReplayWebSocket(WebSocket):
+    """
+        WebSocket that never connects. Its messages are pushed by the MarketDataReplayer.
+    """
+
+    def __init__(self, endpoint, subscriptions, logger, api_key=None, api_secret=None, max_data_length=500):
+        super().__init__(endpoint, api_key=api_key, api_secret=api_secret, subscriptions=subscriptions,
+                         logger=logger, max_data_length=max_data_length)
+
+    def ping(self):
+        pass
+
+    def exit(self):
+        self.exited = True
+
+    def _connect(self, url):
+        self.logger.debug(f'Replay {self.wsName} WebSocket ready.')
+        for topic in self.subscriptions:
+            if topic not in self.data:
+                self.data[topic] = {}
+
+
+class MarketDataReplayer:
+
+    def __init__(self, file_name, speed=1.0, start=None, end=None):
+        self._logger = Logger.get_module_logger(__name__)
+        self.reader = MarketDataReader(file_name)
+        self.speed = speed
+        self.start_ts, self.end_ts = self.reader.time_range()
+        if start is not None:
+            self.start_ts = max(start, self.start_ts)
+        if end is not None:
+            self.end_ts = min(end, self.end_ts)
+        self._sockets = {}
+        self._thread = None
+        self.finished = threading.Event()
+        self.nb_messages = 0
+        self.elapsed_time = 0.0
+        # Recording time of the last message delivered. Used as the current time by replay consumers.
+        self.current_ts = self.start_ts
+
+    def create_websocket(self, source, endpoint, subscriptions, logger, api_key=None, api_secret=None):
+        """ A ReplayWebSocket receiving the recorded messages of 'source' for its subscribed topics """
+        ws = ReplayWebSocket(endpoint, subscriptions, logger, api_key=api_key, api_secret=api_secret)
+        self._sockets[source] = ws
+        return ws
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='MarketDataReplayer', daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+    def run(self):
+        subscriptions = {source: set(ws.subscriptions) for source, ws in self._sockets.items()}
+        wall_start = time.time()
+        self._logger.info(f'Replaying {self.reader.file_name} from {self._ts_str(self.start_ts)} '
+                          f'to {self._ts_str(self.end_ts)} at speed {self.speed if self.speed else "max"}.')
+        try:
+            for ts, source, topic, message in self.reader.read(self.start_ts, self.end_ts, sources=self._sockets):
+                if topic not in subscriptions[source]:
+                    continue
+                if self.speed:
+                    delay = wall_start + (ts - self.start_ts) / self.speed - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.current_ts = ts
+                self._sockets[source]._on_message(message)
+                self.nb_messages += 1
+        finally:
+            self.elapsed_time = time.time() - wall_start
+            self.finished.set()
+            self._logger.info(f'Replay completed: {self.nb_messages} messages in {self.elapsed_time:.1f}s '
+                              f'({self.nb_messages / max(self.elapsed_time, 1e-9):.0f} msg/s).')
+
+    @staticmethod
+    def _ts_str(ts):
+        return dt.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') if ts else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a websocket recording.')
+    parser.add_argument('file')
+    parser.add_argument('--info', action='store_true', help='time range and number of messages per topic')
+    parser.add_argument('--bench', action='store_true', help='replay all the topics at max speed')
+    parser.add_argument('--speed', type=float, default=0)
+    args = parser.parse_args()
+
+    reader = MarketDataReader(args.file)
+    first_ts, last_ts = reader.time_range()
+    topics = {}
+    for ts, source, topic, message in reader.read():
+        topics.setdefault(source, {}).setdefault(topic, 0)
+        topics[source][topic] += 1
+    print(f'{args.file}: {len(reader.chunks)} chunks, {reader.nb_records()} messages, '
+          f'from {MarketDataReplayer._ts_str(first_ts)} to {MarketDataReplayer._ts_str(last_ts)}')
+    for source, counts in topics.items():
+        for topic, count in sorted(counts.items()):
+            print(f'    {source:8} {topic if topic else "<responses>":40} {count}')
+
+    if args.bench:
+        replayer = MarketDataReplayer(args.file, speed=args.speed)
+        logger = logging.getLogger('pybit')
+        for source, counts in topics.items():
+            subscriptions = [t for t in counts if t]
+            if subscriptions:
+                replayer.create_websocket(source, f'replay://{source}', subscriptions, logger)
+        replayer.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,650 @@
+import collections
+import datetime as dt
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from enums.BybitEnums import OrderSide, OrderType, OrderStatus, TimeInForce, ExecType
+from logging_.Logger import Logger
+from pybit.exceptions import InvalidRequestError
+
+
+class MatchingEngine:
+    """
+        Simulated matching engine for a single USDT linear perpetual pair, in hedge mode (BothSide).
+
+        The engine keeps its own orders, positions and wallet, and fills them against market data
+        pushed from the outside:
+         - update_book(): full orderBookL2_25 book after each snapshot/delta
+         - on_trade(): each print of the public trade tape
+
+        Limit orders (PostOnly):
+         - A PostOnly order that would take liquidity is cancelled, like on Bybit.
+         - When placed, the order joins the back of the queue at its price level. The queue ahead
+           of us is the size displayed at that level in the book.
+         - Trades at our price consume the queue ahead first, then fill our order.
+           Size removed from the level without trades (cancels) is assumed to be evenly spread
+           in the queue and reduces the queue ahead proportionally.
+         - A trade through our price, or the opposite side of the book crossing our price, fills
+           the remaining qty.
+         - Amending the price, or increasing the qty, sends the order to the back of the queue at its level.
+
+        Market orders walk the book and pay the taker fee.
+        Position stop_loss/take_profit are triggered on the last traded price.
+
+        All order/execution/position/wallet changes are sent to listener(topic, data_list) using the
+        same format as the Bybit private websocket topics. They are delivered in order, after the engine
+        lock has been released, so that a listener can take its own locks without deadlocking with a
+        thread pushing market data to the engine.
+    """
+    # Bybit default linear fees, overwritten by set_instrument() with the pair details
+    MAKER_FEE = -0.00025
+    TAKER_FEE = 0.00075
+
+    ACTIVE_STATUSES = [OrderStatus.Created, OrderStatus.New, OrderStatus.PartiallyFilled]
+
+    # Keys returned by the REST order list endpoint (/private/linear/order/list)
+    REST_ORDER_KEYS = ['order_id', 'user_id', 'symbol', 'side', 'order_type', 'price', 'qty', 'time_in_force',
+                       'order_status', 'take_profit', 'stop_loss', 'last_exec_price', 'cum_exec_qty',
+                       'cum_exec_value', 'cum_exec_fee', 'order_link_id', 'reduce_only', 'close_on_trigger',
+                       'created_time', 'updated_time']
+
+    def __init__(self, pair, balance, leverage_long=1, leverage_short=1, listener=None, clock=time.time):
+        """
+            listener: callable(topic, data_list) receiving the private websocket events
+            clock: callable returning the current time in seconds. Replays use a simulated clock.
+        """
+        self._logger = Logger.get_module_logger(__name__)
+        self._lock = threading.RLock()
+        # Events published under the lock, delivered to the listener once it is released
+        self._events = collections.deque()
+        self._depth = 0
+        self._deliver_lock = threading.Lock()
+        self.pair = pair
+        self.listener = listener
+        self.clock = clock
+
+        self.maker_fee = self.MAKER_FEE
+        self.taker_fee = self.TAKER_FEE
+        self.tick_size = 0.0
+
+        # Market data
+        self.bids = {}
+        self.asks = {}
+        self.best_bid = 0.0
+        self.best_ask = 0.0
+        self.last_price = 0.0
+
+        # Account state
+        self.orders = {}
+        self.executions = []
+        self.closed_pnl = []
+        self.wallet_balance = float(balance)
+        self.available_balance = float(balance)
+        self.positions = {
+            OrderSide.Buy: self._new_position(OrderSide.Buy, leverage_long),
+            OrderSide.Sell: self._new_position(OrderSide.Sell, leverage_short)
+        }
+
+        # Queue position tracking for resting limit orders, by order_id
+        self._queue_ahead = {}
+        self._level_size = {}
+
+    def set_instrument(self, pair_details):
+        """ Use the fees and tick size of the pair details returned by query_symbol """
+        with self._locked():
+            self.maker_fee = float(pair_details['maker_fee'])
+            self.taker_fee = float(pair_details['taker_fee'])
+            self.tick_size = float(pair_details['price_filter']['tick_size'])
+
+    def publish_account(self):
+        """ Push the initial position and wallet state to the listener """
+        with self._locked():
+            self._publish('position', [self._position_dict(p) for p in self.positions.values()])
+            self._publish_wallet()
+
+    """
+        ----------------------------------------------------------------------------
+           Market Data
+        ----------------------------------------------------------------------------
+    """
+
+    def update_book(self, order_book):
+        """
+            order_book: list of {'price', 'side', 'size', ...} entries, as kept by pybit.WebSocket
+            for the orderBookL2_25 topic.
+        """
+        with self._locked():
+            bids, asks = {}, {}
+            for entry in order_book:
+                if entry['side'] == OrderSide.Buy:
+                    bids[float(entry['price'])] = float(entry['size'])
+                else:
+                    asks[float(entry['price'])] = float(entry['size'])
+            self.bids, self.asks = bids, asks
+            self.best_bid = max(bids) if bids else 0.0
+            self.best_ask = min(asks) if asks else 0.0
+
+            for order in self._resting_limit_orders():
+                # Filled or cancelled by a previous iteration
+                if order['order_id'] not in self._queue_ahead:
+                    continue
+                self._update_queue_position(order)
+                # The other side of the book moved through our price
+                if (order['side'] == OrderSide.Buy and self.best_ask and self.best_ask <= order['price']) \
+                        or (order['side'] == OrderSide.Sell and self.best_bid and self.best_bid >= order['price']):
+                    self._fill(order, order['leaves_qty'], order['price'], is_maker=True)
+
+    def on_trade(self, price, size, taker_side):
+        with self._locked():
+            price = float(price)
+            size = float(size)
+            self.last_price = price
+            for order in self._resting_limit_orders():
+                if order['order_id'] not in self._queue_ahead:
+                    continue
+                if order['side'] == OrderSide.Buy:
+                    traded_through = price < order['price']
+                    at_level = price == order['price'] and taker_side == OrderSide.Sell
+                else:
+                    traded_through = price > order['price']
+                    at_level = price == order['price'] and taker_side == OrderSide.Buy
+
+                if traded_through:
+                    self._fill(order, order['leaves_qty'], order['price'], is_maker=True)
+                elif at_level:
+                    order_id = order['order_id']
+                    queue_ahead = self._queue_ahead[order_id] - size
+                    self._level_size[order_id] = max(self._level_size[order_id] - size, 0.0)
+                    if queue_ahead < 0:
+                        self._queue_ahead[order_id] = 0.0
+                        self._fill(order, min(-queue_ahead, order['leaves_qty']), order['price'], is_maker=True)
+                    else:
+                        self._queue_ahead[order_id] = queue_ahead
+            self._check_trading_stops(price)
+
+    def _update_queue_position(self, order):
+        order_id = order['order_id']
+        book = self.bids if order['side'] == OrderSide.Buy else self.asks
+        if not book:
+            return
+        # Our price level is out of the 25 levels depth, we cannot know what happened
+        if order['price'] not in book and not (min(book) <= order['price'] <= max(book)):
+            return
+        level_size = book.get(order['price'], 0.0)
+        prev_level_size = self._level_size[order_id]
+        if level_size < prev_level_size and prev_level_size > 0:
+            cancelled = prev_level_size - level_size
+            self._queue_ahead[order_id] -= cancelled * self._queue_ahead[order_id] / prev_level_size
+        self._queue_ahead[order_id] = min(self._queue_ahead[order_id], level_size)
+        self._level_size[order_id] = level_size
+
+    def queue_position(self, order_id):
+        """ Estimated size ahead of our order at its price level """
+        with self._locked():
+            return self._queue_ahead.get(order_id)
+
+    """
+        ----------------------------------------------------------------------------
+           Orders
+        ----------------------------------------------------------------------------
+    """
+
+    def place_order(self, symbol, side, order_type, qty, price=None, time_in_force=TimeInForce.GTC,
+                    reduce_only=False, close_on_trigger=False, order_link_id=None, take_profit=None,
+                    stop_loss=None, **kwargs):
+        with self._locked():
+            self._validate_symbol(symbol)
+            qty = float(qty)
+            if order_link_id and any(o['order_link_id'] == order_link_id for o in self.orders.values()):
+                raise self._error('place_active_order', 'Duplicate order_link_id', 130010)
+            if order_type == OrderType.Limit and not price:
+                raise self._error('place_active_order', 'Price is required for limit orders', 10001)
+
+            now = self._time_str()
+            order = {
+                'order_id': str(uuid.uuid4()),
+                'order_link_id': order_link_id or '',
+                'user_id': 0,
+                'symbol': symbol,
+                'side': side,
+                'order_type': order_type,
+                'price': float(price) if order_type == OrderType.Limit else 0.0,
+                'qty': qty,
+                'leaves_qty': qty,
+                'last_exec_price': 0.0,
+                'cum_exec_qty': 0.0,
+                'cum_exec_value': 0.0,
+                'cum_exec_fee': 0.0,
+                'time_in_force': time_in_force,
+                'create_type': 'CreateByUser',
+                'cancel_type': 'UNKNOWN',
+                'order_status': OrderStatus.Created,
+                'take_profit': float(take_profit) if take_profit else 0.0,
+                'stop_loss': float(stop_loss) if stop_loss else 0.0,
+                'trailing_stop': 0.0,
+                'reduce_only': bool(reduce_only),
+                'close_on_trigger': bool(close_on_trigger),
+                'position_idx': 1 if side == OrderSide.Buy else 2,
+                'created_time': now,
+                'updated_time': now,
+                'create_time': now,
+                'update_time': now
+            }
+            if order['reduce_only']:
+                order['position_idx'] = 2 if side == OrderSide.Buy else 1
+                order['qty'] = order['leaves_qty'] = min(qty, self._position_to_close(order)['size'])
+                if order['qty'] == 0:
+                    raise self._error('place_active_order',
+                                      'Current position is zero, cannot fix reduce-only order qty', 130125)
+            self.orders[order['order_id']] = order
+            result = dict(order)
+
+            if order_type == OrderType.Market:
+                self._execute_market_order(order)
+            elif time_in_force == TimeInForce.PostOnly and self._takes_liquidity(side, order['price']):
+                self._cancel(order, 'EC_PostOnlyWillTakeLiquidity')
+            else:
+                self._set_status(order, OrderStatus.New)
+                self._join_queue(order)
+                self._publish('order', [order])
+                self._publish_wallet()
+            return result
+
+    def replace_order(self, symbol, order_id=None, order_link_id=None, p_r_qty=None, p_r_price=None,
+                      take_profit=None, stop_loss=None, **kwargs):
+        with self._locked():
+            self._validate_symbol(symbol)
+            order = self._find_order(order_id, order_link_id)
+            if not order or order['order_status'] not in self.ACTIVE_STATUSES:
+                raise self._error('replace_active_order', 'order not exists or too late to replace', 20001)
+
+            modified = False
+            lose_priority = False
+            if p_r_qty is not None and float(p_r_qty) != order['qty']:
+                new_qty = float(p_r_qty)
+                if new_qty <= order['cum_exec_qty']:
+                    raise self._error('replace_active_order', 'replace params invalid', 130076)
+                # Like on Bybit, only a qty increase loses the place in the queue
+                lose_priority = new_qty > order['qty']
+                order['leaves_qty'] = round(new_qty - order['cum_exec_qty'], 10)
+                order['qty'] = new_qty
+                modified = True
+            if take_profit is not None and float(take_profit) != order['take_profit']:
+                order['take_profit'] = float(take_profit)
+                modified = True
+            if stop_loss is not None and float(stop_loss) != order['stop_loss']:
+                order['stop_loss'] = float(stop_loss)
+                modified = True
+            if p_r_price is not None and float(p_r_price) != order['price']:
+                order['price'] = float(p_r_price)
+                modified = True
+                if order['time_in_force'] == TimeInForce.PostOnly and self._takes_liquidity(order['side'],
+                                                                                           order['price']):
+                    self._cancel(order, 'EC_PostOnlyWillTakeLiquidity')
+                    return {'order_id': order['order_id']}
+                lose_priority = True
+
+            if not modified:
+                raise self._error('replace_active_order', 'Order not modified', 30076)
+            # Back of the queue at the (new) price level
+            if lose_priority and order['order_id'] in self._queue_ahead:
+                self._join_queue(order)
+            order['updated_time'] = order['update_time'] = self._time_str()
+            self._publish('order', [order])
+            self._publish_wallet()
+            return {'order_id': order['order_id']}
+
+    def cancel_order(self, symbol, order_id=None, order_link_id=None, **kwargs):
+        with self._locked():
+            self._validate_symbol(symbol)
+            order = self._find_order(order_id, order_link_id)
+            if not order or order['order_status'] not in self.ACTIVE_STATUSES:
+                raise self._error('cancel_active_order', 'order not exists or too late to cancel', 20001)
+            self._cancel(order, 'CancelByUser')
+            return {'order_id': order['order_id']}
+
+    def cancel_all_orders(self, symbol, **kwargs):
+        with self._locked():
+            self._validate_symbol(symbol)
+            cancelled = [o for o in self.orders.values() if o['order_status'] in self.ACTIVE_STATUSES]
+            for order in cancelled:
+                self._cancel(order, 'CancelByUser')
+            return [o['order_id'] for o in cancelled]
+
+    def query_order(self, symbol, order_id=None, order_link_id=None, **kwargs):
+        with self._locked():
+            self._validate_symbol(symbol)
+            if order_id or order_link_id:
+                order = self._find_order(order_id, order_link_id)
+                if not order:
+                    raise self._error('query_active_order', 'order not exists', 20001)
+                return dict(order)
+            return [dict(o) for o in self.orders.values() if o['order_status'] in self.ACTIVE_STATUSES]
+
+    def get_orders(self, symbol, order_status=None, **kwargs):
+        """ Order history, in the format of the REST order list """
+        with self._locked():
+            self._validate_symbol(symbol)
+            orders = [o for o in self.orders.values() if not order_status or o['order_status'] == order_status]
+            return [{k: o[k] for k in self.REST_ORDER_KEYS} for o in orders]
+
+    """
+        ----------------------------------------------------------------------------
+           Positions
+        ----------------------------------------------------------------------------
+    """
+
+    def get_positions(self, symbol):
+        with self._locked():
+            self._validate_symbol(symbol)
+            return [self._position_dict(p) for p in self.positions.values()]
+
+    def set_leverage(self, symbol, buy_leverage, sell_leverage, **kwargs):
+        with self._locked():
+            self._validate_symbol(symbol)
+            for side, leverage in [(OrderSide.Buy, buy_leverage), (OrderSide.Sell, sell_leverage)]:
+                if self.positions[side]['size'] > 0:
+                    raise self._error('set_leverage', 'cannot set leverage while a position is open', 130051)
+                self.positions[side]['leverage'] = float(leverage)
+            self._publish('position', [self._position_dict(p) for p in self.positions.values()])
+
+    def set_trading_stop(self, symbol, side, take_profit=None, stop_loss=None, **kwargs):
+        with self._locked():
+            self._validate_symbol(symbol)
+            position = self.positions[side]
+            if position['size'] == 0:
+                raise self._error('set_trading_stop', 'cannot set tp_sl_ts for zero position', 130024)
+            if take_profit is not None:
+                position['take_profit'] = float(take_profit)
+            if stop_loss is not None:
+                position['stop_loss'] = float(stop_loss)
+            self._publish('position', [self._position_dict(position)])
+
+    def _check_trading_stops(self, price):
+        for side, position in self.positions.items():
+            if position['size'] == 0:
+                continue
+            sl, tp = position['stop_loss'], position['take_profit']
+            if side == OrderSide.Buy:
+                sl_hit = sl and price <= sl
+                tp_hit = tp and price >= tp
+            else:
+                sl_hit = sl and price >= sl
+                tp_hit = tp and price <= tp
+            if sl_hit or tp_hit:
+                create_type = 'CreateByStopLoss' if sl_hit else 'CreateByTakeProfit'
+                self._logger.info(f"Paper {create_type}: closing {side} position of {position['size']} "
+                                  f"at last_price={price}.")
+                self._close_position(side, create_type)
+
+    def _close_position(self, side, create_type):
+        position = self.positions[side]
+        now = self._time_str()
+        close_side = OrderSide.Sell if side == OrderSide.Buy else OrderSide.Buy
+        order = {
+            'order_id': str(uuid.uuid4()), 'order_link_id': '', 'user_id': 0, 'symbol': self.pair,
+            'side': close_side, 'order_type': OrderType.Market, 'price': 0.0, 'qty': position['size'],
+            'leaves_qty': position['size'], 'last_exec_price': 0.0, 'cum_exec_qty': 0.0, 'cum_exec_value': 0.0,
+            'cum_exec_fee': 0.0, 'time_in_force': TimeInForce.IOC, 'create_type': create_type,
+            'cancel_type': 'UNKNOWN', 'order_status': OrderStatus.Created, 'take_profit': 0.0, 'stop_loss': 0.0,
+            'trailing_stop': 0.0, 'reduce_only': True, 'close_on_trigger': True,
+            'position_idx': 1 if side == OrderSide.Buy else 2,
+            'created_time': now, 'updated_time': now, 'create_time': now, 'update_time': now
+        }
+        self.orders[order['order_id']] = order
+        self._execute_market_order(order)
+
+    """
+        ----------------------------------------------------------------------------
+           Internals
+        ----------------------------------------------------------------------------
+    """
+
+    def _new_position(self, side, leverage):
+        return {
+            'user_id': 0, 'symbol': self.pair, 'side': side, 'size': 0.0, 'position_value': 0.0,
+            'entry_price': 0.0, 'liq_price': 0.0, 'bust_price': 0.0, 'leverage': float(leverage),
+            'auto_add_margin': 0, 'is_isolated': True, 'position_margin': 0.0, 'occ_closing_fee': 0.0,
+            'realised_pnl': 0.0, 'cum_realised_pnl': 0.0, 'unrealised_pnl': 0.0, 'free_qty': 0.0,
+            'tp_sl_mode': 'Full', 'stop_loss': 0.0, 'take_profit': 0.0, 'trailing_stop': 0.0,
+            'position_idx': 1 if side == OrderSide.Buy else 2, 'mode': 'BothSide'
+        }
+
+    def _position_dict(self, position):
+        pos = dict(position)
+        if pos['size'] > 0 and self.last_price:
+            direction = 1 if pos['side'] == OrderSide.Buy else -1
+            pos['unrealised_pnl'] = round((self.last_price - pos['entry_price']) * pos['size'] * direction, 10)
+        return pos
+
+    def _position_to_close(self, order):
+        """ Position reduced by a reduce_only order: a Sell reduces the long (Buy) position """
+        return self.positions[OrderSide.Sell if order['side'] == OrderSide.Buy else OrderSide.Buy]
+
+    def _resting_limit_orders(self):
+        return [o for o in list(self.orders.values())
+                if o['order_type'] == OrderType.Limit and o['order_status'] in self.ACTIVE_STATUSES
+                and o['order_id'] in self._queue_ahead]
+
+    def _takes_liquidity(self, side, price):
+        if side == OrderSide.Buy:
+            return bool(self.best_ask) and price >= self.best_ask
+        return bool(self.best_bid) and price <= self.best_bid
+
+    def _join_queue(self, order):
+        book = self.bids if order['side'] == OrderSide.Buy else self.asks
+        level_size = book.get(order['price'], 0.0)
+        self._queue_ahead[order['order_id']] = level_size
+        self._level_size[order['order_id']] = level_size
+
+    def _leave_queue(self, order):
+        self._queue_ahead.pop(order['order_id'], None)
+        self._level_size.pop(order['order_id'], None)
+
+    def _execute_market_order(self, order):
+        """ Walk the opposite side of the book """
+        if order['side'] == OrderSide.Buy:
+            levels = sorted(self.asks.items())
+        else:
+            levels = sorted(self.bids.items(), reverse=True)
+        if not levels and not self.last_price:
+            self._cancel(order, 'CancelByReject')
+            return
+        for price, size in levels:
+            if order['leaves_qty'] <= 0:
+                break
+            self._fill(order, min(size, order['leaves_qty']), price, is_maker=False)
+        # Not enough depth in the top 25 levels, fill the rest at the last level
+        if order['leaves_qty'] > 0:
+            price = levels[-1][0] if levels else self.last_price
+            self._fill(order, order['leaves_qty'], price, is_maker=False)
+
+    def _fill(self, order, qty, price, is_maker):
+        if order['reduce_only']:
+            qty = min(qty, self._position_to_close(order)['size'])
+        qty = round(qty, 10)
+        if qty <= 0:
+            if order['reduce_only']:
+                self._cancel(order, 'CancelByReduceOnly')
+            return
+
+        fee_rate = self.maker_fee if is_maker else self.taker_fee
+        exec_value = qty * price
+        exec_fee = round(exec_value * fee_rate, 10)
+        now = self._time_str()
+
+        order['cum_exec_qty'] = round(order['cum_exec_qty'] + qty, 10)
+        order['cum_exec_value'] = round(order['cum_exec_value'] + exec_value, 10)
+        order['cum_exec_fee'] = round(order['cum_exec_fee'] + exec_fee, 10)
+        order['leaves_qty'] = round(order['qty'] - order['cum_exec_qty'], 10)
+        order['last_exec_price'] = price
+        order['updated_time'] = order['update_time'] = now
+        if order['leaves_qty'] <= 0:
+            order['order_status'] = OrderStatus.Filled
+            self._leave_queue(order)
+        else:
+            order['order_status'] = OrderStatus.PartiallyFilled
+
+        closed_size = self._apply_fill_to_position(order, qty, price, exec_fee)
+        execution = {
+            'symbol': order['symbol'],
+            'side': order['side'],
+            'order_id': order['order_id'],
+            'exec_id': str(uuid.uuid4()),
+            'order_link_id': order['order_link_id'],
+            'price': price,
+            'order_price': order['price'],
+            'order_qty': order['qty'],
+            'order_type': order['order_type'],
+            'fee_rate': fee_rate,
+            'exec_price': price,
+            'exec_type': ExecType.Trade,
+            'exec_qty': qty,
+            'exec_fee': exec_fee,
+            'exec_value': round(exec_value, 10),
+            'leaves_qty': order['leaves_qty'],
+            'closed_size': closed_size,
+            'last_liquidity_ind': 'AddedLiquidity' if is_maker else 'RemovedLiquidity',
+            'is_maker': is_maker,
+            'trade_time': now,
+            'trade_time_ms': int(self.clock() * 1000)
+        }
+        self.executions.append(execution)
+
+        self._publish('execution', [execution])
+        self._publish('order', [order])
+        self._publish('position', [self._position_dict(self.positions[OrderSide.Buy]),
+                                   self._position_dict(self.positions[OrderSide.Sell])])
+        self._publish_wallet()
+
+    def _apply_fill_to_position(self, order, qty, price, exec_fee):
+        """ Update position and wallet, return the closed size """
+        self.wallet_balance -= exec_fee
+        if not order['reduce_only']:
+            position = self.positions[order['side']]
+            new_size = round(position['size'] + qty, 10)
+            position['entry_price'] = (position['entry_price'] * position['size'] + price * qty) / new_size
+            position['size'] = new_size
+            position['free_qty'] = new_size
+            position['position_value'] = round(position['entry_price'] * new_size, 10)
+            position['position_margin'] = round(position['position_value'] / position['leverage'], 10)
+            # Full tp/sl mode: the tp/sl of the order apply to the whole position
+            if order['stop_loss']:
+                position['stop_loss'] = order['stop_loss']
+            if order['take_profit']:
+                position['take_profit'] = order['take_profit']
+            return 0.0
+
+        position = self._position_to_close(order)
+        direction = 1 if position['side'] == OrderSide.Buy else -1
+        pnl = (price - position['entry_price']) * qty * direction
+        self.wallet_balance += pnl
+        position['realised_pnl'] = round(position['realised_pnl'] + pnl - exec_fee, 10)
+        position['cum_realised_pnl'] = round(position['cum_realised_pnl'] + pnl - exec_fee, 10)
+        self.closed_pnl.append({
+            'id': len(self.closed_pnl) + 1,
+            'user_id': 0,
+            'symbol': order['symbol'],
+            'order_id': order['order_id'],
+            'side': order['side'],
+            'qty': order['qty'],
+            'order_price': order['price'] if order['price'] else price,
+            'order_type': order['order_type'],
+            'exec_type': ExecType.Trade,
+            'closed_size': qty,
+            'cum_entry_value': round(position['entry_price'] * qty, 10),
+            'avg_entry_price': position['entry_price'],
+            'cum_exit_value': round(price * qty, 10),
+            'avg_exit_price': price,
+            'closed_pnl': round(pnl - exec_fee, 10),
+            'fill_count': 1,
+            'leverage': position['leverage'],
+            'created_at': int(self.clock())
+        })
+
+        position['size'] = round(position['size'] - qty, 10)
+        position['free_qty'] = position['size']
+        position['position_value'] = round(position['entry_price'] * position['size'], 10)
+        position['position_margin'] = round(position['position_value'] / position['leverage'], 10)
+        if position['size'] == 0:
+            position['entry_price'] = 0.0
+            position['stop_loss'] = 0.0
+            position['take_profit'] = 0.0
+            # Bybit cancels the remaining reduce_only orders once the position is closed
+            for o in list(self.orders.values()):
+                if o is not order and o['reduce_only'] and o['order_status'] in self.ACTIVE_STATUSES \
+                        and self._position_to_close(o) is position:
+                    self._cancel(o, 'CancelByReduceOnly')
+        return qty
+
+    def _cancel(self, order, cancel_type):
+        order['order_status'] = OrderStatus.Cancelled
+        order['cancel_type'] = cancel_type
+        order['updated_time'] = order['update_time'] = self._time_str()
+        self._leave_queue(order)
+        self._publish('order', [order])
+        self._publish_wallet()
+
+    def _set_status(self, order, status):
+        order['order_status'] = status
+        order['updated_time'] = order['update_time'] = self._time_str()
+
+    def _publish_wallet(self):
+        # Margin reserved by the positions and the active opening orders
+        used = sum(p['position_margin'] for p in self.positions.values())
+        for o in self.orders.values():
+            if not o['reduce_only'] and o['order_status'] in self.ACTIVE_STATUSES and o['order_type'] == OrderType.Limit:
+                used += o['leaves_qty'] * o['price'] / self.positions[o['side']]['leverage']
+        self.available_balance = round(self.wallet_balance - used, 10)
+        self._publish('wallet', [{
+            'wallet_balance': round(self.wallet_balance, 10),
+            'available_balance': self.available_balance
+        }])
+
+    def _publish(self, topic, data):
+        if self.listener:
+            self._events.append((topic, [dict(d) for d in data]))
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                outermost = self._depth == 0
+        if outermost:
+            self._deliver_events()
+
+    def _deliver_events(self):
+        # A single thread delivers at a time, in the order the events were published.
+        # Events queued while another thread delivers are picked up by that thread.
+        while self._events:
+            if not self._deliver_lock.acquire(blocking=False):
+                return
+            try:
+                while self._events:
+                    self.listener(*self._events.popleft())
+            finally:
+                self._deliver_lock.release()
+
+    def _find_order(self, order_id, order_link_id):
+        if order_id:
+            return self.orders.get(order_id)
+        if order_link_id:
+            return next((o for o in self.orders.values() if o['order_link_id'] == order_link_id), None)
+        return None
+
+    def _validate_symbol(self, symbol):
+        if symbol != self.pair:
+            raise self._error('symbol', f'Paper trading only supports {self.pair}', 10001)
+
+    def _time_str(self):
+        return dt.datetime.fromtimestamp(self.clock(), tz=dt.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+    def _error(self, request, message, status_code):
+        return InvalidRequestError(request=request, message=message, status_code=status_code,
+                                   time=dt.datetime.now(dt.timezone.utc).strftime("%H:%M:%S"))
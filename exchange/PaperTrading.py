@@ -0,0 +1,195 @@
+"""
+    Paper trading: run a strategy live, on mainnet market data, without sending real orders.
+
+    - PaperHTTP replaces the authenticated pybit.HTTP session. Public endpoints (query_kline,
+      query_symbol, ...) are still sent to Bybit, private endpoints (orders, positions, wallet, ...)
+      are executed by the MatchingEngine.
+    - PaperWebSocket replaces the private pybit.WebSocket. The engine events are pushed through
+      the regular WebSocket._on_message() so the consumers (LimitEntry, Position, WalletUSDT, ...)
+      read them exactly like the real ones, with ws.fetch().
+    - The engine is fed from the public websocket: orderBookL2_25 and trade topics.
+
+    Use a separate database (db_name) when paper trading, orders and P&L are simulated.
+"""
+import json
+import time
+
+from exchange.MatchingEngine import MatchingEngine
+from pybit import WebSocket
+
+
+class PaperTrading:
+
+    def __init__(self, pair, stake_currency, balance, leverage_long=1, leverage_short=1):
+        self.pair = pair
+        self.engine = MatchingEngine(pair, balance, leverage_long, leverage_short, listener=self._on_engine_event)
+        self.stake_currency = stake_currency
+        self.ws_private = None
+        self.ws_public = None
+        self._orderbook_topic = None
+        self._trade_topic = None
+
+    def create_http_session(self, session):
+        return PaperHTTP(session, self.engine, self.stake_currency)
+
+    def create_private_websocket(self, subscriptions, logger):
+        self.ws_private = PaperWebSocket(subscriptions=subscriptions, logger=logger)
+        self.engine.publish_account()
+        return self.ws_private
+
+    def attach_public_websocket(self, ws_public, orderbook_topic, trade_topic):
+        self.ws_public = ws_public
+        self._orderbook_topic = orderbook_topic
+        self._trade_topic = trade_topic
+        ws_public.add_listener(self._on_public_message)
+
+    def _on_public_message(self, message, msg_json):
+        if not isinstance(msg_json, dict):
+            return
+        topic = msg_json.get('topic')
+        if topic == self._orderbook_topic:
+            self.engine.update_book(self.ws_public.data[topic]['order_book'])
+        elif topic == self._trade_topic:
+            for trade in msg_json['data']:
+                self.engine.on_trade(trade['price'], trade['size'], trade['side'])
+
+    def _on_engine_event(self, topic, data):
+        if self.ws_private:
+            self.ws_private.publish(topic, data)
+
+
+class PaperWebSocket(WebSocket):
+    """
+        Private websocket that never connects. Messages are injected with publish().
+    """
+
+    def __init__(self, subscriptions, logger):
+        super().__init__('paper://realtime_private', api_key='paper', api_secret='paper',
+                         subscriptions=subscriptions, logger=logger)
+
+    def publish(self, topic, data):
+        self._on_message(json.dumps({'topic': topic, 'action': 'update', 'data': data}))
+
+    def ping(self):
+        pass
+
+    def exit(self):
+        self.exited = True
+
+    def _connect(self, url):
+        self.logger.debug('Paper trading private WebSocket ready.')
+        for topic in self.subscriptions:
+            if topic not in self.data:
+                self.data[topic] = {}
+
+
+class PaperHTTP:
+    """
+        Same interface as pybit.HTTP. Private endpoints are executed by the MatchingEngine,
+        everything else is forwarded to the real session.
+    """
+
+    def __init__(self, session, engine, stake_currency):
+        self._session = session
+        self._engine = engine
+        self._stake_currency = stake_currency
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    @staticmethod
+    def _response(result):
+        return {'ret_code': 0, 'ret_msg': 'OK', 'ext_code': '', 'result': result, 'time_now': f'{time.time():.6f}'}
+
+    @staticmethod
+    def _page(records, page=1, limit=50, **kwargs):
+        page = int(page)
+        limit = int(limit)
+        return {'current_page': page, 'data': records[(page - 1) * limit: page * limit]}
+
+    # Same results as pybit.HTTP bulk requests, executed sequentially by the engine
+    @staticmethod
+    def _bulk(func, orders, return_exceptions):
+        results = []
+        for order in orders:
+            try:
+                results.append(func(**order))
+            except Exception as e:
+                if not return_exceptions:
+                    raise e
+                results.append(e)
+        return results
+
+    # Orders
+    def place_active_order(self, **kwargs):
+        return self._response(self._engine.place_order(**kwargs))
+
+    def place_active_order_bulk(self, orders: list, max_in_parallel=10, return_exceptions=False):
+        return self._bulk(self.place_active_order, orders, return_exceptions)
+
+    def replace_active_order(self, **kwargs):
+        return self._response(self._engine.replace_order(**kwargs))
+
+    def replace_active_order_bulk(self, orders: list, max_in_parallel=10, return_exceptions=False):
+        return self._bulk(self.replace_active_order, orders, return_exceptions)
+
+    def cancel_active_order(self, **kwargs):
+        return self._response(self._engine.cancel_order(**kwargs))
+
+    def cancel_active_order_bulk(self, orders: list, max_in_parallel=10, return_exceptions=False):
+        return self._bulk(self.cancel_active_order, orders, return_exceptions)
+
+    def cancel_all_active_orders(self, **kwargs):
+        return self._response(self._engine.cancel_all_orders(**kwargs))
+
+    def query_active_order(self, **kwargs):
+        return self._response(self._engine.query_order(**kwargs))
+
+    def get_active_order(self, **kwargs):
+        records = self._engine.get_orders(kwargs['symbol'], kwargs.get('order_status'))
+        if kwargs.get('order') == 'desc':
+            records.reverse()
+        return self._response(self._page(records, kwargs.get('page', 1), kwargs.get('limit', 50)))
+
+    def get_conditional_order(self, **kwargs):
+        return self._response({'current_page': kwargs.get('page', 1), 'data': []})
+
+    # Positions
+    def my_position(self, **kwargs):
+        return self._response(self._engine.get_positions(kwargs['symbol']))
+
+    def set_leverage(self, **kwargs):
+        self._engine.set_leverage(**kwargs)
+        return self._response(None)
+
+    def set_trading_stop(self, **kwargs):
+        self._engine.set_trading_stop(**kwargs)
+        return self._response(None)
+
+    # Account settings, always in the mode the engine simulates
+    def position_mode_switch(self, **kwargs):
+        return self._response(None)
+
+    def set_auto_add_margin(self, **kwargs):
+        return self._response(None)
+
+    def cross_isolated_margin_switch(self, **kwargs):
+        return self._response(None)
+
+    def full_partial_position_tp_sl_switch(self, **kwargs):
+        return self._response(None)
+
+    # Wallet and history
+    def get_wallet_balance(self, **kwargs):
+        return self._response({self._stake_currency: {
+            'wallet_balance': round(self._engine.wallet_balance, 10),
+            'available_balance': self._engine.available_balance
+        }})
+
+    def closed_profit_and_loss(self, **kwargs):
+        records = sorted(self._engine.closed_pnl, key=lambda r: r['id'], reverse=True)
+        return self._response(self._page(records, kwargs.get('page', 1), kwargs.get('limit', 50)))
+
+    def user_trade_records(self, **kwargs):
+        return self._response(self._page(list(self._engine.executions), kwargs.get('page', 1),
+                                         kwargs.get('limit', 50)))
@@ -1,5 +1,13 @@
+import atexit
+import gzip
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
 import sys
+import threading
+import time
 
 import arrow
 
@@ -7,9 +15,39 @@ import constants
 from Configuration import Configuration
 
 
+class LazyMessage:
+    """
+        Log message built only when it is written, by the logging thread.
+        For expensive messages like DataFrame dumps: the caller only pays for creating this object.
+    """
+
+    def __init__(self, build, *args):
+        self._build = build
+        self._args = args
+
+    def __str__(self):
+        return self._build(*self._args)
+
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """
+        QueueHandler leaving all the formatting to the QueueListener thread.
+        The standard QueueHandler formats the message in the caller thread, so that the record can be pickled.
+        The queue stays in this process, the record is passed as is.
+    """
+
+    def prepare(self, record):
+        return record
+
+
 class Logger:
-    _config = Configuration.get_config()
-    _logging_level = Configuration.get_config()['logging']['logging_level']
+    """
+        All the loggers send their records to a queue, written by a single background thread (QueueListener)
+        to the console, the output file and the debug file. Logging only costs an append to the queue
+        in the trading threads: formatting, file I/O, rotation and compression are done in the background.
+
+        Importing this module has no side effect: config.json is only read when the first logger is created.
+    """
     _datefmt = constants.DATETIME_FMT
 
     # Shared global debug file handler for all modules
@@ -19,6 +57,16 @@ class Logger:
     # Copy of the console logging output to the output file
     _output_file_handler = None
 
+    # Queue of the log records and the thread writing them
+    _queue = None
+    _listener = None
+    _listener_lock = threading.Lock()
+
+    # Console and output file level of each module logger, see get_module_logger()
+    _module_levels = {}
+    # Console level of the other loggers (pybit, urllib3, ...), propagated to the root logger
+    _root_level = None
+
     @staticmethod
     def logging_level_str_to_int(level_str):
         level_str = level_str.lower()
@@ -37,10 +85,16 @@ class Logger:
         logging.error(msg)
         raise Exception(msg)
 
+    # Logging level of the config file
+    @classmethod
+    def get_default_level(cls):
+        return cls.logging_level_str_to_int(Configuration.get_config()['logging']['logging_level'])
+
     # Logging level defaults to config file, but can overwritten.
     # Each module can have their own console logger set to different custom levels
     @classmethod
-    def get_console_handler(cls, level=logging_level_str_to_int(_logging_level)):
+    def get_console_handler(cls, level=None):
+        level = cls.get_default_level() if level is None else level
         c_handler = logging.StreamHandler(sys.stdout)
         #c_format = logging.Formatter('[%(name)s] %(message)s')
         c_format = logging.Formatter('[%(asctime)s] %(message)s', datefmt=cls._datefmt)
@@ -49,9 +103,10 @@ class Logger:
         return c_handler
 
     @classmethod
-    def get_output_file_handler(cls, level=logging_level_str_to_int(_logging_level),
-                                filename=Configuration.get_config()['logging']['output_file_path']):
-        if not cls._debug_file_handler:
+    def get_output_file_handler(cls, level=None, filename=None):
+        if not cls._output_file_handler:
+            level = cls.get_default_level() if level is None else level
+            filename = filename if filename else Configuration.get_config()['logging']['output_file_path']
             filename = cls.append_date_to_filename(filename)
             f_handler = logging.FileHandler(filename, mode='w')
             f_format = logging.Formatter('[%(asctime)s] %(message)s', datefmt=cls._datefmt)
@@ -63,25 +118,85 @@ class Logger:
     # Logging level defaults to config file, but can overwritten
     # We prefer to always log everything at debug level, in debug file
     # and limit output at the console level
+    # With logging.debug_file_max_mb, the debug file is rotated and the old files are compressed.
     @classmethod
-    def get_debug_file_handler(cls, filename=Configuration.get_config()['logging']['debug_file_path']):
+    def get_debug_file_handler(cls, filename=None):
         if not cls._debug_file_handler:
-            filename = cls.append_date_to_filename(filename)
-            f_handler = logging.FileHandler(filename, mode='w')
+            logging_config = Configuration.get_config()['logging']
+            filename = cls.append_date_to_filename(filename if filename else logging_config['debug_file_path'])
+            max_bytes = int(logging_config.get('debug_file_max_mb', 0) * 1024 * 1024)
+            if max_bytes > 0:
+                f_handler = logging.handlers.RotatingFileHandler(
+                    filename, maxBytes=max_bytes, backupCount=logging_config.get('debug_file_backups', 10))
+                f_handler.namer = lambda name: name + '.gz'
+                f_handler.rotator = cls.rotate_and_compress
+            else:
+                f_handler = logging.FileHandler(filename, mode='w')
             f_format = logging.Formatter(fmt='%(asctime)s [%(name)s] - %(levelname)s - %(message)s', datefmt=cls._datefmt)
             f_handler.setFormatter(f_format)
             f_handler.setLevel(logging.DEBUG)
             cls._debug_file_handler = f_handler
         return cls._debug_file_handler
 
+    # Rotator of the debug file: the file is renamed right away, compressed in its own thread.
+    # The compressed file is opened now, so that the next rotations shift it even if it is not written yet.
+    @staticmethod
+    def rotate_and_compress(source, dest):
+        rotated = f'{source}.{time.time_ns()}.tmp'
+        os.rename(source, rotated)
+        f_out = gzip.open(dest, 'wb')
+
+        def compress():
+            with open(rotated, 'rb') as f_in, f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.remove(rotated)
+        threading.Thread(target=compress, name='LogCompression', daemon=True).start()
+
+    @classmethod
+    def _console_filter(cls, record):
+        return record.levelno >= cls._module_levels.get(record.name, cls._root_level or logging.DEBUG)
+
+    # The output file is a copy of the console output of the module loggers
+    @classmethod
+    def _output_filter(cls, record):
+        return record.name in cls._module_levels and record.levelno >= cls._module_levels[record.name]
+
+    # Handler queuing the records for the background thread, started on the first call
     @classmethod
-    def init_root_logger(cls, level=logging_level_str_to_int(_logging_level)):
+    def get_queue_handler(cls):
+        with cls._listener_lock:
+            if cls._queue is None:
+                cls._queue = queue.SimpleQueue()
+            if not cls._listener:
+                # The levels of the console and output file are applied by their filters
+                console_handler = cls.get_console_handler(logging.DEBUG)
+                console_handler.addFilter(cls._console_filter)
+                output_file_handler = cls.get_output_file_handler(logging.DEBUG)
+                output_file_handler.addFilter(cls._output_filter)
+                cls._listener = logging.handlers.QueueListener(
+                    cls._queue, console_handler, output_file_handler, cls.get_debug_file_handler(),
+                    respect_handler_level=True)
+                cls._listener.start()
+                atexit.register(cls.stop)
+        return BackgroundQueueHandler(cls._queue)
+
+    # Write the queued records and stop the background thread. Call before exiting or restarting the application.
+    @classmethod
+    def stop(cls):
+        with cls._listener_lock:
+            if cls._listener:
+                cls._listener.stop()
+                cls._listener = None
+
+    @classmethod
+    def init_root_logger(cls, level=None):
         # Always keep root level set to logging_.DEBUG, but limit the level in handlers as desired
+        cls._root_level = cls.get_default_level() if level is None else level
         logging.basicConfig(
             level=logging.DEBUG,
             format='%(levelname)s: %(module)s.%(funcName)s, %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S',
-            handlers=[cls.get_console_handler(level), cls.get_debug_file_handler()]
+            handlers=[cls.get_queue_handler()]
         )
 
     # Default level is the one specified in the config.json file.
@@ -89,7 +204,7 @@ class Logger:
     # This return a logger with a custom level console handler
     # and a debug level file handler to the debug_log file
     @classmethod
-    def get_module_logger(cls, module_name, level=logging_level_str_to_int(_logging_level)):
+    def get_module_logger(cls, module_name, level=None):
         name = module_name.split('.')[-1]
         logger = logging.getLogger(name)
 
@@ -97,12 +212,22 @@ class Logger:
         # but limit the level in handlers as desired
         logger.setLevel(logging.DEBUG)
         if not logger.handlers:
-            logger.addHandler(cls.get_console_handler(level))
-            logger.addHandler(cls.get_output_file_handler(level))
-            logger.addHandler(cls.get_debug_file_handler())
+            cls._module_levels[name] = cls.get_default_level() if level is None else level
+            logger.addHandler(cls.get_queue_handler())
         logger.propagate = False
         return logger
 
+    # Last rows of a DataFrame, formatted in the logging thread.
+    # The rows are copied now, the DataFrame can change before the message is written.
+    @staticmethod
+    def lazy_dataframe(df, rows=10, drop_columns=None, decimals=2):
+        tail = df.iloc[-rows:].copy()
+
+        def build():
+            df_print = tail.drop(columns=drop_columns) if drop_columns else tail
+            return '\n' + df_print.round(decimals).to_string() + '\n'
+        return LazyMessage(build)
+
     @staticmethod
     def append_date_to_filename(filename):
         date_str = arrow.utcnow().to('local').strftime(constants.DATETIME_FMT).replace(':', '.')
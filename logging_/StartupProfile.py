@@ -0,0 +1,51 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    """
+        Time spent in each phase of the application startup, logged once the Bot is initialized:
+
+            Startup in 4.21s: imports 0.95s, exchange.http_session 0.01s, exchange.trading_settings 1.62s, ...
+
+        Phases can be nested or run in threads, they are reported in the order they started.
+        For a detailed import time breakdown, per module: python -X importtime main.py 2> imports.txt
+    """
+    # Set by main.py before the imports, otherwise when this module is first imported
+    _start = time.perf_counter()
+    # [name, seconds] per phase, seconds is None until the phase finishes
+    _phases = []
+    _lock = threading.Lock()
+
+    @classmethod
+    def mark_start(cls, start=None):
+        cls._start = start if start is not None else time.perf_counter()
+
+    @classmethod
+    def add_phase(cls, name, seconds=None):
+        phase = [name, seconds]
+        with cls._lock:
+            cls._phases.append(phase)
+        return phase
+
+    @classmethod
+    @contextmanager
+    def phase(cls, name):
+        # The slot is taken when the phase starts, to keep the start order
+        phase = cls.add_phase(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            phase[1] = time.perf_counter() - start
+
+    @classmethod
+    def elapsed(cls):
+        return time.perf_counter() - cls._start
+
+    @classmethod
+    def to_string(cls):
+        with cls._lock:
+            phases = ', '.join(f'{name} {seconds:.2f}s' for name, seconds in cls._phases if seconds is not None)
+        return f'Startup in {cls.elapsed():.2f}s: {phases}'
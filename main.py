@@ -1,7 +1,13 @@
+import time
+_start = time.perf_counter()
+
 import constants
 from logging_.Logger import Logger
+from logging_.StartupProfile import StartupProfile
 from Bot import Bot
 
+StartupProfile.mark_start(_start)
+StartupProfile.add_phase('imports', time.perf_counter() - _start)
 Logger.init_root_logger()
 logger = Logger.get_module_logger(constants.APPLICATION_NAME)
 
@@ -20,15 +20,17 @@ import hmac
 import json
 import logging
 import threading
+from urllib.parse import urlparse
 
-import pandas as pd
 import requests
 import websocket
 from datetime import datetime as dt
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from telegram_.TelegramBot import TelegramBot
 from .exceptions import FailedRequestError, InvalidRequestError
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy, RATE_LIMIT_CODES, UNKNOWN_STATUS_CODES, ORDER_NOT_FOUND_CODES
 
 # Requests will use simplejson if available.
 try:
@@ -92,6 +94,31 @@ class HTTP:
         identification.
     :type referral_id: str
 
+    :param rate_limiter: SEB: Optional client side rate limiter, requests
+        wait for their endpoint limit instead of being rejected with 10006.
+        See pybit.ratelimit.
+    :type rate_limiter: pybit.ratelimit.RateLimiter
+
+    :param retry_policy: SEB: Optional retry policy: jittered exponential
+        backoff within a deadline per endpoint, and circuit breaker. Without
+        it, retries are spaced by retry_delay. See pybit.retry.
+    :type retry_policy: pybit.retry.RetryPolicy
+
+    :param clock: SEB: Optional estimate of the server clock, used for the
+        signed timestamps. See pybit.clock.
+    :type clock: pybit.clock.ServerClock
+
+    :param endpoint_selector: SEB: Optional routing of the requests to the
+        fastest of several endpoints, with hedged requests. See
+        pybit.endpoints.
+    :type endpoint_selector: pybit.endpoints.EndpointSelector
+
+    :param order_timeout: SEB: Timeout in seconds of the linear order
+        creations with an order_link_id, request_timeout if None. A lost
+        response is safe: the order is looked up by its order_link_id before
+        being sent again.
+    :type order_timeout: float
+
     :returns: pybit.HTTP session.
 
     """
@@ -100,7 +127,8 @@ class HTTP:
                  logging_level=logging.INFO, log_requests=False,
                  request_timeout=10, recv_window=5000, force_retry=False,
                  retry_codes=None, ignore_codes=None, max_retries=3,
-                 retry_delay=3, referral_id=None, spot=False):
+                 retry_delay=3, referral_id=None, spot=False, rate_limiter=None,
+                 retry_policy=None, clock=None, endpoint_selector=None, order_timeout=None):
         """Initializes the HTTP class."""
 
         # Set the endpoint.
@@ -132,6 +160,7 @@ class HTTP:
 
         # Set timeout.
         self.timeout = request_timeout
+        self.order_timeout = order_timeout
         self.recv_window = recv_window
         self.force_retry = force_retry
         self.max_retries = max_retries
@@ -166,6 +195,28 @@ class HTTP:
         # If True, calls spot endpoints rather than futures endpoints.
         self.spot = spot
 
+        # SEB: Client side rate limiting, see pybit.ratelimit
+        self.rate_limiter = rate_limiter
+
+        # SEB: Backoff, deadlines and circuit breaker, see pybit.retry
+        self.retry_policy = retry_policy
+
+        # SEB: Server clock, see pybit.clock
+        self.clock = clock
+
+        # SEB: Fastest endpoint and hedged requests, see pybit.endpoints
+        self.endpoint_selector = endpoint_selector
+        self._hedge_executor = None
+
+        # SEB: HMAC state of the secret key, copied for each signature
+        self._hmac = None
+        self._hmac_secret = None
+
+        # SEB: Last activity of the connections (see pybit.keepalive) and
+        # time the last request of each thread was sent.
+        self.last_request_at = time.monotonic()
+        self._sent = threading.local()
+
     def _exit(self):
         """Closes the request session."""
         self.client.close()
@@ -494,7 +545,7 @@ class HTTP:
             auth=True
         )
 
-    def place_active_order_bulk(self, orders: list, max_in_parallel=10):
+    def place_active_order_bulk(self, orders: list, max_in_parallel=10, return_exceptions=False):
         """
         Places multiple active orders in bulk using multithreading. For more
         information on place_active_order, see
@@ -503,18 +554,12 @@ class HTTP:
         :param list orders: A list of orders and their parameters.
         :param max_in_parallel: The number of requests to be sent in parallel.
             Note that you are limited to 50 requests per second.
+        :param return_exceptions: SEB: Return the exception of a failed
+            request in place of its result, instead of raising the first one.
         :returns: Future request result dictionaries as a list.
         """
 
-        with ThreadPoolExecutor(max_workers=max_in_parallel) as executor:
-            executions = [
-                executor.submit(
-                    self.place_active_order,
-                    **order
-                ) for order in orders
-            ]
-        executor.shutdown()
-        return [execution.result() for execution in executions]
+        return self._bulk(self.place_active_order, orders, max_in_parallel, return_exceptions)
 
     def get_active_order(self, endpoint="", **kwargs):
         """
@@ -592,7 +637,7 @@ class HTTP:
             auth=True
         )
 
-    def cancel_active_order_bulk(self, orders: list, max_in_parallel=10):
+    def cancel_active_order_bulk(self, orders: list, max_in_parallel=10, return_exceptions=False):
         """
         Cancels multiple active orders in bulk using multithreading. For more
         information on cancel_active_order, see
@@ -601,18 +646,12 @@ class HTTP:
         :param list orders: A list of orders and their parameters.
         :param max_in_parallel: The number of requests to be sent in parallel.
             Note that you are limited to 50 requests per second.
+        :param return_exceptions: SEB: Return the exception of a failed
+            request in place of its result, instead of raising the first one.
         :returns: Future request result dictionaries as a list.
         """
 
-        with ThreadPoolExecutor(max_workers=max_in_parallel) as executor:
-            executions = [
-                executor.submit(
-                    self.cancel_active_order,
-                    **order
-                ) for order in orders
-            ]
-        executor.shutdown()
-        return [execution.result() for execution in executions]
+        return self._bulk(self.cancel_active_order, orders, max_in_parallel, return_exceptions)
 
     def cancel_all_active_orders(self, **kwargs):
         """
@@ -709,7 +748,7 @@ class HTTP:
             auth=True
         )
 
-    def replace_active_order_bulk(self, orders: list, max_in_parallel=10):
+    def replace_active_order_bulk(self, orders: list, max_in_parallel=10, return_exceptions=False):
         """
         Replaces multiple active orders in bulk using multithreading. For more
         information on replace_active_order, see
@@ -718,18 +757,12 @@ class HTTP:
         :param list orders: A list of orders and their parameters.
         :param max_in_parallel: The number of requests to be sent in parallel.
             Note that you are limited to 50 requests per second.
+        :param return_exceptions: SEB: Return the exception of a failed
+            request in place of its result, instead of raising the first one.
         :returns: Future request result dictionaries as a list.
         """
 
-        with ThreadPoolExecutor(max_workers=max_in_parallel) as executor:
-            executions = [
-                executor.submit(
-                    self.replace_active_order,
-                    **order
-                ) for order in orders
-            ]
-        executor.shutdown()
-        return [execution.result() for execution in executions]
+        return self._bulk(self.replace_active_order, orders, max_in_parallel, return_exceptions)
 
     def query_active_order(self, **kwargs):
         """
@@ -1696,23 +1729,32 @@ class HTTP:
         # Append required parameters.
         params['api_key'] = api_key
         params['recv_window'] = recv_window
-        params['timestamp'] = int(time.time() * 10 ** 3)
+        # SEB: Server time when the offset of the local clock is known
+        params['timestamp'] = int((self.clock.now() if self.clock else time.time()) * 10 ** 3)
 
         # Sort dictionary alphabetically to create querystring.
-        _val = '&'.join(
-            [str(k) + '=' + str(v) for k, v in sorted(params.items()) if
-             (k != 'sign') and (v is not None)]
-        )
-
-        # Bug fix. Replaces all capitalized booleans with lowercase.
+        # Bug fix. Lowercase booleans for POST, as in the JSON body.
+        # SEB: Only the boolean values, not 'True' inside a string value.
         if method == 'POST':
-            _val = _val.replace('True', 'true').replace('False', 'false')
+            _val = '&'.join(
+                [f'{k}={str(v).lower() if isinstance(v, bool) else v}' for k, v in
+                 sorted(params.items()) if (k != 'sign') and (v is not None)]
+            )
+        else:
+            _val = '&'.join(
+                [f'{k}={v}' for k, v in sorted(params.items()) if
+                 (k != 'sign') and (v is not None)]
+            )
+
+        # SEB: The key is hashed once, each signature starts from a copy
+        if self._hmac is None or self._hmac_secret != api_secret:
+            self._hmac = hmac.new(api_secret.encode(), digestmod='sha256')
+            self._hmac_secret = api_secret
+        signature = self._hmac.copy()
+        signature.update(_val.encode())
 
         # Return signature.
-        return str(hmac.new(
-            bytes(api_secret, 'utf-8'),
-            bytes(_val, 'utf-8'), digestmod='sha256'
-        ).hexdigest())
+        return signature.hexdigest()
 
     def _verify_string(self,params,key):
         if key in params:
@@ -1750,15 +1792,46 @@ class HTTP:
                 if isinstance(query[i], float) and query[i] == int(query[i]):
                     query[i] = int(query[i])
 
+        # SEB: On the fastest endpoint. GET requests and order creations with an order_link_id
+        # cannot be executed twice, they can be hedged.
+        endpoint = None
+        hedged = False
+        if self.endpoint_selector:
+            path, endpoint = self.endpoint_selector.route(path)
+            hedged = method == 'GET' or (path.endswith('order/create') and bool(query.get('order_link_id')))
+
+        # SEB: An order with an order_link_id can be looked up when its response is lost.
+        # Only sent again when it does not exist.
+        recoverable = path.endswith('/private/linear/order/create') and bool(query.get('order_link_id'))
+        lost_response = False
+
         # Send request and return headers with body. Retry if failed.
         retries_attempted = self.max_retries
         req_params = None
 
+        # SEB: Retry policy and circuit breaker of the endpoint
+        policy = breaker = deadline = None
+        if self.retry_policy:
+            policy, breaker = self.retry_policy.get(urlparse(path).path)
+            deadline = time.monotonic() + policy.deadline_secs
+        retry = {'policy': policy, 'breaker': breaker, 'deadline': deadline, 'attempt': 0, 'error': None}
+
         while True:
 
+            # SEB: The previous attempt may have created the order
+            if lost_response:
+                order = self._find_order(path, query)
+                if order:
+                    return order
+
+            # SEB: Deadline exceeded while waiting to retry
+            if retry['error']:
+                raise retry['error']
+
             retries_attempted -= 1
             if retries_attempted < 0:
-                TelegramBot.send_to_group(f'FailedRequestError: {path}: {req_params}. Bad Request. Retries exceeded maximum.')
+                TelegramBot.send_to_group(f'FailedRequestError: {path}: {req_params}. Bad Request. Retries exceeded maximum.',
+                                          priority=TelegramBot.PRIORITY_LOW)
                 raise FailedRequestError(
                     request=f'{method} {path}: {req_params}',
                     message='Bad Request. Retries exceeded maximum.',
@@ -1766,6 +1839,15 @@ class HTTP:
                     time=dt.utcnow().strftime("%H:%M:%S")
                 )
 
+            # SEB: Fail fast while the endpoint is failing
+            if breaker and not breaker.allow():
+                raise FailedRequestError(
+                    request=f'{method} {path}: {req_params}',
+                    message=f'Circuit breaker open for {breaker.name} requests.',
+                    status_code=503,
+                    time=dt.utcnow().strftime("%H:%M:%S")
+                )
+
             retries_remaining = f'{retries_attempted} retries remain.'
 
             # Authenticate if we are using a private endpoint.
@@ -1778,7 +1860,7 @@ class HTTP:
                 )
 
                 # Sort the dictionary alphabetically.
-                query = dict(sorted(query.items(), key=lambda x: x))
+                query = dict(sorted(query.items()))
 
                 # Append the signature to the dictionary.
                 query['sign'] = signature
@@ -1821,12 +1903,25 @@ class HTTP:
                 else:
                     r = self.client.prepare_request(
                         requests.Request(method, path,
-                                         data=json.dumps(req_params))
+                                         data=json.dumps(req_params, separators=(',', ':')))
                     )
 
+            # SEB: Wait for the rate limit of the endpoint
+            if self.rate_limiter:
+                self.rate_limiter.acquire(path)
+
+            # SEB: The request cannot outlast the deadline
+            timeout = self.order_timeout if recoverable and self.order_timeout else self.timeout
+            if deadline:
+                timeout = min(timeout, max(deadline - time.monotonic(), 0.5))
+
+            # SEB: Signal to wire measure and connection keeper
+            self._sent.at = time.perf_counter()
+            self.last_request_at = time.monotonic()
+
             # Attempt the request.
             try:
-                s = self.client.send(r, timeout=self.timeout)
+                s = self._send(r, timeout, endpoint, hedged)
 
             # If requests fires an error, retry.
             except (
@@ -1834,11 +1929,14 @@ class HTTP:
                 requests.exceptions.SSLError,
                 requests.exceptions.ConnectionError
             ) as e:
-                if self.force_retry:
+                if self.force_retry or recoverable:
                     self.logger.error(f'{e}. {retries_remaining}')
-                    time.sleep(self.retry_delay)
+                    lost_response = recoverable
+                    self._wait_before_retry(f'{method} {path}: {req_params}', retry)
                     continue
                 else:
+                    if breaker:
+                        breaker.record_failure()
                     raise e
 
             # Convert response to dictionary, or raise if requests error.
@@ -1847,13 +1945,15 @@ class HTTP:
 
             # If we have trouble converting, handle the error and retry.
             except JSONDecodeError as e:
-                if self.force_retry:
+                if self.force_retry or recoverable:
                     self.logger.error(f'{e}. {retries_remaining}')
-                    time.sleep(self.retry_delay)
+                    lost_response = recoverable
+                    self._wait_before_retry(f'{method} {path}: {req_params}', retry)
                     continue
                 else:
                     TelegramBot.send_to_group(
-                        f'FailedRequestError: {method} {path}: {req_params}. Conflict. Could not decode JSON.')
+                        f'FailedRequestError: {method} {path}: {req_params}. Conflict. Could not decode JSON.',
+                        priority=TelegramBot.PRIORITY_LOW)
                     raise FailedRequestError(
                         request=f'{method} {path}: {req_params}',
                         message='Conflict. Could not decode JSON.',
@@ -1861,6 +1961,9 @@ class HTTP:
                         time=dt.utcnow().strftime("%H:%M:%S")
                     )
 
+            if self.rate_limiter:
+                self.rate_limiter.update(path, s_json)
+
             # If Bybit returns an error, raise.
             if s_json['ret_code']:
 
@@ -1870,22 +1973,39 @@ class HTTP:
                 )
 
                 # Set default retry delay.
-                err_delay = self.retry_delay
+                # SEB: None for retry_delay, or the backoff of the retry policy
+                err_delay = None
+                # SEB: Only the errors of the exchange count for the circuit breaker
+                err_failure = s_json['ret_code'] in UNKNOWN_STATUS_CODES
+
+                # SEB: Request status unknown, retried when the policy of the endpoint allows it
+                # SEB: or looked up before being sent again for a recoverable order
+                retry_unknown_status = err_failure and (recoverable or (policy and policy.retry_unknown_status))
+                lost_response = lost_response or (err_failure and recoverable)
 
                 # Retry non-fatal whitelisted error requests.
                 # SEB: full_partial_position_tp_sl_switch() returns invalid code 130150: (Please try again later.)
                 # when a 'same tp sl mode' code should be returned. This causes pybit
                 # to keep retrying to rerun the request when there is nothing to be updated on Bybit
-                if s_json['ret_code'] in self.retry_codes and 'same tp sl mode' not in error_msg:
+                # SEB: The rate limit codes are always retried after the reset, also 10018 (IP rate limit)
+                if (s_json['ret_code'] in self.retry_codes or s_json['ret_code'] in RATE_LIMIT_CODES
+                        or retry_unknown_status) \
+                        and 'same tp sl mode' not in error_msg:
 
                     # 10002, recv_window error; add 2.5 seconds and retry.
+                    # SEB: With the server clock, measure the offset again instead.
                     if s_json['ret_code'] == 10002:
-                        error_msg += '. Added 2.5 seconds to recv_window'
-                        recv_window += 2500
+                        if self.clock:
+                            self.clock.sync(samples=1)
+                            error_msg += f'. {self.clock.to_string()}'
+                            err_delay = 0
+                        else:
+                            error_msg += '. Added 2.5 seconds to recv_window'
+                            recv_window += 2500
 
                     # 10006, ratelimit error; wait until rate_limit_reset_ms
                     # and retry.
-                    elif s_json['ret_code'] == 10006:
+                    elif s_json['ret_code'] in RATE_LIMIT_CODES and 'rate_limit_reset_ms' in s_json:
                         self.logger.error(
                             f'{error_msg}. Ratelimited on current request. '
                             f'Sleeping, then trying again. Request: {path}'
@@ -1896,7 +2016,10 @@ class HTTP:
                         reset_str = time.strftime(
                             '%X', time.localtime(limit_reset)
                         )
-                        err_delay = int(limit_reset) - int(time.time())
+                        err_delay = max(int(limit_reset) - int(time.time()), 0)
+                        # SEB: The rate limiter makes the retry wait until the reset
+                        if self.rate_limiter:
+                            err_delay = 0
                         error_msg = (
                             f'Ratelimit will reset at {reset_str}. '
                             f'Sleeping for {err_delay} seconds'
@@ -1904,13 +2027,24 @@ class HTTP:
 
                     # Log the error.
                     self.logger.error(f'{error_msg}. {retries_remaining}')
-                    time.sleep(err_delay)
+                    self._wait_before_retry(f'{method} {path}: {req_params}', retry, min_delay=err_delay,
+                                            failure=err_failure)
                     continue
 
                 elif s_json['ret_code'] in self.ignore_codes:
                     pass
 
                 else:
+                    if breaker:
+                        if err_failure:
+                            breaker.record_failure()
+                        else:
+                            breaker.record_success()
+                    # SEB: Rejected as a duplicate? A lost attempt may have arrived after the lookup.
+                    if lost_response:
+                        order = self._find_order(path, query)
+                        if order:
+                            return order
                     raise InvalidRequestError(
                         request=f'{method} {path}: {req_params}',
                         message=s_json["ret_msg"],
@@ -1918,8 +2052,153 @@ class HTTP:
                         time=dt.utcnow().strftime("%H:%M:%S")
                     )
             else:
+                if breaker:
+                    breaker.record_success()
                 return s_json
 
+    def _send(self, r, timeout, endpoint, hedged):
+        """
+        SEB: Send the prepared request. When hedging is allowed and the
+        primary endpoint has not answered within its hedge delay, the request
+        is also sent to the secondary endpoint. The first successful response
+        is returned, or the first response if none succeeds.
+        """
+
+        selector = self.endpoint_selector
+        hedge_delay = selector.get_hedge_delay(endpoint) if selector and hedged else None
+        if hedge_delay is None or hedge_delay >= timeout:
+            start = time.perf_counter()
+            s = self.client.send(r, timeout=timeout)
+            if selector and endpoint:
+                selector.record(endpoint, time.perf_counter() - start)
+            return s
+
+        if not self._hedge_executor:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='HedgedRequest')
+        futures = [self._submit_send(r, timeout, endpoint)]
+        done, _ = wait(futures, timeout=hedge_delay)
+        # The hedged request uses a token of the rate limit too, it is not sent if it would have to wait
+        if not done and (not self.rate_limiter or self.rate_limiter.try_acquire(r.url)):
+            secondary = selector.secondary
+            r_secondary = r.copy()
+            r_secondary.url = secondary + r.url[len(endpoint):]
+            self.logger.debug(f'Hedged request to {secondary} after {hedge_delay * 1000:.0f}ms: {r.url}')
+            futures.append(self._submit_send(r_secondary, timeout, secondary))
+
+        pending = set(futures)
+        response = error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    s = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                try:
+                    success = s.json().get('ret_code') == 0
+                except ValueError:
+                    success = False
+                if success:
+                    return s
+                response = response or s
+        if response is not None:
+            return response
+        raise error
+
+    def _find_order(self, path, query):
+        """
+        SEB: Order created by an attempt whose response was lost, looked up by
+        its order_link_id. Returns the order search response, or None if the
+        order does not exist. Raises FailedRequestError if the lookup fails:
+        sending the order again could place it twice.
+        """
+
+        # The lookup is a request too, the send time of the order is kept
+        sent_at = self.get_sent_at()
+        try:
+            s_json = self._submit_request(
+                method='GET',
+                path=path[:-len('/create')] + '/search',
+                query={'symbol': query['symbol'], 'order_link_id': query['order_link_id']},
+                auth=True
+            )
+        except InvalidRequestError as e:
+            if e.status_code in ORDER_NOT_FOUND_CODES:
+                return None
+            raise e
+        finally:
+            self._sent.at = sent_at
+        if not s_json.get('result'):
+            return None
+        self.logger.warning(f"Order [{query['order_link_id']}] found after a lost response, not sent again.")
+        return s_json
+
+    @staticmethod
+    def _bulk(func, orders, max_in_parallel, return_exceptions):
+        """
+        SEB: Runs func for each order in parallel. Results in the order of
+        orders, with the exceptions in place of the failed results when
+        return_exceptions is set.
+        """
+
+        with ThreadPoolExecutor(max_workers=max_in_parallel) as executor:
+            executions = [executor.submit(func, **order) for order in orders]
+        if return_exceptions:
+            return [execution.exception() or execution.result() for execution in executions]
+        return [execution.result() for execution in executions]
+
+    def get_sent_at(self):
+        """
+        SEB: time.perf_counter() when the last request of the calling thread
+        was sent, None before the first request.
+        """
+
+        return getattr(self._sent, 'at', None)
+
+    def _submit_send(self, r, timeout, endpoint):
+        """
+        SEB: Send the prepared request in the hedge executor. The latency is
+        recorded when the response arrives, also when it is not used.
+        """
+
+        start = time.perf_counter()
+        future = self._hedge_executor.submit(self.client.send, r, timeout=timeout)
+        future.add_done_callback(
+            lambda f: f.exception() or self.endpoint_selector.record(endpoint, time.perf_counter() - start))
+        return future
+
+    def _wait_before_retry(self, request, retry, min_delay=None, failure=True):
+        """
+        SEB: Wait before retrying a request.
+
+        Without retry policy, waits retry_delay seconds, or min_delay when the
+        exchange requires it (rate limit reset). With a retry policy, waits
+        the backoff of the attempt, at least min_delay. If the deadline of the
+        request would be exceeded, sets a FailedRequestError in retry['error']
+        instead, raised by _submit_request once a lost order has been looked up.
+        """
+
+        policy, breaker = retry['policy'], retry['breaker']
+        if not policy:
+            time.sleep(self.retry_delay if min_delay is None else min_delay)
+            return
+
+        if failure and breaker.record_failure():
+            self.logger.error(f'Circuit breaker opened for {breaker.name} requests '
+                              f'for {self.retry_policy.cooldown_secs}s.')
+        delay = max(min_delay or 0, policy.get_backoff(retry['attempt']))
+        retry['attempt'] += 1
+        if time.monotonic() + delay > retry['deadline']:
+            retry['error'] = FailedRequestError(
+                request=request,
+                message=f'Deadline of {policy.deadline_secs}s exceeded.',
+                status_code=408,
+                time=dt.utcnow().strftime("%H:%M:%S")
+            )
+            return
+        time.sleep(delay)
+
 
 class WebSocket:
     """
@@ -1930,7 +2209,7 @@ class WebSocket:
                  subscriptions=None, logging_level=logging.INFO, logger=None,
                  max_data_length=200, ping_interval=30, ping_timeout=10,
                  restart_on_error=True, purge_on_fetch=True,
-                 trim_data=True):
+                 trim_data=True, clock=None):
         """
         Initializes the websocket session.
 
@@ -1959,6 +2238,8 @@ class WebSocket:
             length or only get the data since the last fetch?
         :param trim_data: Decide whether the returning data should be
             trimmed to only provide the data value.
+        :param clock: SEB: Optional pybit.clock.ServerClock, used for the
+            expiry of the authentication.
 
         :returns: WebSocket session.
         """
@@ -2043,6 +2324,7 @@ class WebSocket:
         # Set API keys.
         self.api_key = api_key
         self.api_secret = api_secret
+        self.clock = clock
 
         # Set topic subscriptions for WebSocket.
         self.subscriptions = subscriptions
@@ -2061,6 +2343,10 @@ class WebSocket:
         self.purge = purge_on_fetch
         self.trim = trim_data
 
+        # SEB: Callables notified of every message after it has been processed.
+        # Kept across reconnections. See add_listener().
+        self.listeners = []
+
         # Set initial state, initialize dictionary and connect.
         self._reset()
         self._connect(self.endpoint)
@@ -2102,6 +2388,15 @@ class WebSocket:
             except KeyError:
                 return []
 
+    def add_listener(self, listener):
+        """
+        SEB: Register a callable listener(message, msg_json) called with the raw
+        message and its parsed dict, after the message has been stored in
+        self.data. Listeners run in the websocket thread and must be fast.
+        """
+
+        self.listeners.append(listener)
+
     def ping(self):
         """
         Pings the remote server to test the connection. The status of the
@@ -2126,7 +2421,8 @@ class WebSocket:
         """
 
         # Generate expires.
-        expires = int((time.time() + 1) * 1000)
+        # SEB: In server time when the offset of the local clock is known
+        expires = int(((self.clock.now() if self.clock else time.time()) + 1) * 1000)
 
         # Generate signature.
         _val = f'GET/realtime{expires}'
@@ -2148,11 +2444,14 @@ class WebSocket:
         Open websocket in a thread.
         """
 
+        # SEB: Set by _on_open(), replaces the polling of the socket every 2 seconds
+        self.opened = threading.Event()
+
         self.ws = websocket.WebSocketApp(
             url=url,
             on_message=lambda ws, msg: self._on_message(msg),
-            on_close=self._on_close(),
-            on_open=self._on_open(),
+            on_close=lambda ws, *args: self._on_close(),
+            on_open=lambda ws: self._on_open(),
             on_error=lambda ws, err: self._on_error(err)
         )
 
@@ -2167,13 +2466,9 @@ class WebSocket:
         self.wst.start()
 
         # Attempt to connect for X seconds.
-        retries = 15
-        while retries > 0 and (not self.ws.sock or not self.ws.sock.connected):
-            retries -= 1
-            time.sleep(2)
-
-        # If connection was not successful, raise error.
-        if retries <= 0:
+        timeout = 30
+        if not self.opened.wait(timeout) or not self.ws.sock or not self.ws.sock.connected:
+            # If connection was not successful, raise error.
             self.exit()
             raise websocket.WebSocketTimeoutException('Connection failed.')
 
@@ -2483,6 +2778,13 @@ class WebSocket:
                         self.data[topic] = item
                     self.data[topic] = item
 
+        # SEB: Notify listeners once the message has been processed
+        for listener in self.listeners:
+            try:
+                listener(message, msg_json)
+            except Exception as e:
+                self.logger.exception(e)
+
     def _on_error(self, error):
         """
         Exit on errors and raise exception, or attempt reconnect.
@@ -2491,7 +2793,7 @@ class WebSocket:
         if not self.exited:
             name = 'Public' if {self.wsName} == 'Authenticated' else 'Private'
             self.logger.error(f'On_Error: {name} WebSocket encountered error: {error}.')
-            TelegramBot.send_to_group(f'{name} WebSocket encountered error: {error}.')
+            TelegramBot.send_to_group(f'{name} WebSocket encountered error: {error}.', priority=TelegramBot.PRIORITY_LOW)
             self.exit()
 
         # Reconnect.
@@ -2505,6 +2807,7 @@ class WebSocket:
         """
         name = 'Public' if {self.wsName}  == 'Authenticated' else 'Private'
         self.logger.debug(f'On_Open: {name} WebSocket opened.')
+        self.opened.set()
 
     def _on_close(self):
         """
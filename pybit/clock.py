@@ -0,0 +1,106 @@
+"""
+SEB: Estimation of the offset between the local clock and the Bybit server clock.
+
+The timestamps of the signed requests (HTTP timestamp, websocket auth expires) are checked by the exchange
+against its own clock: a request outside of recv_window is rejected with 10002. ServerClock measures
+the offset with /v2/public/time, like NTP: for a request sent at t0 and received at t1 (local clock),
+the server time is taken at the middle of the round trip:
+    offset = server_time - (t0 + t1) / 2, with an error of at most rtt / 2
+Each sync keeps the sample of smallest round trip. The signed timestamps use now() = local time + offset.
+
+The offset is measured again every interval_secs in the background. The drift of the local clock
+(change of the offset per hour) is computed from the history of the offsets and logged.
+"""
+import collections
+import threading
+import time
+
+
+class ServerClock:
+    PATH = '/v2/public/time'
+
+    def __init__(self, client, endpoint, interval_secs=300, samples=5, timeout=5, logger=None):
+        """
+        :param client: requests.Session used for the time requests
+        :param endpoint: HTTP endpoint of the exchange
+        """
+        self.client = client
+        self.url = endpoint + self.PATH
+        self.interval_secs = interval_secs
+        self.samples = samples
+        self.timeout = timeout
+        self.logger = logger
+
+        # Seconds to add to the local time to get the server time
+        self.offset = 0.0
+        self.rtt = None
+        # (local time, offset) of the syncs
+        self.history = collections.deque(maxlen=288)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def now(self):
+        """ Server time estimate, in seconds """
+        return time.time() + self.offset
+
+    def sync(self, samples=None):
+        """ Measure the offset. Returns the offset, or None if no sample could be taken. """
+        best = None
+        for _ in range(samples if samples else self.samples):
+            try:
+                t0 = time.time()
+                response = self.client.get(self.url, timeout=self.timeout)
+                t1 = time.time()
+                server_time = float(response.json()['time_now'])
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f'Server time request failed: {e}')
+                continue
+            rtt = t1 - t0
+            if best is None or rtt < best[1]:
+                best = (server_time - (t0 + t1) / 2, rtt)
+        if best is None:
+            return None
+        with self._lock:
+            self.offset, self.rtt = best
+            self.history.append((time.time(), self.offset))
+        return self.offset
+
+    def get_drift(self):
+        """ Change of the offset in seconds per hour, least squares over the history. None with less than 2 syncs. """
+        with self._lock:
+            history = list(self.history)
+        if len(history) < 2:
+            return None
+        n = len(history)
+        mean_t = sum(t for t, _ in history) / n
+        mean_o = sum(o for _, o in history) / n
+        var_t = sum((t - mean_t) ** 2 for t, _ in history)
+        if var_t == 0:
+            return None
+        slope = sum((t - mean_t) * (o - mean_o) for t, o in history) / var_t
+        return slope * 3600
+
+    def to_string(self):
+        drift = self.get_drift()
+        rtt = f'{self.rtt * 1000:.1f}ms' if self.rtt is not None else 'n/a'
+        drift = f'{drift * 1000:.2f}ms/h' if drift is not None else 'n/a'
+        return f'Server clock offset: {self.offset * 1000:.1f}ms, rtt: {rtt}, drift: {drift}'
+
+    def start(self):
+        """ Sync now, then every interval_secs in the background """
+        self.sync()
+        if self.logger:
+            self.logger.info(self.to_string())
+        self._thread = threading.Thread(target=self._run, name='ServerClock', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_secs):
+            self.sync()
+            if self.logger:
+                self.logger.debug(self.to_string())
@@ -0,0 +1,124 @@
+"""
+SEB: Selection of the fastest REST endpoint, and hedged requests.
+
+Bybit serves the same API from several hosts (api.bybit.com, api.bytick.com). EndpointSelector measures
+the round trip time of each of them with /v2/public/time, every interval_secs in the background, and routes
+the requests to the fastest (lowest median of the recent measures): the primary. It only changes for an endpoint
+at least SWITCH_RATIO faster, not on noise.
+The latencies of the requests sent are recorded separately, per endpoint: they include the processing time
+of the exchange, only the measures are compared.
+
+Hedged requests (optional): an idempotent request (GET, or order creation with an order_link_id, that
+the exchange cannot execute twice) not answered by the primary within its 95th percentile latency
+is also sent to the secondary endpoint. The first successful response is used. The hedged request takes
+a token of the client side rate limit (see pybit.ratelimit), it is not sent when no token is available.
+"""
+import collections
+import statistics
+import threading
+import time
+
+
+class EndpointSelector:
+    PATH = '/v2/public/time'
+    SWITCH_RATIO = 0.9
+
+    def __init__(self, client, endpoints, interval_secs=60, samples=3, hedge=False, hedge_min_secs=0.05,
+                 timeout=5, logger=None):
+        """
+        :param client: requests.Session used for the measures
+        :param endpoints: HTTP endpoints serving the same API, the first one is the primary until measured
+        """
+        self.client = client
+        self.endpoints = list(endpoints)
+        self.interval_secs = interval_secs
+        self.samples = samples
+        self.hedge = hedge
+        self.hedge_min_secs = hedge_min_secs
+        self.timeout = timeout
+        self.logger = logger
+
+        self.primary = self.endpoints[0]
+        self.secondary = self.endpoints[1] if len(self.endpoints) > 1 else None
+        # Recent round trips of the measures and latencies of the requests, per endpoint, in seconds
+        self.rtts = {e: collections.deque(maxlen=50) for e in self.endpoints}
+        self.latencies = {e: collections.deque(maxlen=200) for e in self.endpoints}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, endpoint, seconds):
+        latencies = self.latencies.get(endpoint)
+        if latencies is not None:
+            latencies.append(seconds)
+
+    def measure(self):
+        """ Round trips to each endpoint, then select the primary """
+        for endpoint in self.endpoints:
+            for _ in range(self.samples):
+                try:
+                    start = time.perf_counter()
+                    self.client.get(endpoint + self.PATH, timeout=self.timeout).raise_for_status()
+                    self.rtts[endpoint].append(time.perf_counter() - start)
+                except Exception as e:
+                    # An unreachable endpoint is ranked last
+                    self.rtts[endpoint].append(self.timeout)
+                    if self.logger:
+                        self.logger.debug(f'Endpoint {endpoint} measure failed: {e}')
+        self.select()
+
+    def get_median(self, endpoint):
+        rtts = list(self.rtts[endpoint])
+        return statistics.median(rtts) if rtts else float('inf')
+
+    # Of the requests, of the measures before the first requests
+    def get_p95(self, endpoint):
+        latencies = sorted(self.latencies[endpoint] or self.rtts[endpoint])
+        if not latencies:
+            return None
+        return latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+
+    def select(self):
+        ranked = sorted(self.endpoints, key=self.get_median)
+        with self._lock:
+            previous = self.primary
+            if self.get_median(ranked[0]) > self.get_median(previous) * self.SWITCH_RATIO:
+                ranked.remove(previous)
+                ranked.insert(0, previous)
+            self.primary = ranked[0]
+            self.secondary = ranked[1] if len(ranked) > 1 else None
+        if self.primary != previous and self.logger:
+            self.logger.info(f'REST endpoint switched from {previous} to {self.primary}. {self.to_string()}')
+
+    def route(self, url):
+        """ url of one of the endpoints, on the primary endpoint. Returns (url, endpoint). """
+        primary = self.primary
+        for endpoint in self.endpoints:
+            if url.startswith(endpoint):
+                return primary + url[len(endpoint):], primary
+        return url, None
+
+    def get_hedge_delay(self, endpoint):
+        """ Time to wait for the primary before sending a hedged request, None when hedging is disabled """
+        if not self.hedge or not self.secondary or endpoint != self.primary:
+            return None
+        p95 = self.get_p95(endpoint)
+        return max(p95, self.hedge_min_secs) if p95 is not None else None
+
+    def to_string(self):
+        return ', '.join(f'{e}: {self.get_median(e) * 1000:.1f}ms' for e in self.endpoints)
+
+    def start(self):
+        """ Measure now, then every interval_secs in the background """
+        self.measure()
+        if self.logger:
+            self.logger.info(f'REST endpoint: {self.primary}. Median round trips: {self.to_string()}')
+        self._thread = threading.Thread(target=self._run, name='EndpointSelector', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_secs):
+            self.measure()
@@ -0,0 +1,56 @@
+"""
+SEB: Keeps the connections of the HTTP session warm.
+
+requests.Session keeps its connections open in a pool, but after a long idle period (no signal for a while)
+the exchange or a proxy closes them. The next request, usually an order placement, then pays a new
+TCP and TLS handshake. ConnectionKeeper sends a cheap public request (/v2/public/time) to each endpoint
+when the session has been idle for interval_secs, so that the pool always holds a live connection.
+With an EndpointSelector, the connections to all its endpoints are kept warm, for the hedged requests.
+"""
+import threading
+import time
+
+
+class ConnectionKeeper:
+    PATH = '/v2/public/time'
+
+    def __init__(self, http, interval_secs=15, timeout=5, logger=None):
+        """
+        :param http: pybit.HTTP session whose connections are kept warm
+        """
+        self.http = http
+        self.interval_secs = interval_secs
+        self.timeout = timeout
+        self.logger = logger
+        self.nb_requests = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get_endpoints(self):
+        selector = self.http.endpoint_selector
+        return selector.endpoints if selector else [self.http.endpoint]
+
+    # Requests each endpoint if the session has been idle for interval_secs
+    def keep_warm(self):
+        if time.monotonic() - self.http.last_request_at < self.interval_secs:
+            return
+        for endpoint in self.get_endpoints():
+            try:
+                self.http.client.get(endpoint + self.PATH, timeout=self.timeout)
+                self.nb_requests += 1
+            except Exception as e:
+                if self.logger:
+                    self.logger.debug(f'Keep warm request to {endpoint} failed: {e}')
+        self.http.last_request_at = time.monotonic()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='ConnectionKeeper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # Checked more often than the interval, the idle time is measured from the last request
+        while not self._stop.wait(max(self.interval_secs / 4, 0.5)):
+            self.keep_warm()
@@ -0,0 +1,185 @@
+"""
+SEB: Client side rate limiting of the HTTP requests.
+
+Bybit limits each private endpoint to a number of requests per minute, per account.
+Every response returns the state of the limit of its endpoint:
+    rate_limit: requests allowed per period
+    rate_limit_status: requests remaining
+    rate_limit_reset_ms: time the limit resets, in ms
+Without a client side limit, the first sign of the limit is a 10006 error, and pybit sleeps until the reset.
+
+RateLimiter keeps one token bucket per group of endpoints sharing a limit. It starts with the published
+limit of the group and follows the limit fields of the responses. A request waits for a token before being sent:
+    - Order placement, amend and cancel have the highest priority. They are served first
+      when requests of the same group are waiting.
+    - History requests (order list, executions, closed pnl, ...) have the lowest priority.
+      They leave reserve_ratio of the bucket to the other requests, so that the synchronization
+      of the database cannot use up the limit needed by a trade entry.
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+PRIORITY_ORDER = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKGROUND = 2
+
+# Group: (requests, period in seconds, {end of the path: priority}).
+# Published limits of the linear endpoints, the other private endpoints have their own DEFAULT_LIMIT bucket.
+ENDPOINT_GROUPS = {
+    'order': (100, 60, {
+        '/order/create': PRIORITY_ORDER,
+        '/order/replace': PRIORITY_ORDER,
+        '/order/cancel': PRIORITY_ORDER,
+        '/order/cancel-all': PRIORITY_ORDER,
+        '/order/cancelAll': PRIORITY_ORDER,
+        '/stop-order/create': PRIORITY_ORDER,
+        '/stop-order/replace': PRIORITY_ORDER,
+        '/stop-order/cancel': PRIORITY_ORDER,
+        '/stop-order/cancel-all': PRIORITY_ORDER,
+        '/stop-order/cancelAll': PRIORITY_ORDER
+    }),
+    'order_query': (600, 60, {
+        '/order/search': PRIORITY_DEFAULT,
+        '/stop-order/search': PRIORITY_DEFAULT,
+        '/v2/private/order': PRIORITY_DEFAULT,
+        '/v2/private/stop-order': PRIORITY_DEFAULT,
+        '/order/list': PRIORITY_BACKGROUND,
+        '/stop-order/list': PRIORITY_BACKGROUND
+    }),
+    'trade_history': (120, 60, {
+        '/execution/list': PRIORITY_BACKGROUND,
+        '/closed-pnl/list': PRIORITY_BACKGROUND
+    }),
+    'position': (120, 60, {
+        '/position/list': PRIORITY_DEFAULT,
+        '/wallet/balance': PRIORITY_DEFAULT
+    }),
+    'position_settings': (75, 60, {
+        '/position/set-leverage': PRIORITY_DEFAULT,
+        '/position/switch-isolated': PRIORITY_DEFAULT,
+        '/position/switch-mode': PRIORITY_DEFAULT,
+        '/position/set-auto-add-margin': PRIORITY_DEFAULT,
+        '/position/trading-stop': PRIORITY_DEFAULT,
+        '/position/add-margin': PRIORITY_DEFAULT,
+        '/position/leverage/save': PRIORITY_DEFAULT,
+        '/position/change-position-margin': PRIORITY_DEFAULT,
+        '/tpsl/switch-mode': PRIORITY_DEFAULT
+    })
+}
+DEFAULT_LIMIT = (120, 60)
+# Public endpoints: limit per IP, shared by all of them
+PUBLIC_GROUP = 'public'
+PUBLIC_LIMIT = (50, 1)
+
+
+class TokenBucket:
+    def __init__(self, limit, period_secs, reserve_ratio):
+        self.limit = limit
+        self.period_secs = period_secs
+        self.reserve_ratio = reserve_ratio
+        self.tokens = float(limit)
+        self._updated = time.monotonic()
+        self._waiting = [0, 0, 0]
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        # _updated is in the future after a reset time has been received
+        if now > self._updated:
+            self.tokens = min(self.limit, self.tokens + (now - self._updated) * self.limit / self.period_secs)
+            self._updated = now
+
+    # Take a token, waiting if needed. Returns the time waited in seconds.
+    def acquire(self, priority):
+        start = time.monotonic()
+        reserve = self.limit * self.reserve_ratio if priority == PRIORITY_BACKGROUND else 0
+        with self._condition:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    first = not any(self._waiting[:priority])
+                    if first and self.tokens >= 1 + reserve:
+                        self.tokens -= 1
+                        return now - start
+                    # Time until the next token, or until a request of higher priority is served
+                    wait = max(self._updated - now, 0) + (1 + reserve - self.tokens) * self.period_secs / self.limit
+                    self._condition.wait(max(wait, 0.001) if first else 0.05)
+            finally:
+                self._waiting[priority] -= 1
+                self._condition.notify_all()
+
+    # Take a token only if one is available right away, without waiting. Returns True if taken.
+    def try_acquire(self, priority):
+        reserve = self.limit * self.reserve_ratio if priority == PRIORITY_BACKGROUND else 0
+        with self._condition:
+            self._refill(time.monotonic())
+            if not any(self._waiting[:priority + 1]) and self.tokens >= 1 + reserve:
+                self.tokens -= 1
+                return True
+            return False
+
+    # Limit state returned by the exchange
+    def update(self, limit, remaining, reset_ms):
+        with self._condition:
+            now = time.monotonic()
+            self._refill(now)
+            if limit:
+                self.limit = limit
+            if remaining is not None:
+                self.tokens = min(self.tokens, float(remaining))
+                if remaining <= 0 and reset_ms:
+                    # No token before the reset
+                    self._updated = max(now + reset_ms / 1000 - time.time(), now)
+
+
+class RateLimiter:
+    def __init__(self, reserve_ratio=0.2, logger=None):
+        self.reserve_ratio = reserve_ratio
+        self.logger = logger
+        # Bucket per group, (bucket, priority) per path
+        self._buckets = {}
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    # Returns (group, limit, period in seconds, priority) of the endpoint
+    @staticmethod
+    def get_endpoint_limit(path):
+        if '/public/' in path:
+            return (PUBLIC_GROUP,) + PUBLIC_LIMIT + (PRIORITY_DEFAULT,)
+        for group, (limit, period_secs, priorities) in ENDPOINT_GROUPS.items():
+            for suffix, priority in priorities.items():
+                if path.endswith(suffix):
+                    return group, limit, period_secs, priority
+        return (path,) + DEFAULT_LIMIT + (PRIORITY_DEFAULT,)
+
+    # Returns (bucket, priority) of the endpoint
+    def _get_bucket(self, path):
+        endpoint = self._endpoints.get(path)
+        if endpoint is None:
+            with self._lock:
+                group, limit, period_secs, priority = self.get_endpoint_limit(path)
+                if group not in self._buckets:
+                    self._buckets[group] = TokenBucket(limit, period_secs, self.reserve_ratio)
+                endpoint = self._endpoints[path] = (self._buckets[group], priority)
+        return endpoint
+
+    def acquire(self, url):
+        path = urlparse(url).path
+        bucket, priority = self._get_bucket(path)
+        waited = bucket.acquire(priority)
+        if waited > 0.01 and self.logger:
+            self.logger.debug(f'Rate limit: waited {waited:.3f}s before {path}')
+        return waited
+
+    # For optional requests (hedged requests), sent only if they do not have to wait
+    def try_acquire(self, url):
+        bucket, priority = self._get_bucket(urlparse(url).path)
+        return bucket.try_acquire(priority)
+
+    def update(self, url, response):
+        if 'rate_limit_status' in response:
+            bucket, _ = self._get_bucket(urlparse(url).path)
+            bucket.update(response.get('rate_limit'), response.get('rate_limit_status'),
+                          response.get('rate_limit_reset_ms'))
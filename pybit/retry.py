@@ -0,0 +1,123 @@
+"""
+SEB: Retry policy of the HTTP requests and circuit breaker.
+
+The retries of a request are spaced by a jittered exponential backoff (full jitter: a random delay between 0
+and base_delay * 2^attempt, at most max_delay), within a deadline. The deadline depends on the endpoint:
+    - order creations: tight. A late order is worse than a failed one, the caller decides.
+    - amends and cancels: retried longer, a cancel that gives up leaves an order on the book. Sending them
+      again is safe: an order already cancelled or not modified is a tolerated error of the exchange.
+    - history (order list, executions, closed pnl): loose. Nobody is waiting on them.
+    - other requests: in between.
+The request timeout is also reduced to the time left before the deadline.
+
+Error classes, codes of exchange/BybitErrorCodes.py:
+    - RATE_LIMIT_CODES: retried, after the rate limit reset.
+    - UNKNOWN_STATUS_CODES: the exchange does not know if the request was executed. Retried, except for
+      the orders: sending an order again could place it twice. An order created with an order_link_id
+      is retried: it is first looked up by its order_link_id (see pybit.HTTP._find_order).
+    - the retry codes of the HTTP session (recv_window, too frequent cancels, ...): retried.
+    - other codes: not retried, InvalidRequestError.
+
+Circuit breaker, per group of endpoints (see pybit.ratelimit.ENDPOINT_GROUPS): after failure_threshold
+consecutive failed attempts (connection errors, timeouts, server errors), the requests of the group fail
+right away with a FailedRequestError for cooldown_secs. Then one request is let through: the circuit
+closes if it succeeds, opens again otherwise.
+"""
+import random
+import threading
+import time
+
+from exchange.BybitErrorCodes import BybitErrorCodes
+from .ratelimit import RateLimiter, PRIORITY_ORDER, PRIORITY_DEFAULT, PRIORITY_BACKGROUND
+
+# Policy of the amends and cancels, orders of PRIORITY_ORDER ending with AMEND_CANCEL_SUFFIXES
+AMEND_CANCEL = 'amend_cancel'
+AMEND_CANCEL_SUFFIXES = ('/replace', '/cancel', '/cancel-all', '/cancelAll')
+
+# 10006: System not responding (also returned when rate limited), 10018: exceed ip rate limit
+RATE_LIMIT_CODES = {10006, 10018}
+# 10007: Response timeout from backend server, 10016: Service not available
+UNKNOWN_STATUS_CODES = {10007, 10016}
+# 130010: order not exists or Too late to operate
+ORDER_NOT_FOUND_CODES = {130010}
+assert all(str(code) in BybitErrorCodes for code in RATE_LIMIT_CODES | UNKNOWN_STATUS_CODES | ORDER_NOT_FOUND_CODES)
+
+
+class EndpointPolicy:
+    def __init__(self, deadline_secs, base_delay, max_delay, retry_unknown_status):
+        self.deadline_secs = deadline_secs
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_unknown_status = retry_unknown_status
+
+    def get_backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold, cooldown_secs):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_secs = cooldown_secs
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    # Whether a request can be sent
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            # Half open: a single trial request after the cooldown
+            if not self._trial and time.monotonic() - self.opened_at >= self.cooldown_secs:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    # Returns True when the circuit opens
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._trial = False
+                return True
+            return False
+
+
+class RetryPolicy:
+    # Default policy of each endpoint priority (see pybit.ratelimit), and of the amends and cancels
+    POLICIES = {
+        PRIORITY_ORDER: EndpointPolicy(deadline_secs=3, base_delay=0.1, max_delay=0.5, retry_unknown_status=False),
+        AMEND_CANCEL: EndpointPolicy(deadline_secs=15, base_delay=0.1, max_delay=1, retry_unknown_status=True),
+        PRIORITY_DEFAULT: EndpointPolicy(deadline_secs=15, base_delay=0.25, max_delay=3, retry_unknown_status=True),
+        PRIORITY_BACKGROUND: EndpointPolicy(deadline_secs=120, base_delay=1, max_delay=15, retry_unknown_status=True)
+    }
+
+    def __init__(self, failure_threshold=5, cooldown_secs=10, policies=None):
+        self.failure_threshold = failure_threshold
+        self.cooldown_secs = cooldown_secs
+        self.policies = policies if policies else self.POLICIES
+        self._endpoints = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    # Returns (EndpointPolicy, CircuitBreaker) of the endpoint path
+    def get(self, path):
+        endpoint = self._endpoints.get(path)
+        if endpoint is None:
+            group, _, _, priority = RateLimiter.get_endpoint_limit(path)
+            if priority == PRIORITY_ORDER and path.endswith(AMEND_CANCEL_SUFFIXES):
+                priority = AMEND_CANCEL
+            with self._lock:
+                if group not in self._breakers:
+                    self._breakers[group] = CircuitBreaker(group, self.failure_threshold, self.cooldown_secs)
+                endpoint = self._endpoints[path] = (self.policies[priority], self._breakers[group])
+        return endpoint
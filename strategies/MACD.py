@@ -82,9 +82,7 @@ class MACD(BaseStrategy):
         self.data = df
 
         if self._config['bot']['display_dataframe']:
-            df_print = df.drop(columns=['start', 'end', 'timestamp'], axis=1)
-            msg = '\n' + df_print.round(2).tail(10).to_string() + '\n'
-            self._logger.info(msg)
+            self._logger.info(Logger.lazy_dataframe(df, drop_columns=['start', 'end', 'timestamp']))
 
     def find_entry(self):
         """
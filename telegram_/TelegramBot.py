@@ -9,9 +9,11 @@
     @CryptoMakerGroup: Chat_id = -1001714621495
     https://t.me/+UXhbqp43EzQ3ODlh
 """
+import atexit
+import collections
+import threading
 import time
 
-import telegram
 import datetime as dt
 import api_keys
 import constants
@@ -20,33 +22,137 @@ from logging_.Logger import Logger
 
 
 class TelegramBot:
-    _logger = Logger.get_module_logger(__name__)
-    enabled = Configuration.get_config()['telegram']['enable']
-    instance_name = Configuration.get_config()['bot']['instance_name']
-    telegram_bot = telegram.Bot(token=api_keys.TELEGRAM_BOT_TOKEN)
+    """
+        Messages are sent to the group by a background thread, send_to_group() only queues them and never blocks.
+
+        - The messages waiting in the queue are coalesced: a burst is sent as one Telegram message.
+        - At most one Telegram message every min_interval_secs (Telegram limit: 20 messages/minute in a group).
+        - The queue is bounded (queue_size). When it is full, the oldest low priority message is dropped,
+          or the new one if it has low priority and all the queued messages have a high priority.
+
+        Nothing is done at import: the settings are read on the first message, the telegram package
+        is imported and the telegram.Bot created by the sending thread.
+    """
+    _logger = None
+    enabled = None
+    instance_name = None
+    telegram_bot = None
+
+    PRIORITY_LOW = 0
+    PRIORITY_HIGH = 1
+
+    # Telegram maximum message length
+    MAX_MESSAGE_LENGTH = 4096
 
     max_retries = 5
+    queue_size = 100
+    min_interval_secs = 3
+
+    # (priority, message) waiting to be sent
+    _queue = collections.deque()
+    _condition = threading.Condition()
+    _thread = None
+    _sending = False
+    nb_dropped = 0
+
+    @classmethod
+    def load_settings(cls):
+        if cls.enabled is None:
+            config = Configuration.get_config()
+            cls._logger = Logger.get_module_logger(__name__)
+            cls.instance_name = config['bot']['instance_name']
+            cls.queue_size = config['telegram'].get('queue_size', cls.queue_size)
+            cls.min_interval_secs = config['telegram'].get('min_interval_secs', cls.min_interval_secs)
+            cls.enabled = config['telegram']['enable']
 
     @classmethod
-    def send_to_group(cls, msg, fixed_width=True, include_time=False):
+    def send_to_group(cls, msg, fixed_width=True, include_time=False, priority=PRIORITY_HIGH):
+        cls.load_settings()
         if cls.enabled and api_keys.TELEGRAM_BOT_TOKEN and api_keys.TELEGRAM_GRP_CHAT_ID:
-            nb_attempts = 0
+            # Room left for the time, the instance name and the formatting
+            msg = str(msg)[:cls.MAX_MESSAGE_LENGTH - 200]
             _now = f'[{dt.datetime.now().strftime(constants.DATETIME_FMT)}] ' if include_time else ''
             if fixed_width:
                 msg = f'`{_now}{cls.instance_name}: {msg}`'
             else:
                 msg = f'{_now}{cls.instance_name}: {msg}'.replace('-', '\\-')
+            cls._enqueue(priority, msg)
 
-            while nb_attempts < cls.max_retries:
-                try:
-                    cls.telegram_bot.send_message(text=msg, chat_id=api_keys.TELEGRAM_GRP_CHAT_ID,
-                                                  parse_mode=telegram.ParseMode.MARKDOWN_V2)
+    @classmethod
+    def _enqueue(cls, priority, msg):
+        with cls._condition:
+            if len(cls._queue) >= cls.queue_size:
+                low = next((item for item in cls._queue if item[0] == cls.PRIORITY_LOW), None)
+                if low:
+                    cls._queue.remove(low)
+                elif priority == cls.PRIORITY_LOW:
+                    cls.nb_dropped += 1
                     return
-                except telegram.error.TimedOut as e:
-                    nb_attempts += 1
-                    time.sleep(1)
-            msg = f"Unable to send Telegram message. Max retries ({cls.max_retries}) exceeded."
-            cls._logger.error(msg)
+                else:
+                    cls._queue.popleft()
+                cls.nb_dropped += 1
+            cls._queue.append((priority, msg))
+            if not cls._thread:
+                cls._thread = threading.Thread(target=cls._run, name='TelegramBot', daemon=True)
+                cls._thread.start()
+                atexit.register(cls.flush)
+            cls._condition.notify()
+
+    # Wait until the queued messages are sent, at most timeout seconds. Call before exiting or restarting.
+    @classmethod
+    def flush(cls, timeout=10):
+        with cls._condition:
+            cls._condition.wait_for(lambda: not cls._queue and not cls._sending, timeout)
+
+    @classmethod
+    def _run(cls):
+        while True:
+            with cls._condition:
+                cls._condition.wait_for(lambda: cls._queue)
+                msg = cls._coalesce()
+                cls._sending = True
+            try:
+                cls._send(msg)
+            except Exception as e:
+                cls._logger.exception(e)
+            finally:
+                with cls._condition:
+                    cls._sending = False
+                    cls._condition.notify_all()
+            time.sleep(cls.min_interval_secs)
+
+    # Queued messages joined into one, within the Telegram message length
+    @classmethod
+    def _coalesce(cls):
+        messages = [cls._queue.popleft()[1]]
+        length = len(messages[0])
+        while cls._queue and length + 1 + len(cls._queue[0][1]) <= cls.MAX_MESSAGE_LENGTH:
+            messages.append(cls._queue.popleft()[1])
+            length += 1 + len(messages[-1])
+        if cls.nb_dropped and length + 40 <= cls.MAX_MESSAGE_LENGTH:
+            messages.append(f'`{cls.nb_dropped} messages dropped`')
+            cls.nb_dropped = 0
+        return '\n'.join(messages)
+
+    @classmethod
+    def _send(cls, msg):
+        import telegram
+        if not cls.telegram_bot:
+            cls.telegram_bot = telegram.Bot(token=api_keys.TELEGRAM_BOT_TOKEN)
+        nb_attempts = 0
+        while nb_attempts < cls.max_retries:
+            try:
+                cls.telegram_bot.send_message(text=msg, chat_id=api_keys.TELEGRAM_GRP_CHAT_ID,
+                                              parse_mode=telegram.ParseMode.MARKDOWN_V2)
+                return
+            except telegram.error.RetryAfter as e:
+                nb_attempts += 1
+                time.sleep(e.retry_after)
+            except telegram.error.TimedOut as e:
+                nb_attempts += 1
+                time.sleep(2 ** nb_attempts)
+        msg = f"Unable to send Telegram message. Max retries ({cls.max_retries}) exceeded."
+        cls._logger.error(msg)
 
 
 """
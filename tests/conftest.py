@@ -0,0 +1,25 @@
+import logging
+
+import pytest
+
+from Configuration import Configuration
+from logging_.Logger import Logger
+
+
+def pytest_configure(config):
+    # The unit tests run without config.json: plain loggers instead of the configured ones.
+    # Set before the test modules are imported, some modules create their logger at import time.
+    Logger.get_module_logger = staticmethod(lambda name: logging.getLogger(name))
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """ Database on an embedded SQLite file, without exchange. Set db._exchange to sync from a fake one. """
+    from database.Database import Database
+    monkeypatch.setattr(Configuration, '_config', {
+        'exchange': {'testnet': False},
+        'database': {'db_name': 'test', 'backend': 'sqlite', 'path': str(tmp_path)}
+    })
+    db = Database(None)
+    yield db
+    db.close()
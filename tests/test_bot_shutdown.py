@@ -0,0 +1,57 @@
+import logging
+
+import pytest
+
+from Bot import Bot
+from database.WriteBehindQueue import WriteBehindQueue
+from test_write_behind_queue import FakeEngine, STATEMENT
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.engine = FakeEngine()
+        # The writer thread never flushes by itself during the test
+        self.write_queue = WriteBehindQueue(self.engine, batch_size=10 ** 6, flush_secs=3600, retry_secs=3600)
+
+    def close(self):
+        self.write_queue.close()
+
+
+class FakeExchange:
+    def __init__(self):
+        self.recorder_closed = 0
+
+    def close_recorder(self):
+        self.recorder_closed += 1
+
+
+def create_bot(run):
+    bot = Bot.__new__(Bot)
+    bot._logger = logging.getLogger('test')
+    bot._config = {'bot': {'progress_bar': False}}
+    bot.throttle_secs = 0
+    bot._entry_task = None
+    bot._closed = False
+    bot.db = FakeDatabase()
+    bot._exchange = FakeExchange()
+    bot.run = run
+    return bot
+
+
+def test_crash_flushes_the_queued_writes():
+    def run():
+        bot.db.write_queue.put(STATEMENT, {'id': 1})
+        raise RuntimeError('strategy error')
+
+    bot = create_bot(run)
+    with pytest.raises(RuntimeError):
+        bot.run_forever()
+    assert bot.db.engine.rows == [1]
+    assert bot._exchange.recorder_closed == 1
+
+
+def test_close_only_once():
+    bot = create_bot(None)
+    bot.close()
+    bot.close()
+    assert bot._exchange.recorder_closed == 1
@@ -0,0 +1,125 @@
+import logging
+
+import pytest
+
+from Orders import Order, Orders
+from enums.BybitEnums import OrderSide, OrderType
+from exchange.ExchangeBybit import ExchangeBybit
+from pybit.exceptions import InvalidRequestError
+from trade_entry.BaseTradeEntry import BaseTradeEntry
+
+PAIR = 'BTCUSDT'
+TIME = '2022-04-15T05:20:00Z'
+
+
+def error(status_code):
+    return InvalidRequestError(request='place_active_order', message='error', status_code=status_code,
+                               time='05:20:00')
+
+
+def placed(params):
+    return {'ret_code': 0, 'ret_msg': 'OK', 'result': {
+        'order_id': f"id-{params['order_link_id']}", 'order_link_id': params['order_link_id'],
+        'qty': params['qty'], 'price': params['price'], 'created_time': TIME, 'updated_time': TIME}}
+
+
+class FakeSession:
+    """ Bulk placement where the order at index i fails with errors[i] """
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.sent = []
+
+    def place_active_order_bulk(self, orders, return_exceptions=False):
+        self.sent.extend(orders)
+        return [self.errors[i] if i in self.errors else placed(o) for i, o in enumerate(orders)]
+
+
+def create_exchange(errors):
+    exchange = ExchangeBybit.__new__(ExchangeBybit)
+    exchange._logger = logging.getLogger('test')
+    exchange.session_auth = FakeSession(errors)
+    return exchange
+
+
+def create_orders(exchange):
+    orders = Orders.__new__(Orders)
+    orders._logger = logging.getLogger('test')
+    orders.exchange = exchange
+    return orders
+
+
+def tp_orders(nb):
+    return [Order(order_link_id=f'L1.TP.{i + 1}', side=OrderSide.Sell, symbol=PAIR, order_type=OrderType.Limit,
+                  qty=0.01, price=41000.0 + i, reduce_only=True) for i in range(nb)]
+
+
+def test_place_orders_keeps_the_placed_results():
+    exchange = create_exchange({1: error(10001), 2: error(130125)})
+    results = exchange.place_orders(tp_orders(3), return_exceptions=True)
+    assert results[0]['order_id'] == 'id-L1.TP.1'
+    assert isinstance(results[1], InvalidRequestError)
+    # Ignored code: rejected, not an error
+    assert results[2] is None
+
+    with pytest.raises(InvalidRequestError):
+        create_exchange({1: error(10001)}).place_orders(tp_orders(3))
+
+
+def test_orders_are_processed_before_the_error_is_raised():
+    orders = tp_orders(3)
+    with pytest.raises(InvalidRequestError):
+        create_orders(create_exchange({1: error(10001)})).place_orders(orders, 'TakeProfit')
+    assert orders[0].order_id == 'id-L1.TP.1'
+    assert orders[1].order_id is None
+    assert orders[2].order_id == 'id-L1.TP.3'
+
+
+class TradeEntry(BaseTradeEntry):
+    def enter_trade(self):
+        pass
+
+    def get_current_ob_price(self, side):
+        pass
+
+
+class FakeExchange:
+    def get_order_by_id_ws_only(self, pair, order_id):
+        return {'cum_exec_qty': 0.06}
+
+
+def create_trade_entry(errors, executions):
+    entry = TradeEntry.__new__(TradeEntry)
+    entry._logger = logging.getLogger('test')
+    entry._config = {'trading': {'constant_take_profit': False, 'take_profit_pct': 1}}
+    entry.signal = {'Side': OrderSide.Buy, 'OrderLinkId': 'L1'}
+    entry.pair = PAIR
+    entry.tick_size = 0.5
+    entry.nb_tp_orders = 0
+    entry.take_profit_cum_qty = 0
+    entry.take_profit_order_id = None
+    entry._exchange = FakeExchange()
+    entry._orders = create_orders(create_exchange(errors))
+    entry.get_executions = lambda side, order_id=None: executions
+    return entry
+
+
+def execution(price, qty):
+    return {'order_id': 'main', 'price': price, 'exec_qty': qty}
+
+
+def test_tp_ladder_partial_failure_covers_the_placed_levels():
+    executions = [execution(40000.0, 0.01), execution(40100.0, 0.02), execution(40200.0, 0.03)]
+    entry = create_trade_entry({1: error(10001)}, executions)
+    with pytest.raises(InvalidRequestError):
+        entry.set_tp_on_executions('main')
+    # The failed level is still missing: validate_tp places it again, not the levels already placed
+    assert entry.take_profit_cum_qty == 0.04
+    assert len(entry._orders.exchange.session_auth.sent) == 3
+
+
+def test_tp_ladder_rejected_levels_are_not_covered():
+    executions = [execution(40000.0, 0.01), execution(40100.0, 0.02)]
+    entry = create_trade_entry({0: error(130125)}, executions)
+    entry.set_tp_on_executions('main')
+    assert entry.take_profit_cum_qty == 0.02
@@ -0,0 +1,74 @@
+import threading
+import time
+
+
+class FakeExchange:
+    """ Each fetch lasts delay seconds and returns no record. Tracks the concurrent calls per table. """
+
+    def __init__(self, delay=0.05, failing=()):
+        self.delay = delay
+        self.failing = failing
+        self.calls = []
+        self.running = {}
+        self.max_running = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, table, pair):
+        with self._lock:
+            self.calls.append((pair, table))
+            self.running[table] = self.running.get(table, 0) + 1
+            self.max_running[table] = max(self.max_running.get(table, 0), self.running[table])
+        time.sleep(self.delay)
+        with self._lock:
+            self.running[table] -= 1
+        if (pair, table) in self.failing:
+            raise ConnectionError('Bybit unreachable')
+        return None
+
+    def get_all_order_records(self, pair, start_time=None):
+        return self._fetch('orders', pair)
+
+    def get_all_closed_pnl_records(self, pair, start_time=None):
+        return self._fetch('closed_pnl', pair)
+
+    def get_user_trades_records(self, pair, start_time=None):
+        return self._fetch('user_trades', pair)
+
+    def get_all_conditional_order_records(self, pair, start_time=None):
+        return self._fetch('cond_orders', pair)
+
+
+PAIRS = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'XRPUSDT']
+
+
+def test_all_pairs_and_tables_are_synced_in_parallel(database):
+    exchange = database._exchange = FakeExchange()
+    start = time.time()
+    timings = database.sync_all_tables(PAIRS, max_workers=8)
+    elapsed = time.time() - start
+
+    assert sorted(exchange.calls) == sorted((p, t) for p in PAIRS for t in exchange.max_running)
+    assert len(exchange.calls) == 16
+    assert set(timings) == {database.ORDERS_TBL_NAME, database.CLOSED_PNL_TBL_NAME,
+                            database.USER_TRADES_TBL_NAME, database.COND_ORDERS_TBL_NAME}
+    # At most SYNC_CALLS_PER_TABLE callers per endpoint
+    assert max(exchange.max_running.values()) <= database.SYNC_CALLS_PER_TABLE
+    # 16 calls of 50ms, sequentially 0.8s
+    assert elapsed < 0.6
+
+
+def test_a_failing_task_does_not_stop_the_others(database):
+    exchange = database._exchange = FakeExchange(delay=0, failing=[('BTCUSDT', 'orders')])
+    database.sync_all_tables(PAIRS[:2])
+    assert len(exchange.calls) == 8
+
+
+def test_periodic_sync_runs_until_stopped(database):
+    exchange = database._exchange = FakeExchange(delay=0)
+    database.start_periodic_sync(PAIRS[:1], interval_secs=0.05)
+    time.sleep(0.3)
+    database.stop_periodic_sync()
+    nb_calls = len(exchange.calls)
+    assert nb_calls >= 8
+    time.sleep(0.1)
+    assert len(exchange.calls) == nb_calls
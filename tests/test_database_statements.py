@@ -0,0 +1,53 @@
+import sqlalchemy as sa
+
+
+def order(order_id, status='New', **kwargs):
+    return dict({
+        'order_id': order_id, 'user_id': '1', 'symbol': 'BTCUSDT', 'side': 'Buy', 'order_type': 'Limit',
+        'price': 40000.0, 'qty': 0.01, 'time_in_force': 'PostOnly', 'order_status': status, 'stop_loss': 39000.0,
+        'reduce_only': 'False', 'close_on_trigger': 'False',
+        'created_time': '2022-04-15 05:20:00', 'updated_time': '2022-04-15 05:20:00'
+    }, **kwargs)
+
+
+def select_orders(db):
+    table = db.get_table(db.ORDERS_TBL_NAME)
+    with db.engine.connect() as connection:
+        return [dict(r) for r in connection.execute(sa.select([table]).order_by(table.c.order_id))]
+
+
+def test_tables_are_reflected_once(database, monkeypatch):
+    table = database.get_table(database.ORDERS_TBL_NAME)
+    monkeypatch.setattr(sa, 'Table', None)
+    assert database.get_table(database.ORDERS_TBL_NAME) is table
+
+
+def test_order_upsert_and_stop_loss_update(database):
+    database.add_order_dict([order('a'), order('b')])
+    database.update_order_stop_loss_by_id('a', 39500.0)
+    # Saved again after a fill: updated, not duplicated
+    database.add_order_dict([order('a', status='Filled')])
+    assert database.write_queue.flush()
+
+    rows = select_orders(database)
+    assert [(r['order_id'], r['order_status'], r['stop_loss']) for r in rows] == [
+        ('a', 'Filled', 39000.0), ('b', 'New', 39000.0)]
+
+
+def test_consecutive_operations_of_a_statement_are_batched(database, monkeypatch):
+    executed = []
+    execute = sa.engine.Connection.execute
+
+    def record(connection, statement, *args, **kwargs):
+        if args and isinstance(args[0], list):
+            executed.append(len(args[0]))
+        return execute(connection, statement, *args, **kwargs)
+    monkeypatch.setattr(sa.engine.Connection, 'execute', record)
+
+    for i in range(3):
+        database.add_order_dict(order(f'o{i}'))
+    database.update_order_stop_loss_by_id('o0', 39500.0)
+    database.add_order_dict(order('o3'))
+    assert database.write_queue.flush()
+    assert executed == [3, 1, 1]
+    assert len(select_orders(database)) == 4
@@ -0,0 +1,124 @@
+import datetime as dt
+
+import pytest
+import sqlalchemy as sa
+
+from exchange.ExchangeBybit import ExchangeBybit
+
+PAIR = 'BTCUSDT'
+
+
+def ts(time_str):
+    return dt.datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S').timestamp()
+
+
+def closed_pnl(id_, created_at):
+    return {'id': id_, 'user_id': 1, 'symbol': PAIR, 'order_id': f'o{id_}', 'side': 'Sell', 'qty': 0.01,
+            'order_price': 40000.0, 'order_type': 'Limit', 'exec_type': 'Trade', 'closed_size': 0.01,
+            'cum_entry_value': 400.0, 'avg_entry_price': 40000.0, 'cum_exit_value': 401.0,
+            'avg_exit_price': 40100.0, 'closed_pnl': 1.0, 'fill_count': 1, 'leverage': 1.0,
+            'created_at': created_at}
+
+
+def order(order_id, created_time, status):
+    return {'order_id': order_id, 'user_id': '1', 'symbol': PAIR, 'side': 'Buy', 'order_type': 'Limit',
+            'price': 40000.0, 'qty': 0.01, 'time_in_force': 'PostOnly', 'order_status': status,
+            'reduce_only': 'False', 'close_on_trigger': 'False', 'created_time': created_time,
+            'updated_time': created_time}
+
+
+class FakeExchange:
+    """ Returns the scripted records of each call, records the start_time requested """
+
+    def __init__(self):
+        self.closed_pnl = []
+        self.orders = []
+        self.start_times = []
+
+    def get_all_closed_pnl_records(self, pair, start_time=None):
+        self.start_times.append(start_time)
+        return self.closed_pnl.pop(0)
+
+    def get_all_order_records(self, pair, start_time=None):
+        self.start_times.append(start_time)
+        return self.orders.pop(0)
+
+
+@pytest.fixture
+def exchange(database):
+    database._exchange = FakeExchange()
+    return database._exchange
+
+
+def select(db, table_name, order_by):
+    table = db.get_table(table_name)
+    with db.engine.connect() as connection:
+        return [dict(r) for r in connection.execute(sa.select([table]).order_by(table.c[order_by]))]
+
+
+def test_sync_resumes_from_the_cursor_with_an_overlap(database, exchange):
+    exchange.closed_pnl = [
+        [closed_pnl(1, '2022-04-15 05:00:00'), closed_pnl(2, '2022-04-15 05:10:00')],
+        # The overlap returns the last record again
+        [closed_pnl(2, '2022-04-15 05:10:00'), closed_pnl(3, '2022-04-15 05:20:00')],
+    ]
+    assert database.sync_all_closed_pnl_records(PAIR) == 2
+    assert database.get_sync_cursor(database.CLOSED_PNL_TBL_NAME, PAIR) \
+        == ts('2022-04-15 05:10:00') - database.SYNC_OVERLAP_SECS
+    database.sync_all_closed_pnl_records(PAIR)
+
+    assert exchange.start_times == [None, ts('2022-04-15 05:10:00') - database.SYNC_OVERLAP_SECS]
+    assert [r['id'] for r in select(database, database.CLOSED_PNL_TBL_NAME, 'id')] == [1, 2, 3]
+    # One cursor per table and pair
+    assert database.get_sync_cursor(database.CLOSED_PNL_TBL_NAME, 'ETHUSDT') is None
+    assert database.get_sync_cursor(database.ORDERS_TBL_NAME, PAIR) is None
+
+
+def test_order_cursor_stays_at_the_oldest_pending_order(database, exchange):
+    exchange.orders = [
+        [order('a', '2022-04-15 05:00:00', 'Filled'), order('b', '2022-04-15 05:10:00', 'New'),
+         order('c', '2022-04-15 05:20:00', 'Cancelled')],
+        [order('b', '2022-04-15 05:10:00', 'Filled'), order('c', '2022-04-15 05:20:00', 'Cancelled')],
+    ]
+    database.sync_all_order_records(PAIR)
+    assert database.get_sync_cursor(database.ORDERS_TBL_NAME, PAIR) \
+        == ts('2022-04-15 05:10:00') - database.SYNC_OVERLAP_SECS
+
+    # The pending order is updated, all final: the cursor moves after the newest order
+    database.sync_all_order_records(PAIR)
+    rows = select(database, database.ORDERS_TBL_NAME, 'order_id')
+    assert [(r['order_id'], r['order_status']) for r in rows] == [('a', 'Filled'), ('b', 'Filled'),
+                                                                  ('c', 'Cancelled')]
+    assert database.get_sync_cursor(database.ORDERS_TBL_NAME, PAIR) \
+        == ts('2022-04-15 05:20:00') - database.SYNC_OVERLAP_SECS
+
+
+def test_cursor_does_not_move_when_the_insert_fails(database, exchange):
+    bad = closed_pnl(2, '2022-04-15 05:10:00')
+    bad['symbol'] = None
+    exchange.closed_pnl = [[closed_pnl(1, '2022-04-15 05:00:00'), bad]]
+    with pytest.raises(sa.exc.IntegrityError):
+        database.sync_all_closed_pnl_records(PAIR)
+    assert database.get_sync_cursor(database.CLOSED_PNL_TBL_NAME, PAIR) is None
+    assert select(database, database.CLOSED_PNL_TBL_NAME, 'id') == []
+
+
+def test_order_pages_stop_at_the_start_time():
+    # Newest first, 2 orders per page
+    created = ['2022-04-15T05:40:00Z', '2022-04-15T05:30:00Z', '2022-04-15T05:20:00Z', '2022-04-15T05:10:00Z',
+               '2022-04-15T05:00:00Z']
+    pages = []
+
+    def get_orders(symbol, order, page, limit):
+        pages.append((order, page))
+        data = [{'created_time': c} for c in created[(page - 1) * 2: page * 2]]
+        return {'result': {'data': data}}
+
+    start_time = dt.datetime(2022, 4, 15, 5, 15, tzinfo=dt.timezone.utc).timestamp()
+    records = ExchangeBybit._get_records_created_since(get_orders, PAIR, start_time)
+    assert [r['created_time'] for r in records] == created[:3][::-1]
+    assert pages == [('desc', 1), ('desc', 2)]
+
+    pages.clear()
+    assert len(ExchangeBybit._get_records_created_since(get_orders, PAIR)) == 5
+    assert pages[0] == ('asc', 1)
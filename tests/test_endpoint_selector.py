@@ -0,0 +1,144 @@
+import logging
+import time
+
+import pytest
+import requests
+
+from pybit import HTTP, endpoints as endpoints_module
+from pybit.endpoints import EndpointSelector
+
+PRIMARY = 'https://api.bybit.com'
+SECONDARY = 'https://api.bytick.com'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def perf_counter(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, url, ret_code=0):
+        self.url = url
+        self.ret_code = ret_code
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'ret_code': self.ret_code, 'url': self.url}
+
+
+class FakeMeasureSession:
+    """ Round trip time per endpoint, None when unreachable """
+
+    def __init__(self, clock, rtts):
+        self.clock = clock
+        self.rtts = rtts
+
+    def get(self, url, timeout):
+        endpoint = url[:-len(EndpointSelector.PATH)]
+        if self.rtts[endpoint] is None:
+            raise requests.exceptions.ConnectTimeout(url)
+        self.clock.now += self.rtts[endpoint]
+        return FakeResponse(url)
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(endpoints_module.time, 'perf_counter', fake_clock.perf_counter)
+    return fake_clock
+
+
+def test_fastest_endpoint_is_the_primary(fake_clock):
+    session = FakeMeasureSession(fake_clock, {PRIMARY: 0.08, SECONDARY: 0.03})
+    selector = EndpointSelector(session, [PRIMARY, SECONDARY], logger=logging.getLogger('test'))
+    assert selector.primary == PRIMARY
+    selector.measure()
+    assert (selector.primary, selector.secondary) == (SECONDARY, PRIMARY)
+    assert selector.get_median(SECONDARY) == pytest.approx(0.03)
+    assert selector.route(f'{PRIMARY}/v2/private/order/create') == (f'{SECONDARY}/v2/private/order/create',
+                                                                     SECONDARY)
+    assert selector.route('https://other.com/v2/public/time') == ('https://other.com/v2/public/time', None)
+
+
+def test_primary_only_changes_for_a_clearly_faster_endpoint(fake_clock):
+    session = FakeMeasureSession(fake_clock, {PRIMARY: 0.05, SECONDARY: 0.048})
+    selector = EndpointSelector(session, [PRIMARY, SECONDARY], samples=1)
+    selector.measure()
+    assert selector.primary == PRIMARY
+    # An unreachable endpoint is measured at the timeout
+    session.rtts[PRIMARY] = None
+    selector.measure()
+    assert selector.primary == SECONDARY
+    assert list(selector.rtts[PRIMARY]) == pytest.approx([0.05, selector.timeout])
+
+
+def test_hedge_delay_is_the_p95_latency_of_the_primary():
+    selector = EndpointSelector(None, [PRIMARY, SECONDARY], hedge=True, hedge_min_secs=0.05)
+    assert selector.get_hedge_delay(PRIMARY) is None
+    # The measures until the first requests
+    selector.rtts[PRIMARY].extend([0.01, 0.02])
+    assert selector.get_hedge_delay(PRIMARY) == 0.05
+    for i in range(100):
+        selector.record(PRIMARY, (i + 1) / 1000)
+    assert selector.get_hedge_delay(PRIMARY) == pytest.approx(0.096)
+    assert selector.get_hedge_delay(SECONDARY) is None
+    selector.hedge = False
+    assert selector.get_hedge_delay(PRIMARY) is None
+
+
+class FakeSendSession:
+    """ Seconds to answer per endpoint """
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.urls = []
+
+    def send(self, r, timeout):
+        self.urls.append(r.url)
+        endpoint = next(e for e in self.delays if r.url.startswith(e))
+        time.sleep(self.delays[endpoint])
+        return FakeResponse(r.url)
+
+
+class FakeRateLimiter:
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def try_acquire(self, url):
+        self.tokens -= 1
+        return self.tokens >= 0
+
+
+def hedging_session(delays, rate_limiter=None):
+    selector = EndpointSelector(None, [PRIMARY, SECONDARY], hedge=True, hedge_min_secs=0.05)
+    # Measured: hedged after 50ms
+    selector.rtts[PRIMARY].append(0.02)
+    session = HTTP(PRIMARY, endpoint_selector=selector, rate_limiter=rate_limiter, logger=logging.getLogger('test'))
+    session.client = FakeSendSession(delays)
+    request = requests.Request('GET', f'{PRIMARY}/private/linear/order/search').prepare()
+    return session, selector, request
+
+
+def test_slow_request_is_hedged_on_the_secondary():
+    session, selector, request = hedging_session({PRIMARY: 0.5, SECONDARY: 0.01})
+    start = time.time()
+    s = session._send(request, 5, PRIMARY, hedged=True)
+    assert time.time() - start < 0.3
+    assert s.url == f'{SECONDARY}/private/linear/order/search'
+    assert session.client.urls == [f'{PRIMARY}/private/linear/order/search', s.url]
+    # The latency of the primary is recorded when its response arrives, also when it is not used
+    session._hedge_executor.shutdown(wait=True)
+    assert (len(selector.latencies[PRIMARY]), len(selector.latencies[SECONDARY])) == (1, 1)
+
+
+def test_no_hedged_request_without_rate_limit_token_or_for_non_idempotent_requests():
+    session, selector, request = hedging_session({PRIMARY: 0.1, SECONDARY: 0.01}, FakeRateLimiter(tokens=0))
+    assert session._send(request, 5, PRIMARY, hedged=True).url == request.url
+    session, selector, request = hedging_session({PRIMARY: 0.1, SECONDARY: 0.01})
+    assert session._send(request, 5, PRIMARY, hedged=False).url == request.url
+    assert session.client.urls == [request.url]
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from database.EventJournal import EventJournal
+
+RECEIVED_TS = 1650000000.0
+
+
+def order_event(status, qty='0.01'):
+    return {'order_id': 'o1', 'order_link_id': 'l1', 'symbol': 'BTCUSDT', 'side': 'Buy', 'order_status': status,
+            'price': '40000', 'qty': qty, 'update_time': '2022-04-15T05:20:00.123Z'}
+
+
+@pytest.fixture
+def journal(database):
+    return EventJournal(database)
+
+
+def test_order_life_is_journaled_in_receive_order(database, journal):
+    journal.add_events('order', [order_event('New')], RECEIVED_TS)
+    journal.add_events('order', [order_event('New', qty='0.02')], RECEIVED_TS + 0.25)
+    journal.add_events('execution', [{'order_id': 'o1', 'order_link_id': 'l1', 'exec_id': 'e1',
+                                      'symbol': 'BTCUSDT', 'side': 'Buy', 'exec_type': 'Trade',
+                                      'exec_price': '40000', 'exec_qty': '0.02', 'trade_time': None}],
+                       RECEIVED_TS + 1.5)
+    journal.add_events('order', [order_event('Filled', qty='0.02')], RECEIVED_TS + 1.5)
+    assert database.write_queue.flush()
+
+    df = journal.get_order_events(order_id='o1')
+    assert list(df['topic']) == ['order', 'order', 'execution', 'order']
+    assert list(df['status']) == ['New', 'New', 'Trade', 'Filled']
+    assert list(df['qty']) == [0.01, 0.02, 0.02, 0.02]
+    assert list(df['elapsed']) == [0.0, 0.25, 1.5, 1.5]
+    assert df['exchange_time'][0] == '2022-04-15T05:20:00.123Z'
+    assert df['exchange_time'][2] is None
+    assert json.loads(df['data'][0]) == order_event('New')
+    assert len(journal.get_order_events(order_link_id='l1')) == 4
+
+
+def test_position_events_and_bad_numbers(database, journal):
+    journal.add_events('position', [{'symbol': 'BTCUSDT', 'side': 'Buy', 'position_status': 'Normal',
+                                     'entry_price': '', 'size': 0.01}], RECEIVED_TS)
+    assert database.write_queue.flush()
+    table = database.get_table(journal.EVENT_JOURNAL_TBL_NAME)
+    with database.engine.connect() as connection:
+        row = connection.execute(table.select()).fetchone()
+    assert (row['topic'], row['status'], row['price'], row['qty'], row['exchange_time'], row['order_id']) == \
+        ('position', 'Normal', None, 0.01, None, None)
+
+
+def test_listener_only_journals_the_private_topics(database, journal):
+    listener = journal.listener()
+    listener('', {'topic': 'order', 'data': [order_event('New')]})
+    listener('', {'topic': 'wallet', 'data': [{'wallet_balance': 100}]})
+    listener('', {'success': True, 'request': {'op': 'auth'}})
+    listener('', None)
+    assert database.write_queue.flush()
+    assert list(journal.get_order_events(order_id='o1')['topic']) == ['order']
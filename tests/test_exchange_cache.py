@@ -0,0 +1,69 @@
+import pytest
+
+from exchange import ExchangeCache as exchange_cache
+from exchange.ExchangeCache import ExchangeCache
+
+ENDPOINT = 'https://api.bybit.com'
+ACCOUNT = 'bybit:key'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1650000000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(exchange_cache.time, 'time', clock.time)
+    return clock
+
+
+def create_cache(tmp_path, account=ACCOUNT):
+    return ExchangeCache(ENDPOINT, account, file_name=str(tmp_path / 'exchange_cache.json'),
+                         instruments_ttl_secs=3600, settings_ttl_secs=86400)
+
+
+def test_setting_applied_until_the_ttl(tmp_path, clock):
+    cache = create_cache(tmp_path)
+    assert not cache.is_setting_applied('BTCUSDT', 'position_mode', 'BothSide')
+    cache.set_setting_applied('BTCUSDT', 'position_mode', 'BothSide')
+    assert cache.is_setting_applied('BTCUSDT', 'position_mode', 'BothSide')
+    # Another value is sent
+    assert not cache.is_setting_applied('BTCUSDT', 'position_mode', 'MergedSingle')
+
+    clock.now += 86399
+    assert cache.is_setting_applied('BTCUSDT', 'position_mode', 'BothSide')
+    clock.now += 1
+    assert not cache.is_setting_applied('BTCUSDT', 'position_mode', 'BothSide')
+
+
+def test_settings_are_kept_across_restarts_per_account(tmp_path, clock):
+    create_cache(tmp_path).set_setting_applied('BTCUSDT', 'auto_add_margin', False)
+    assert create_cache(tmp_path).is_setting_applied('BTCUSDT', 'auto_add_margin', False)
+    assert not create_cache(tmp_path, account='bybit:other').is_setting_applied('BTCUSDT', 'auto_add_margin', False)
+    assert 'key' not in (tmp_path / 'exchange_cache.json').read_text()
+
+    cache = create_cache(tmp_path)
+    cache.clear_settings('BTCUSDT')
+    assert not create_cache(tmp_path).is_setting_applied('BTCUSDT', 'auto_add_margin', False)
+
+
+def test_stale_instruments_are_returned_as_not_fresh(tmp_path, clock):
+    cache = create_cache(tmp_path)
+    assert cache.get_instrument('BTCUSDT') == (None, False)
+    cache.set_instruments([{'name': 'BTCUSDT', 'maker_fee': '-0.00025'}])
+    assert cache.get_instrument('BTCUSDT') == ({'name': 'BTCUSDT', 'maker_fee': '-0.00025'}, True)
+    clock.now += 3600
+    assert create_cache(tmp_path).get_instrument('BTCUSDT') == ({'name': 'BTCUSDT', 'maker_fee': '-0.00025'}, False)
+
+
+def test_corrupted_file_is_ignored(tmp_path, clock):
+    (tmp_path / 'exchange_cache.json').write_text('{"settings": ')
+    cache = create_cache(tmp_path)
+    assert not cache.is_setting_applied('BTCUSDT', 'position_mode', 'BothSide')
+    cache.set_setting_applied('BTCUSDT', 'position_mode', 'BothSide')
+    assert create_cache(tmp_path).is_setting_applied('BTCUSDT', 'position_mode', 'BothSide')
@@ -0,0 +1,130 @@
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from Configuration import Configuration
+from exchange import ExchangeBybit as exchange_module
+from exchange.ExchangeBybit import ExchangeBybit
+from exchange.LocalBybitServer import LocalBybitServer
+from logging_.StartupProfile import StartupProfile
+from pybit import WebSocket
+
+PAIR = 'BTCUSDT'
+# Duration of each of the startup steps
+DELAY = 0.2
+
+CONFIG = {
+    'trading': {'interval': '1m'},
+    'exchange': {'name': 'bybit', 'pair': PAIR, 'stake_currency': 'USDT', 'testnet': False, 'market_type': 'linear',
+                 'http': {'linear_mainnet2': 'https://api.bytick.com'},
+                 'websockets': {'ws_linear_public_mainnet2': 'wss://stream.bytick.com/realtime_public',
+                                'ws_linear_private_mainnet2': 'wss://stream.bytick.com/realtime_private'}}
+}
+
+
+@pytest.fixture
+def slow_exchange(monkeypatch):
+    """ ExchangeBybit where each startup step lasts DELAY seconds. Returns the steps started, with their thread. """
+    monkeypatch.setattr(Configuration, '_config', CONFIG)
+    monkeypatch.setattr(exchange_module.api_keys, 'BYBIT_API_KEY', 'key', raising=False)
+    monkeypatch.setattr(exchange_module.api_keys, 'BYBIT_API_SECRET', 'secret', raising=False)
+    monkeypatch.setattr(StartupProfile, '_phases', [])
+    steps = []
+
+    def step(name, result=None):
+        def run(self, *args):
+            steps.append((name, threading.current_thread().name))
+            time.sleep(DELAY)
+            return result
+        return run
+    monkeypatch.setattr(ExchangeBybit, 'create_http_session', lambda self: None)
+    monkeypatch.setattr(ExchangeBybit, 'reset_trading_settings', step('trading_settings'))
+    monkeypatch.setattr(ExchangeBybit, 'get_pair_details', step('pair_details', {'name': PAIR}))
+    monkeypatch.setattr(ExchangeBybit, 'create_public_websocket', step('ws_public', 'public'))
+    monkeypatch.setattr(ExchangeBybit, 'create_private_websocket', step('ws_private', 'private'))
+    return steps
+
+
+def test_startup_steps_run_concurrently(slow_exchange):
+    start = time.time()
+    exchange = ExchangeBybit()
+    elapsed = time.time() - start
+
+    assert sorted(name for name, _ in slow_exchange) == ['pair_details', 'trading_settings', 'ws_private',
+                                                         'ws_public']
+    assert len({thread for _, thread in slow_exchange}) == 4
+    # Sequentially 4 * DELAY
+    assert elapsed < 2 * DELAY
+    assert exchange.pair_details_dict == {'name': PAIR}
+    assert (exchange.ws_public, exchange.ws_private) == ('public', 'private')
+    phases = [name for name, _ in StartupProfile._phases]
+    assert phases[:2] == ['exchange.http_session', 'exchange.init']
+    assert sorted(phases[2:]) == ['exchange.pair_details', 'exchange.trading_settings', 'exchange.websockets']
+    assert all(seconds is not None for _, seconds in StartupProfile._phases)
+
+
+class FakeEngine:
+    def __init__(self, events):
+        self.events = events
+
+    def set_instrument(self, pair_details):
+        self.events.append(('set_instrument', pair_details))
+
+
+class FakePaperTrading:
+    def __init__(self):
+        self.events = []
+        self.engine = FakeEngine(self.events)
+
+    def attach_public_websocket(self, ws, orderbook_topic, trade_topic):
+        self.events.append(('attach', ws))
+
+    def create_private_websocket(self, topics, logger):
+        return 'paper private'
+
+
+def test_paper_trading_gets_the_instrument_before_the_market_data(slow_exchange, monkeypatch):
+    exchange = ExchangeBybit.__new__(ExchangeBybit)
+    exchange.pair = PAIR
+    exchange.paper_trading = FakePaperTrading()
+    exchange.recorder = exchange.replayer = None
+    exchange._private_topics = []
+    monkeypatch.setattr(ExchangeBybit, 'create_public_websocket', lambda self, logger: 'public')
+
+    # The pair details arrive after the websocket step started
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pair_details = executor.submit(exchange.get_pair_details)
+        exchange.connect_websockets(pair_details)
+    assert exchange.paper_trading.events == [('set_instrument', {'name': PAIR}), ('attach', 'public')]
+    assert exchange.ws_private == 'paper private'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_websocket_connect_returns_once_opened():
+    port = free_port()
+    server = LocalBybitServer(pair=PAIR, port=port, history_days=0.01, book_rate=0, trade_rate=0, candle_rate=0,
+                              stats_secs=0, seed=1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+
+    start = time.time()
+    ws = WebSocket(f'ws://127.0.0.1:{port}/realtime_public', subscriptions=[f'orderBookL2_25.{PAIR}'],
+                   logger=logging.getLogger('test'))
+    # The socket used to be polled every 2 seconds
+    assert time.time() - start < 1
+    assert ws.opened.is_set()
+    ws.exit()
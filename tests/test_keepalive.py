@@ -0,0 +1,125 @@
+import collections
+import logging
+import threading
+import time
+
+import pytest
+import requests
+
+from Orders import Order
+from enums.BybitEnums import OrderSide, OrderType
+from exchange.ExchangeBybit import ExchangeBybit
+from pybit import HTTP, keepalive as keepalive_module
+from pybit.endpoints import EndpointSelector
+from pybit.keepalive import ConnectionKeeper
+from test_order_recovery import ORDER, FakeSession, create_http, place_order
+
+PRIMARY = 'https://api.bybit.com'
+SECONDARY = 'https://api.bytick.com'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeTimeSession:
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.urls = []
+
+    def get(self, url, timeout):
+        self.urls.append(url)
+        if url.startswith(self.failing):
+            raise requests.exceptions.ConnectionError(url)
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(keepalive_module.time, 'monotonic', fake_clock.monotonic)
+    return fake_clock
+
+
+def create_keeper(fake_clock, selector=None, failing=()):
+    http = HTTP(PRIMARY, endpoint_selector=selector, logger=logging.getLogger('test'))
+    http.client = FakeTimeSession(failing)
+    http.last_request_at = fake_clock.now
+    return ConnectionKeeper(http, interval_secs=15, logger=logging.getLogger('test'))
+
+
+def test_idle_connection_is_kept_warm(fake_clock):
+    keeper = create_keeper(fake_clock)
+    fake_clock.now += 10
+    keeper.keep_warm()
+    assert keeper.http.client.urls == []
+
+    fake_clock.now += 5
+    keeper.keep_warm()
+    assert keeper.http.client.urls == [f'{PRIMARY}/v2/public/time']
+    # The keep warm request counts as activity
+    assert keeper.http.last_request_at == fake_clock.now
+    keeper.keep_warm()
+    assert keeper.nb_requests == 1
+
+
+def test_all_the_endpoints_of_the_selector_are_kept_warm(fake_clock):
+    selector = EndpointSelector(None, [PRIMARY, SECONDARY])
+    keeper = create_keeper(fake_clock, selector, failing=PRIMARY)
+    fake_clock.now += 15
+    keeper.keep_warm()
+    assert keeper.http.client.urls == [f'{PRIMARY}/v2/public/time', f'{SECONDARY}/v2/public/time']
+    assert keeper.nb_requests == 1
+
+
+def test_send_time_is_per_thread():
+    placed = {'ret_code': 0, 'ret_msg': 'OK', 'result': ORDER}
+    session = FakeSession(create=[placed, placed], search=[])
+    http = create_http(session)
+    # Order sent by another thread
+    thread = threading.Thread(target=place_order, args=(http,))
+    thread.start()
+    thread.join()
+    assert http.get_sent_at() is None
+
+    place_order(http)
+    assert session.sent_at['create'][0] < http.get_sent_at() <= session.sent_at['create'][1]
+
+
+class FakeOrderSession:
+    def __init__(self, sent_at):
+        self.sent_at = sent_at
+
+    def place_active_order(self, **params):
+        return {'ret_code': 0, 'result': {'order_link_id': params['order_link_id']}}
+
+    def get_sent_at(self):
+        return self.sent_at
+
+
+def create_exchange(sent_at):
+    exchange = ExchangeBybit.__new__(ExchangeBybit)
+    exchange._logger = logging.getLogger('test')
+    exchange.paper_trading = None
+    exchange.session_auth = FakeOrderSession(sent_at)
+    exchange.signal_to_wire = collections.deque(maxlen=100)
+    return exchange
+
+
+def entry_order(signal_time):
+    order = Order(order_link_id='L1.1', side=OrderSide.Buy, symbol='BTCUSDT', order_type=OrderType.Limit,
+                  qty=0.01, price=40000.0)
+    order.signal_time = signal_time
+    return order
+
+
+def test_signal_to_wire_of_the_entry_orders():
+    now = time.perf_counter()
+    exchange = create_exchange(sent_at=now)
+    exchange.place_order(entry_order(now - 0.0125))
+    # Not an entry order
+    exchange.place_order(entry_order(None))
+    assert list(exchange.signal_to_wire) == pytest.approx([12.5])
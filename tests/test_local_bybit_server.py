@@ -0,0 +1,71 @@
+import threading
+
+from exchange.LocalBybitServer import LocalBybitServer
+
+PAIR = 'BTCUSDT'
+
+
+class FakeClient:
+    """ Private websocket client, records the messages instead of sending them """
+
+    def __init__(self):
+        self.private = True
+        self.topics = {'order', 'execution', 'position', 'wallet'}
+        self.messages = []
+
+    def send(self, text):
+        self.messages.append(text)
+
+
+def create_server(seed=1):
+    return LocalBybitServer(pair=PAIR, history_days=0.01, book_rate=2000, trade_rate=2000, candle_rate=0,
+                            stats_secs=0, seed=seed)
+
+
+def place_and_cancel(server, nb_orders, results):
+    for i in range(nb_orders):
+        # Close to the best bid so that some orders are filled by the market
+        with server._lock:
+            price = server.market.price_str(server.market.bid - i % 3)
+        response = server.handle_rest('/private/linear/order/create', {
+            'symbol': PAIR, 'side': 'Buy', 'order_type': 'Limit', 'qty': 0.001, 'price': price,
+            'time_in_force': 'PostOnly', 'reduce_only': False, 'close_on_trigger': False})
+        results.append(response['ret_code'])
+        if response['ret_code'] == 0:
+            response = server.handle_rest('/private/linear/order/cancel', {
+                'symbol': PAIR, 'order_id': response['result']['order_id']})
+            results.append(response['ret_code'])
+
+
+def test_rest_and_market_threads_do_not_deadlock():
+    server = create_server()
+    client = FakeClient()
+    server._clients.append(client)
+    market = threading.Thread(target=server._run_market, daemon=True)
+    market.start()
+
+    results = []
+    threads = [threading.Thread(target=place_and_cancel, args=(server, 50, results), daemon=True)
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    server._stop.set()
+    market.join(5)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert not market.is_alive()
+    # Every order was placed, cancelled unless already filled (20001)
+    assert results.count(0) >= 200
+    assert set(results) <= {0, 20001}
+    assert client.messages
+
+
+def test_seed_gives_the_same_market():
+    first, second = create_server(seed=7), create_server(seed=7)
+    assert first.market.candles == second.market.candles
+    # Latency jitter drawn by the request threads does not change the market
+    first.rng.uniform(0, 1)
+    assert [first.market.trade(0)[0]['price'] for _ in range(20)] \
+        == [second.market.trade(0)[0]['price'] for _ in range(20)]
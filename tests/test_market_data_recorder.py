@@ -0,0 +1,89 @@
+import json
+
+from exchange.MarketDataRecorder import MarketDataRecorder, MarketDataReader
+from exchange.MarketDataReplayer import MarketDataReplayer
+
+TRADE = 'trade.BTCUSDT'
+BOOK = 'orderBookL2_25.BTCUSDT'
+
+
+def message(topic, i):
+    return json.dumps({'topic': topic, 'data': [{'i': i}]})
+
+
+def record(file_name, nb_chunks, per_chunk=4):
+    """ Chunks of per_chunk records, one second apart, alternating the trade and book topics """
+    recorder = MarketDataRecorder(file_name, flush_secs=3600)
+    for i in range(nb_chunks * per_chunk):
+        topic = TRADE if i % 2 == 0 else BOOK
+        recorder.record('public', topic, message(topic, i), timestamp=1000.0 + i)
+        if i % per_chunk == per_chunk - 1:
+            recorder.flush()
+    recorder.close()
+    return recorder
+
+
+def test_round_trip_in_recording_order(tmp_path):
+    file_name = str(tmp_path / 'BTCUSDT.mdl')
+    recorder = record(file_name, nb_chunks=3)
+    assert recorder.nb_chunks == 3
+    reader = MarketDataReader(file_name)
+    assert reader.time_range() == (1000.0, 1011.0)
+    assert reader.nb_records() == 12
+    records = list(reader.read())
+    assert [r[0] for r in records] == [1000.0 + i for i in range(12)]
+    assert records[1] == (1001.0, 'public', BOOK, message(BOOK, 1))
+
+
+def test_read_seeks_and_filters(tmp_path):
+    file_name = str(tmp_path / 'BTCUSDT.mdl')
+    record(file_name, nb_chunks=3)
+    reader = MarketDataReader(file_name)
+    assert [r[0] for r in reader.read(start=1005.0, end=1009.0)] == [1005.0, 1006.0, 1007.0, 1008.0, 1009.0]
+    assert [r[0] for r in reader.read(start=1005.0, topics={TRADE})] == [1006.0, 1008.0, 1010.0]
+    assert list(reader.read(sources={'private'})) == []
+
+
+def test_chunks_missing_from_the_index_are_recovered(tmp_path):
+    file_name = str(tmp_path / 'BTCUSDT.mdl')
+    record(file_name, nb_chunks=3)
+    # Crash after writing the last chunk, before its index line
+    with open(file_name + '.idx') as f:
+        lines = f.readlines()
+    with open(file_name + '.idx', 'w') as f:
+        f.writelines(lines[:1])
+    # And a truncated chunk at the end of the log
+    with open(file_name, 'ab') as f:
+        f.write(b'MDL1\x00\x01')
+    reader = MarketDataReader(file_name)
+    assert len(reader.chunks) == 3
+    assert reader.nb_records() == 12
+
+
+def test_newlines_do_not_split_a_record(tmp_path):
+    file_name = str(tmp_path / 'BTCUSDT.mdl')
+    recorder = MarketDataRecorder(file_name, flush_secs=3600)
+    recorder.record('private', 'order', '{"topic": "order",\n "data": []}', timestamp=1000.0)
+    recorder.close()
+    assert list(MarketDataReader(file_name).read()) == [(1000.0, 'private', 'order', '{"topic": "order",  "data": []}')]
+
+
+class FakeWebSocket:
+    def __init__(self, subscriptions):
+        self.subscriptions = subscriptions
+        self.messages = []
+
+    def _on_message(self, message):
+        self.messages.append(json.loads(message)['data'][0]['i'])
+
+
+def test_replay_delivers_the_subscribed_topics_in_order(tmp_path):
+    file_name = str(tmp_path / 'BTCUSDT.mdl')
+    record(file_name, nb_chunks=2)
+    replayer = MarketDataReplayer(file_name, speed=0, start=1002.0)
+    ws = replayer._sockets['public'] = FakeWebSocket([TRADE])
+    replayer.start()
+    assert replayer.wait(5)
+    assert ws.messages == [2, 4, 6]
+    assert replayer.nb_messages == 3
+    assert replayer.current_ts == 1006.0
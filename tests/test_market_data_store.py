@@ -0,0 +1,113 @@
+import datetime as dt
+
+import pytest
+import sqlalchemy as sa
+
+from database.MarketDataStore import MarketDataStore
+
+START = int(dt.datetime(2022, 4, 30, 23, 58).timestamp())
+
+
+def candle(i, confirm=True):
+    start = START + i * 60
+    return {'start': start, 'end': start + 60, 'open': '40000', 'high': '40100', 'low': '39900',
+            'close': '40050', 'volume': '12.5', 'turnover': '500000', 'confirm': confirm,
+            'timestamp': (start + 60) * 1000000}
+
+
+def book(bid, ask, timestamp_e6=1651363200000000):
+    return {'order_book': [{'side': 'Buy', 'price': str(bid - 0.5), 'size': 3},
+                           {'side': 'Buy', 'price': str(bid), 'size': 1},
+                           {'side': 'Sell', 'price': str(ask), 'size': 2},
+                           {'side': 'Sell', 'price': str(ask + 0.5), 'size': 4}],
+            'timestamp_e6': timestamp_e6}
+
+
+@pytest.fixture
+def store(database):
+    store = MarketDataStore(database, top_of_book=True, flush_secs=3600)
+    yield store
+    store.close()
+
+
+def select(db, table_name):
+    table = db.get_table(table_name)
+    with db.engine.connect() as connection:
+        return [dict(r) for r in connection.execute(sa.select([table]))]
+
+
+def test_confirmed_candles_are_saved_once(database, store):
+    store.add_candles('candle.1.BTCUSDT', [candle(0), candle(1), candle(2, confirm=False)])
+    store.flush()
+    # Candle 1 received again after a websocket reconnection, candle 2 now confirmed
+    store.add_candles('candle.1.BTCUSDT', [candle(1), candle(2)])
+    store.flush()
+
+    rows = select(database, store.CANDLES_TBL_NAME)
+    assert sorted(r['start'] for r in rows) == [dt.datetime.fromtimestamp(START + i * 60) for i in range(3)]
+    assert {(r['pair'], r['interval']) for r in rows} == {('BTCUSDT', '1m')}
+    assert store.nb_candles == 4
+
+
+def test_top_of_book_is_saved_when_it_changes(database, store):
+    store.add_top_of_book('BTCUSDT', book(40000, 40000.5))
+    store.add_top_of_book('BTCUSDT', book(40000, 40000.5))
+    store.add_top_of_book('BTCUSDT', book(40000.5, 40001))
+    store.add_top_of_book('BTCUSDT', {'order_book': []})
+    store.flush()
+
+    rows = select(database, store.TOP_OF_BOOK_TBL_NAME)
+    assert [(r['bid_price'], r['bid_size'], r['ask_price'], r['ask_size']) for r in rows] == [
+        (40000.0, 1.0, 40000.5, 2.0), (40000.5, 1.0, 40001.0, 2.0)]
+
+
+def test_partitions_are_created_once_per_period(database, store, monkeypatch):
+    created = []
+    monkeypatch.setattr(database.backend, 'create_partition',
+                        lambda connection, table_name, partition_name, start, end:
+                        created.append((partition_name, start, end)))
+    # Candles of April and May
+    store.add_candles('candle.1.BTCUSDT', [candle(0), candle(1), candle(2)])
+    store.add_top_of_book('BTCUSDT', book(40000, 40000.5))
+    store.flush()
+    store.add_candles('candle.1.BTCUSDT', [candle(3)])
+    store.flush()
+
+    assert created == [('Candles_202204', dt.date(2022, 4, 1), dt.date(2022, 5, 1)),
+                       ('Candles_202205', dt.date(2022, 5, 1), dt.date(2022, 6, 1)),
+                       (f'TopOfBook_{dt.datetime.fromtimestamp(1651363200):%Y%m%d}',
+                        dt.datetime.fromtimestamp(1651363200).date(),
+                        dt.datetime.fromtimestamp(1651363200).date() + dt.timedelta(days=1))]
+
+
+def test_rows_are_kept_while_the_database_is_unreachable(database, store, monkeypatch):
+    store.add_candles('candle.1.BTCUSDT', [candle(0)])
+
+    def unreachable():
+        raise sa.exc.OperationalError('BEGIN', {}, Exception('could not connect to server'))
+    with monkeypatch.context() as m:
+        m.setattr(database.engine, 'begin', unreachable)
+        store.flush()
+    assert store.nb_candles == 0
+
+    store.add_candles('candle.1.BTCUSDT', [candle(1)])
+    store.flush()
+    assert store.nb_candles == 2
+    assert len(select(database, store.CANDLES_TBL_NAME)) == 2
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.data = {'orderBookL2_25.BTCUSDT': book(40000, 40000.5)}
+
+
+def test_listener_dispatches_the_public_topics(database, store):
+    listener = store.listener(FakeWebSocket())
+    listener('', {'topic': 'candle.5.BTCUSDT', 'data': [candle(0)]})
+    listener('', {'topic': 'orderBookL2_25.BTCUSDT', 'data': {}})
+    listener('', {'topic': 'trade.BTCUSDT', 'data': []})
+    listener('', {'success': True})
+    # Written by close()
+    store.close()
+    assert [r['interval'] for r in select(database, store.CANDLES_TBL_NAME)] == ['5m']
+    assert len(select(database, store.TOP_OF_BOOK_TBL_NAME)) == 1
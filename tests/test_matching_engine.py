@@ -0,0 +1,137 @@
+from enums.BybitEnums import OrderSide, OrderType, OrderStatus, TimeInForce
+from exchange.MatchingEngine import MatchingEngine
+
+PAIR = 'BTCUSDT'
+
+
+def create_engine():
+    events = []
+    engine = MatchingEngine(PAIR, 10000, listener=lambda topic, data: events.append((topic, data)),
+                            clock=lambda: 1650000000.0)
+    engine.update_book(book(bids={100.0: 5, 99.5: 8}, asks={100.5: 4, 101.0: 6}))
+    return engine, events
+
+
+def book(bids, asks):
+    return [{'price': str(p), 'side': OrderSide.Buy, 'size': s} for p, s in bids.items()] \
+        + [{'price': str(p), 'side': OrderSide.Sell, 'size': s} for p, s in asks.items()]
+
+
+def place_buy(engine, qty, price, time_in_force=TimeInForce.PostOnly):
+    return engine.place_order(PAIR, OrderSide.Buy, OrderType.Limit, qty, price=price,
+                              time_in_force=time_in_force)['order_id']
+
+
+def test_joins_the_back_of_the_queue():
+    engine, _ = create_engine()
+    order_id = place_buy(engine, 1, 100.0)
+    assert engine.orders[order_id]['order_status'] == OrderStatus.New
+    assert engine.queue_position(order_id) == 5
+
+
+def test_trades_at_our_level_advance_the_queue():
+    engine, events = create_engine()
+    order_id = place_buy(engine, 1, 100.0)
+    engine.on_trade(100.0, 3, OrderSide.Sell)
+    assert engine.queue_position(order_id) == 2
+    # Trades at another level, or buys at our level, do not move the queue
+    engine.on_trade(100.5, 2, OrderSide.Buy)
+    engine.on_trade(100.0, 2, OrderSide.Buy)
+    assert engine.queue_position(order_id) == 2
+    assert engine.orders[order_id]['cum_exec_qty'] == 0
+    assert not [e for e in events if e[0] == 'execution']
+
+
+def test_cancels_at_our_level_advance_the_queue_proportionally():
+    engine, _ = create_engine()
+    order_id = place_buy(engine, 1, 100.0)
+    # 1 of the 5 ahead left the level without trading
+    engine.update_book(book(bids={100.0: 5, 99.5: 8}, asks={100.5: 4, 101.0: 6}))
+    engine.update_book(book(bids={100.0: 4, 99.5: 8}, asks={100.5: 4, 101.0: 6}))
+    assert engine.queue_position(order_id) == 4
+
+
+def test_partial_then_full_fill_once_the_queue_is_consumed():
+    engine, events = create_engine()
+    order_id = place_buy(engine, 2, 100.0)
+    engine.on_trade(100.0, 6, OrderSide.Sell)
+    order = engine.orders[order_id]
+    assert order['order_status'] == OrderStatus.PartiallyFilled
+    assert order['cum_exec_qty'] == 1
+    assert order['leaves_qty'] == 1
+    assert engine.queue_position(order_id) == 0
+
+    engine.on_trade(100.0, 3, OrderSide.Sell)
+    assert order['order_status'] == OrderStatus.Filled
+    assert order['leaves_qty'] == 0
+    assert engine.queue_position(order_id) is None
+    executions = [data[0] for topic, data in events if topic == 'execution']
+    assert [e['exec_qty'] for e in executions] == [1, 1]
+    assert all(e['is_maker'] for e in executions)
+    assert engine.positions[OrderSide.Buy]['size'] == 2
+
+
+def test_trade_through_our_price_fills_the_rest():
+    engine, _ = create_engine()
+    order_id = place_buy(engine, 2, 100.0)
+    engine.on_trade(99.5, 1, OrderSide.Sell)
+    assert engine.orders[order_id]['order_status'] == OrderStatus.Filled
+    assert engine.orders[order_id]['last_exec_price'] == 100.0
+
+
+def test_post_only_taking_liquidity_is_cancelled():
+    engine, _ = create_engine()
+    order_id = place_buy(engine, 1, 100.5)
+    order = engine.orders[order_id]
+    assert order['order_status'] == OrderStatus.Cancelled
+    assert order['cancel_type'] == 'EC_PostOnlyWillTakeLiquidity'
+    assert engine.queue_position(order_id) is None
+    assert not engine.executions
+
+
+def test_post_only_amended_through_the_book_is_cancelled():
+    engine, _ = create_engine()
+    order_id = place_buy(engine, 1, 100.0)
+    engine.replace_order(PAIR, order_id=order_id, p_r_price=101.0)
+    assert engine.orders[order_id]['order_status'] == OrderStatus.Cancelled
+    assert engine.orders[order_id]['cancel_type'] == 'EC_PostOnlyWillTakeLiquidity'
+
+
+def test_cancel_and_place_again_loses_the_queue_priority():
+    engine, _ = create_engine()
+    order_id = place_buy(engine, 1, 100.0)
+    engine.on_trade(100.0, 4, OrderSide.Sell)
+    assert engine.queue_position(order_id) == 1
+    # Other orders joined the level behind us
+    engine.update_book(book(bids={100.0: 7, 99.5: 8}, asks={100.5: 4, 101.0: 6}))
+
+    engine.cancel_order(PAIR, order_id=order_id)
+    assert engine.orders[order_id]['order_status'] == OrderStatus.Cancelled
+    assert engine.queue_position(order_id) is None
+    new_order_id = place_buy(engine, 1, 100.0)
+    assert engine.queue_position(new_order_id) == 7
+
+
+def test_amend_price_loses_the_queue_priority():
+    engine, _ = create_engine()
+    order_id = place_buy(engine, 1, 100.0)
+    engine.on_trade(100.0, 4, OrderSide.Sell)
+    engine.update_book(book(bids={100.0: 7, 99.5: 8}, asks={100.5: 4, 101.0: 6}))
+    assert engine.queue_position(order_id) == 1
+
+    engine.replace_order(PAIR, order_id=order_id, p_r_price=99.5)
+    assert engine.queue_position(order_id) == 8
+    engine.replace_order(PAIR, order_id=order_id, p_r_price=100.0)
+    assert engine.queue_position(order_id) == 7
+
+
+def test_amend_qty_only_loses_the_queue_priority_when_increased():
+    engine, _ = create_engine()
+    order_id = place_buy(engine, 2, 100.0)
+    engine.on_trade(100.0, 4, OrderSide.Sell)
+    engine.update_book(book(bids={100.0: 7, 99.5: 8}, asks={100.5: 4, 101.0: 6}))
+
+    engine.replace_order(PAIR, order_id=order_id, p_r_qty=1)
+    assert engine.queue_position(order_id) == 1
+    engine.replace_order(PAIR, order_id=order_id, p_r_qty=3)
+    assert engine.queue_position(order_id) == 7
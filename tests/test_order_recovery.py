@@ -0,0 +1,100 @@
+import json
+import logging
+import time
+
+import pytest
+import requests
+
+import pybit
+from pybit.exceptions import FailedRequestError
+from telegram_.TelegramBot import TelegramBot
+
+ENDPOINT = 'https://api.bybit.com'
+CREATE = ENDPOINT + '/private/linear/order/create'
+ORDER = {'order_id': 'f1e2d3', 'order_link_id': 'L1650000000.1', 'symbol': 'BTCUSDT', 'order_status': 'New'}
+NOT_FOUND = {'ret_code': 130010, 'ret_msg': 'order not exists or Too late to operate'}
+
+
+@pytest.fixture(autouse=True)
+def no_telegram(monkeypatch):
+    monkeypatch.setattr(TelegramBot, 'send_to_group', classmethod(lambda cls, msg, *args, **kwargs: None))
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    """ Scripted responses per endpoint (create, search), an exception in the script is raised """
+
+    def __init__(self, create, search):
+        self.headers = {}
+        self.script = {'create': list(create), 'search': list(search)}
+        self.sent = {'create': [], 'search': []}
+        self.sent_at = {'create': [], 'search': []}
+
+    def prepare_request(self, request):
+        return request
+
+    def send(self, request, timeout):
+        name = request.url.split('?')[0].rsplit('/', 1)[1]
+        self.sent[name].append(request)
+        self.sent_at[name].append(time.perf_counter())
+        response = self.script[name].pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return FakeResponse(response)
+
+
+def create_http(session):
+    http = pybit.HTTP(endpoint=ENDPOINT, api_key='key', api_secret='secret', logger=logging.getLogger('test'),
+                      force_retry=True, max_retries=3, retry_delay=0, order_timeout=0.5)
+    http.client = session
+    return http
+
+
+def place_order(http):
+    return http._submit_request('POST', CREATE, {'symbol': 'BTCUSDT', 'side': 'Buy', 'qty': 0.01,
+                                                 'order_link_id': 'L1650000000.1'}, auth=True)
+
+
+def test_order_found_after_timeout_is_not_sent_again():
+    session = FakeSession(create=[requests.exceptions.ReadTimeout('timeout')],
+                          search=[{'ret_code': 0, 'ret_msg': 'OK', 'result': ORDER}])
+    result = place_order(create_http(session))
+    assert result['result'] == ORDER
+    assert len(session.sent['create']) == 1
+    assert len(session.sent['search']) == 1
+
+
+def test_order_not_found_after_timeout_is_sent_once_more():
+    session = FakeSession(create=[requests.exceptions.ReadTimeout('timeout'),
+                                  {'ret_code': 0, 'ret_msg': 'OK', 'result': ORDER}],
+                          search=[NOT_FOUND])
+    result = place_order(create_http(session))
+    assert result['result'] == ORDER
+    assert len(session.sent['create']) == 2
+    # Sent again with the same order_link_id, the exchange rejects a duplicate
+    link_ids = [json.loads(r.data)['order_link_id'] for r in session.sent['create']]
+    assert link_ids == ['L1650000000.1', 'L1650000000.1']
+
+
+def test_failed_lookup_does_not_send_again():
+    session = FakeSession(create=[requests.exceptions.ReadTimeout('timeout')],
+                          search=[requests.exceptions.ReadTimeout('timeout')] * 3)
+    with pytest.raises(FailedRequestError):
+        place_order(create_http(session))
+    assert len(session.sent['create']) == 1
+
+
+def test_lookup_keeps_the_send_time_of_the_order():
+    session = FakeSession(create=[requests.exceptions.ReadTimeout('timeout')],
+                          search=[{'ret_code': 0, 'ret_msg': 'OK', 'result': ORDER}])
+    http = create_http(session)
+    place_order(http)
+    # Signal to wire is measured from the order request, not from the lookup
+    assert http.get_sent_at() <= session.sent_at['create'][0]
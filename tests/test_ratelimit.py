@@ -0,0 +1,139 @@
+import pytest
+
+from pybit import ratelimit
+from pybit.ratelimit import RateLimiter, TokenBucket, PRIORITY_ORDER, PRIORITY_DEFAULT, PRIORITY_BACKGROUND
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.epoch = 1650000000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.epoch + self.now - 1000.0
+
+
+class FakeCondition:
+    """ Waiting advances the fake clock by the whole timeout """
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def wait(self, timeout):
+        self.clock.now += timeout
+
+    def notify_all(self):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(ratelimit.time, 'time', clock.time)
+    return clock
+
+
+def create_bucket(clock, limit=10, period_secs=1, reserve_ratio=0.2):
+    bucket = TokenBucket(limit, period_secs, reserve_ratio)
+    bucket._condition = FakeCondition(clock)
+    return bucket
+
+
+def drain(bucket):
+    while bucket.try_acquire(PRIORITY_ORDER):
+        pass
+
+
+def test_refill_over_time(clock):
+    bucket = create_bucket(clock)
+    drain(bucket)
+    assert bucket.tokens == 0
+    assert not bucket.try_acquire(PRIORITY_DEFAULT)
+
+    # limit / period_secs tokens per second
+    clock.now += 0.35
+    bucket._refill(clock.now)
+    assert bucket.tokens == pytest.approx(3.5)
+    for _ in range(3):
+        assert bucket.try_acquire(PRIORITY_DEFAULT)
+    assert not bucket.try_acquire(PRIORITY_DEFAULT)
+    # Never more than the limit
+    clock.now += 60
+    bucket._refill(clock.now)
+    assert bucket.tokens == 10
+
+
+def test_acquire_waits_for_the_next_token(clock):
+    bucket = create_bucket(clock)
+    drain(bucket)
+    waited = bucket.acquire(PRIORITY_DEFAULT)
+    assert waited == pytest.approx(0.1, abs=0.01)
+    assert clock.now == pytest.approx(1000.1, abs=0.01)
+
+
+def test_background_requests_leave_the_reserve(clock):
+    bucket = create_bucket(clock, reserve_ratio=0.2)
+    for _ in range(7):
+        assert bucket.try_acquire(PRIORITY_BACKGROUND)
+    # 3 tokens left: 1 + the reserve of 2 are needed by a background request
+    assert bucket.try_acquire(PRIORITY_BACKGROUND)
+    assert not bucket.try_acquire(PRIORITY_BACKGROUND)
+    assert bucket.try_acquire(PRIORITY_DEFAULT)
+    assert bucket.try_acquire(PRIORITY_ORDER)
+    assert bucket.tokens == 0
+
+    # A background request waits until the reserve is refilled
+    waited = bucket.acquire(PRIORITY_BACKGROUND)
+    assert waited == pytest.approx(0.3, abs=0.01)
+
+
+def test_no_token_until_the_reset_time(clock):
+    bucket = create_bucket(clock)
+    reset_ms = (clock.time() + 5) * 1000
+    bucket.update(10, 0, reset_ms)
+    assert bucket.tokens == 0
+    clock.now += 4
+    assert not bucket.try_acquire(PRIORITY_ORDER)
+
+    # Tokens refill from the reset time
+    waited = bucket.acquire(PRIORITY_ORDER)
+    assert waited == pytest.approx(1.1, abs=0.01)
+    assert clock.now == pytest.approx(1005.1, abs=0.01)
+
+
+def test_update_follows_the_limit_of_the_response(clock):
+    bucket = create_bucket(clock, limit=100, period_secs=60)
+    bucket.update(50, 20, None)
+    assert bucket.limit == 50
+    assert bucket.tokens == 20
+    # Remaining above our count does not add tokens
+    bucket.update(50, 40, None)
+    assert bucket.tokens == 20
+
+
+def test_rate_limiter_groups(clock):
+    limiter = RateLimiter(reserve_ratio=0.2)
+    order, order_priority = limiter._get_bucket('/private/linear/order/create')
+    cancel, cancel_priority = limiter._get_bucket('/private/linear/order/cancel')
+    history, history_priority = limiter._get_bucket('/private/linear/trade/execution/list')
+    assert order is cancel
+    assert order_priority == cancel_priority == PRIORITY_ORDER
+    assert history is not order
+    assert history_priority == PRIORITY_BACKGROUND
+    assert order.limit == 100
+
+    limiter.update('https://api.bybit.com/private/linear/order/create',
+                   {'rate_limit': 100, 'rate_limit_status': 0,
+                    'rate_limit_reset_ms': (clock.time() + 1) * 1000})
+    assert not limiter.try_acquire('https://api.bybit.com/private/linear/order/cancel')
+    assert limiter.try_acquire('https://api.bybit.com/private/linear/trade/execution/list')
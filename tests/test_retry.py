@@ -0,0 +1,142 @@
+import logging
+
+import pytest
+
+import pybit
+from pybit import retry
+from pybit.retry import RetryPolicy, EndpointPolicy, CircuitBreaker, AMEND_CANCEL
+from pybit.ratelimit import PRIORITY_ORDER, PRIORITY_BACKGROUND
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.now += secs
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(retry.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(pybit.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(pybit.time, 'sleep', clock.sleep)
+    return clock
+
+
+def test_backoff_full_jitter_bounds():
+    policy = EndpointPolicy(deadline_secs=10, base_delay=0.1, max_delay=1, retry_unknown_status=True)
+    for attempt in range(8):
+        cap = min(1, 0.1 * 2 ** attempt)
+        delays = [policy.get_backoff(attempt) for _ in range(200)]
+        assert all(0 <= d <= cap for d in delays)
+    # Capped by max_delay
+    assert max(policy.get_backoff(20) for _ in range(200)) <= 1
+
+
+def test_policy_per_endpoint():
+    policies = RetryPolicy()
+    create, order_breaker = policies.get('/private/linear/order/create')
+    cancel, cancel_breaker = policies.get('/private/linear/order/cancel')
+    replace, _ = policies.get('/private/linear/order/replace')
+    history, _ = policies.get('/private/linear/trade/execution/list')
+    assert create is RetryPolicy.POLICIES[PRIORITY_ORDER]
+    assert not create.retry_unknown_status
+    # Amends and cancels have their own, longer, policy
+    assert cancel is replace is RetryPolicy.POLICIES[AMEND_CANCEL]
+    assert cancel.deadline_secs > create.deadline_secs
+    assert history is RetryPolicy.POLICIES[PRIORITY_BACKGROUND]
+    # Same group, same breaker
+    assert cancel_breaker is order_breaker
+
+
+def create_http(policy):
+    http = pybit.HTTP(endpoint='https://api.bybit.com', api_key='key', api_secret='secret',
+                      logger=logging.getLogger('test'), retry_policy=RetryPolicy())
+    return http, {'policy': policy, 'breaker': CircuitBreaker('test', 100, 10),
+                  'deadline': retry.time.monotonic() + policy.deadline_secs, 'attempt': 0, 'error': None}
+
+
+def test_wait_before_retry_within_deadline(clock):
+    policy = EndpointPolicy(deadline_secs=10, base_delay=0.5, max_delay=2, retry_unknown_status=True)
+    http, state = create_http(policy)
+    http._wait_before_retry('request', state)
+    assert state['attempt'] == 1
+    assert state['error'] is None
+    assert 1000 <= clock.now <= 1000.5
+
+
+def test_wait_before_retry_deadline_exceeded(clock):
+    policy = EndpointPolicy(deadline_secs=3, base_delay=0.1, max_delay=0.5, retry_unknown_status=False)
+    http, state = create_http(policy)
+    # The rate limit reset is after the deadline: no wait, the error is raised by _submit_request
+    http._wait_before_retry('request', state, min_delay=5)
+    assert clock.now == 1000
+    assert isinstance(state['error'], pybit.exceptions.FailedRequestError)
+    assert state['error'].status_code == 408
+
+
+def test_circuit_breaker_transitions(clock):
+    breaker = CircuitBreaker('order', failure_threshold=3, cooldown_secs=10)
+    assert not breaker.record_failure()
+    assert not breaker.record_failure()
+    assert breaker.allow()
+    # Opens at the threshold
+    assert breaker.record_failure()
+    assert not breaker.allow()
+
+    # Half open after the cooldown: a single trial request
+    clock.now += 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    # The trial fails: open again for a new cooldown
+    assert breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now += 10
+    assert breaker.allow()
+    # The trial succeeds: closed
+    breaker.record_success()
+    assert breaker.allow()
+    assert breaker.allow()
+    assert not breaker.record_failure()
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    """ Returns the scripted responses in order """
+
+    def __init__(self, responses):
+        self.headers = {}
+        self.responses = list(responses)
+        self.sent = []
+
+    def prepare_request(self, request):
+        return request
+
+    def send(self, request, timeout):
+        self.sent.append(request)
+        return FakeResponse(self.responses.pop(0))
+
+
+def test_ip_rate_limit_is_retried(clock):
+    http = pybit.HTTP(endpoint='https://api.bybit.com', api_key='key', api_secret='secret',
+                      logger=logging.getLogger('test'), retry_policy=RetryPolicy())
+    http.client = FakeSession([
+        {'ret_code': 10018, 'ret_msg': 'exceed ip rate limit', 'rate_limit_reset_ms': 0},
+        {'ret_code': 0, 'ret_msg': 'OK', 'result': {'position': 1}}
+    ])
+    result = http._submit_request('GET', 'https://api.bybit.com/private/linear/position/list', {}, auth=True)
+    assert result['result'] == {'position': 1}
+    assert len(http.client.sent) == 2
@@ -0,0 +1,94 @@
+import logging
+
+import pytest
+
+from pybit import HTTP, clock as clock_module
+from pybit.clock import ServerClock
+
+# The server clock is ahead of the local clock
+OFFSET = 1.5
+
+
+class FakeClock:
+    def __init__(self, now=1650000000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, server_time):
+        self.server_time = server_time
+
+    def json(self):
+        return {'ret_code': 0, 'time_now': f'{self.server_time:.6f}'}
+
+
+class FakeSession:
+    """ Requests of scripted (way out, way back) durations. The server time is read when the request arrives. """
+
+    def __init__(self, clock, trips, offset=OFFSET):
+        self.clock = clock
+        self.trips = list(trips)
+        self.offset = offset
+        self.urls = []
+
+    def get(self, url, timeout):
+        self.urls.append(url)
+        trip = self.trips.pop(0)
+        if trip is None:
+            raise ConnectionError('Connection reset by peer')
+        way_out, way_back = trip
+        self.clock.now += way_out
+        server_time = self.clock.now + self.offset
+        self.clock.now += way_back
+        return FakeResponse(server_time)
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(clock_module.time, 'time', fake_clock.time)
+    return fake_clock
+
+
+def test_offset_of_the_smallest_round_trip_is_kept(fake_clock):
+    # Asymmetric round trips: the error of the estimate is half the difference of the two ways
+    session = FakeSession(fake_clock, [(0.2, 0.1), (0.01, 0.03), None, (0.05, 0.05)])
+    server_clock = ServerClock(session, 'https://api.bybit.com', samples=4, logger=logging.getLogger('test'))
+    offset = server_clock.sync()
+
+    assert session.urls == ['https://api.bybit.com/v2/public/time'] * 4
+    assert offset == pytest.approx(OFFSET - 0.01)
+    assert server_clock.rtt == pytest.approx(0.04)
+    assert server_clock.now() == pytest.approx(fake_clock.now + OFFSET - 0.01)
+
+
+def test_failed_sync_keeps_the_offset(fake_clock):
+    server_clock = ServerClock(FakeSession(fake_clock, [(0.01, 0.01), None, None]), 'https://api.bybit.com',
+                               samples=1)
+    assert server_clock.sync() == pytest.approx(OFFSET)
+    assert server_clock.sync(samples=2) is None
+    assert server_clock.offset == pytest.approx(OFFSET)
+    assert len(server_clock.history) == 1
+
+
+def test_drift_from_the_offset_history(fake_clock):
+    server_clock = ServerClock(None, 'https://api.bybit.com')
+    assert server_clock.get_drift() is None
+    # The local clock loses 10ms per hour
+    for hour in range(4):
+        server_clock.history.append((fake_clock.now + hour * 3600, OFFSET + hour * 0.01))
+    assert server_clock.get_drift() == pytest.approx(0.01)
+    assert server_clock.to_string() == 'Server clock offset: 0.0ms, rtt: n/a, drift: 10.00ms/h'
+
+
+def test_signed_requests_use_the_server_time(fake_clock):
+    server_clock = ServerClock(FakeSession(fake_clock, [(0.01, 0.01)]), 'https://api.bybit.com', samples=1)
+    server_clock.sync()
+    session = HTTP('https://api.bybit.com', api_key='key', api_secret='secret', clock=server_clock,
+                   logger=logging.getLogger('test'))
+    params = {}
+    session._auth('GET', params, recv_window=5000)
+    assert params['timestamp'] == pytest.approx((fake_clock.now + OFFSET) * 1000, abs=1)
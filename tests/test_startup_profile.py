@@ -0,0 +1,29 @@
+import threading
+
+from logging_.StartupProfile import StartupProfile
+
+
+def test_phases_are_reported_in_start_order(monkeypatch):
+    monkeypatch.setattr(StartupProfile, '_phases', [])
+    StartupProfile.add_phase('imports', 0.5)
+    first_started = threading.Event()
+    second_done = threading.Event()
+
+    def first():
+        with StartupProfile.phase('first'):
+            first_started.set()
+            second_done.wait(5)
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    first_started.wait(5)
+    with StartupProfile.phase('outer'):
+        with StartupProfile.phase('inner'):
+            pass
+    # Not finished yet: not reported
+    assert 'first' not in StartupProfile.to_string()
+    second_done.set()
+    thread.join(5)
+
+    assert [name for name, _ in StartupProfile._phases] == ['imports', 'first', 'outer', 'inner']
+    assert StartupProfile.to_string().split(': ')[1].startswith('imports 0.50s, first ')
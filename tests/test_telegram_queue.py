@@ -0,0 +1,92 @@
+import collections
+import threading
+
+import pytest
+
+from telegram_ import TelegramBot as telegram_module
+from telegram_.TelegramBot import TelegramBot
+
+LOW = TelegramBot.PRIORITY_LOW
+HIGH = TelegramBot.PRIORITY_HIGH
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    """ TelegramBot with a fresh queue, enabled without reading the config. Messages sent are in bot.sent. """
+    monkeypatch.setattr(telegram_module.api_keys, 'TELEGRAM_BOT_TOKEN', 'token', raising=False)
+    monkeypatch.setattr(telegram_module.api_keys, 'TELEGRAM_GRP_CHAT_ID', 'chat', raising=False)
+    for name, value in [('enabled', True), ('instance_name', 'bot1'), ('queue_size', 3), ('min_interval_secs', 0),
+                        ('_queue', collections.deque()), ('_condition', threading.Condition()),
+                        ('_sending', False), ('nb_dropped', 0), ('sent', [])]:
+        monkeypatch.setattr(TelegramBot, name, value, raising=False)
+    # No sending thread unless a test starts one
+    monkeypatch.setattr(TelegramBot, '_thread', object())
+    monkeypatch.setattr(TelegramBot, '_send', classmethod(lambda cls, msg: cls.sent.append(msg)))
+    return TelegramBot
+
+
+def queued(bot):
+    return [item[1] for item in bot._queue]
+
+
+def test_message_is_formatted_and_queued(bot):
+    bot.send_to_group('Order filled')
+    bot.send_to_group('Entry-1', fixed_width=False)
+    assert queued(bot) == ['`bot1: Order filled`', 'bot1: Entry\\-1']
+
+
+def test_nothing_is_queued_when_disabled(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'enabled', False)
+    bot.send_to_group('Order filled')
+    assert queued(bot) == []
+
+
+def test_oldest_low_priority_message_is_dropped_first(bot):
+    bot._enqueue(HIGH, 'h1')
+    bot._enqueue(LOW, 'l1')
+    bot._enqueue(LOW, 'l2')
+    bot._enqueue(HIGH, 'h2')
+    assert queued(bot) == ['h1', 'l2', 'h2']
+    # Only high priority messages left after l2: a new low priority message is dropped
+    bot._enqueue(HIGH, 'h3')
+    bot._enqueue(LOW, 'l3')
+    assert queued(bot) == ['h1', 'h2', 'h3']
+    # Queue full of high priority messages: the oldest one is dropped
+    bot._enqueue(HIGH, 'h4')
+    assert queued(bot) == ['h2', 'h3', 'h4']
+    assert bot.nb_dropped == 4
+
+
+def test_queued_messages_are_coalesced(bot, monkeypatch):
+    monkeypatch.setattr(bot, 'queue_size', 100)
+    monkeypatch.setattr(bot, 'nb_dropped', 2)
+    long_message = 'x' * (bot.MAX_MESSAGE_LENGTH - 2)
+    for msg in ['a', 'b', long_message]:
+        bot._enqueue(HIGH, msg)
+    assert bot._coalesce() == 'a\nb\n`2 messages dropped`'
+    assert bot.nb_dropped == 0
+    # The long message does not fit with a and b: sent alone
+    assert bot._coalesce() == long_message
+    assert queued(bot) == []
+
+
+def test_messages_queued_during_a_send_are_sent_together(bot, monkeypatch):
+    sending = threading.Event()
+    release = threading.Event()
+
+    def send(cls, msg):
+        cls.sent.append(msg)
+        sending.set()
+        release.wait(5)
+    monkeypatch.setattr(bot, '_send', classmethod(send))
+    monkeypatch.setattr(bot, '_thread', None)
+    monkeypatch.setattr(telegram_module.atexit, 'register', lambda func: None)
+
+    bot._enqueue(HIGH, 'first')
+    assert sending.wait(5)
+    for msg in ['second', 'third']:
+        # Does not wait for the send in progress
+        bot._enqueue(HIGH, msg)
+    release.set()
+    bot.flush(timeout=5)
+    assert bot.sent == ['first', 'second\nthird']
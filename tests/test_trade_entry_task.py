@@ -0,0 +1,122 @@
+import logging
+import threading
+
+import pandas as pd
+import pytest
+
+from Bot import Bot
+from enums.BybitEnums import OrderSide
+from enums.TradeSignals import TradeSignals
+from trade_entry.TradeEntryTask import TradeEntryTask
+
+
+class FakeTradeEntry:
+    """ Runs until aborted or released, like a maker entry waiting for its fills """
+
+    def __init__(self, side=OrderSide.Buy, error=None):
+        self.signal = {'Side': side, 'OrderLinkId': 'L1',
+                       'Signal': TradeSignals.EnterLong if side == OrderSide.Buy else TradeSignals.EnterShort}
+        self.error = error
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.abort_reason = None
+        self._abort_event = threading.Event()
+
+    def enter_trade(self):
+        self.started.set()
+        while not self._abort_event.is_set() and not self.release.is_set():
+            self._abort_event.wait(0.01)
+        if self.error:
+            raise self.error
+        return 0.01, 40000.0
+
+    def abort(self, reason):
+        self.abort_reason = reason
+        self._abort_event.set()
+
+    def abort_requested(self):
+        return self._abort_event.is_set()
+
+
+class FakeStrategy:
+    def __init__(self):
+        self.signals = []
+
+    def find_entry(self):
+        return pd.DataFrame({'close': [40000.0]}), self.signals.pop(0)
+
+
+class FakePosition:
+    def currently_in_position(self):
+        return False
+
+
+def signal(name):
+    return {'Signal': name, 'OrderLinkId': f'L-{name}'}
+
+
+def create_bot(trade_entry):
+    bot = Bot.__new__(Bot)
+    bot._logger = logging.getLogger('test')
+    bot._entry_task = None
+    bot.strategy = FakeStrategy()
+    bot._position = FakePosition()
+    bot.started = []
+
+    def enter_trade(s, signal_time=None):
+        bot.started.append(s)
+        bot._entry_task = TradeEntryTask(trade_entry).start()
+    bot.enter_trade = enter_trade
+    return bot
+
+
+def test_bot_keeps_evaluating_signals_during_an_entry():
+    entry = FakeTradeEntry()
+    bot = create_bot(entry)
+    bot.strategy.signals = [signal(TradeSignals.EnterLong), signal(TradeSignals.Long),
+                            signal(TradeSignals.EnterLong)]
+    bot.run()
+    assert entry.started.wait(5)
+    # The loop is not blocked, and a running entry is not started again
+    bot.run()
+    bot.run()
+    assert len(bot.started) == 1
+    assert not entry.abort_requested()
+
+    entry.release.set()
+    assert bot._entry_task.join(5)
+    assert bot._entry_task.result == (0.01, 40000.0)
+
+
+def test_opposing_signal_aborts_the_entry():
+    entry = FakeTradeEntry(OrderSide.Buy)
+    bot = create_bot(entry)
+    bot.strategy.signals = [signal(TradeSignals.EnterLong), signal(TradeSignals.EnterShort)]
+    bot.run()
+    assert entry.started.wait(5)
+    bot.run()
+    assert entry.abort_requested()
+    assert 'EnterShort' in entry.abort_reason
+    assert bot._entry_task.join(5)
+
+
+def test_finished_entry_frees_the_slot_and_raises_its_error():
+    entry = FakeTradeEntry(error=RuntimeError('order rejected'))
+    entry.release.set()
+    bot = create_bot(entry)
+    bot._entry_task = TradeEntryTask(entry).start()
+    assert bot._entry_task.join(5)
+    with pytest.raises(RuntimeError):
+        bot.check_entry_task(signal(TradeSignals.Long))
+    assert bot._entry_task is None
+
+
+def test_stop_entry_task_waits_for_the_abort():
+    entry = FakeTradeEntry()
+    bot = create_bot(entry)
+    task = bot._entry_task = TradeEntryTask(entry).start()
+    assert entry.started.wait(5)
+    bot.stop_entry_task('Application terminated by user.')
+    assert entry.abort_reason == 'Application terminated by user.'
+    assert not task.is_running()
+    assert bot._entry_task is None
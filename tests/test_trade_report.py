@@ -0,0 +1,139 @@
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+from database.TradeReport import TradeReport
+
+MAKER = TradeReport.MAKER
+TAKER = TradeReport.TAKER
+
+
+def at(hour, minute=0):
+    return dt.datetime(2022, 4, 15, hour, minute)
+
+
+def signals():
+    return pd.DataFrame([
+        {'OrderLinkId': 'S1', 'DateTime': at(10), 'Pair': 'BTCUSDT', 'Strategy': 'A', 'Side': 'Buy',
+         'EntryPrice': 40000.0},
+        {'OrderLinkId': 'S2', 'DateTime': at(11), 'Pair': 'BTCUSDT', 'Strategy': 'B', 'Side': 'Sell',
+         'EntryPrice': 41000.0},
+        # Never filled: not a trade
+        {'OrderLinkId': 'S3', 'DateTime': at(12), 'Pair': 'ETHUSDT', 'Strategy': 'A', 'Side': 'Buy',
+         'EntryPrice': 3000.0},
+    ])
+
+
+def orders():
+    return pd.DataFrame([
+        {'order_id': 'o1', 'order_link_id': 'S1.1', 'created_time': at(10)},
+        {'order_id': 'o2', 'order_link_id': 'S1.TP.1', 'created_time': at(10, 2)},
+        {'order_id': 'o3', 'order_link_id': 'S2.1', 'created_time': at(11)},
+        {'order_id': 'o4', 'order_link_id': None, 'created_time': at(11, 30)},
+        {'order_id': 'o5', 'order_link_id': 'S3.1', 'created_time': at(12)},
+    ])
+
+
+def fill(exec_id, order_id, price, qty, fee, liquidity, time):
+    return {'exec_id': exec_id, 'order_id': order_id, 'symbol': 'BTCUSDT', 'exec_price': price, 'exec_qty': qty,
+            'exec_fee': fee, 'last_liquidity_ind': liquidity, 'trade_time_ms': time}
+
+
+def user_trades(stop_loss=True):
+    fills = [
+        fill('e1', 'o1', 40010.0, 0.01, 0.1, MAKER, at(10, 1)),
+        fill('e2', 'o1', 40030.0, 0.01, 0.1, TAKER, at(10, 2)),
+        fill('e3', 'o2', 40500.0, 0.02, 0.05, MAKER, at(10, 30)),
+        fill('e4', 'o3', 40959.0, 0.01, 0.1, MAKER, at(11, 1)),
+    ]
+    if stop_loss:
+        fills.append(fill('e5', 'o4', 41500.0, 0.01, 0.2, TAKER, at(11, 30)))
+    return pd.DataFrame(fills)
+
+
+def closed_pnl(stop_loss=True):
+    rows = [{'order_id': 'o2', 'symbol': 'BTCUSDT', 'closed_size': 0.02, 'closed_pnl': 9.6, 'created_at': at(10, 30)}]
+    if stop_loss:
+        # The stop loss has no order_link_id: linked to the last trade opened on the pair
+        rows.append({'order_id': 'o4', 'symbol': 'BTCUSDT', 'closed_size': 0.01, 'closed_pnl': -5.41,
+                     'created_at': at(11, 30)})
+    return pd.DataFrame(rows)
+
+
+def by_id(trades):
+    return trades.set_index('OrderLinkId')
+
+
+def test_trades_are_compiled_from_the_fills():
+    trades = by_id(TradeReport.compute_trades(signals(), orders(), user_trades(), closed_pnl()))
+    assert list(trades.index) == ['S1', 'S2']
+
+    s1, s2 = trades.loc['S1'], trades.loc['S2']
+    assert (s1['entry_qty'], s1['avg_entry_price'], s1['exit_qty'], s1['pnl']) == pytest.approx((0.02, 40020, 0.02, 9.6))
+    assert (s1['fees'], s1['maker_qty'], s1['taker_qty'], s1['nb_fills']) == pytest.approx((0.25, 0.03, 0.01, 3))
+    # Bought 20 above the signal price
+    assert s1['slippage_bps'] == pytest.approx(5)
+    # Sold 41 under the signal price
+    assert s2['slippage_bps'] == pytest.approx(10)
+    assert (s2['exit_qty'], s2['pnl'], s2['fees'], s2['nb_fills']) == pytest.approx((0.01, -5.41, 0.3, 2))
+    assert s2['closed_at'] == at(11, 30)
+    assert not trades['is_open'].any()
+
+
+def test_trade_without_exit_is_open():
+    trades = by_id(TradeReport.compute_trades(signals(), orders(), user_trades(stop_loss=False),
+                                              closed_pnl(stop_loss=False)))
+    assert list(trades['is_open']) == [False, True]
+    assert trades.loc['S2', 'exit_qty'] == 0
+    assert pd.isna(trades.loc['S2', 'closed_at'])
+
+
+def test_no_fills_no_trades():
+    assert len(TradeReport.compute_trades(signals(), orders(), user_trades().iloc[:0], closed_pnl())) == 0
+
+
+def test_statistics_and_equity_curve():
+    trades = TradeReport.compute_trades(signals(), orders(), user_trades(), closed_pnl())
+    stats = TradeReport.statistics(trades)
+    assert stats.loc['A', 'trades'] == 1
+    assert (stats.loc['A', 'win_rate'], stats.loc['A', 'expectancy'], stats.loc['A', 'max_drawdown']) == \
+        pytest.approx((1, 9.6, 0))
+    assert stats.loc['A', 'maker_ratio'] == pytest.approx(0.75)
+    assert (stats.loc['B', 'win_rate'], stats.loc['B', 'avg_loss'], stats.loc['B', 'max_drawdown']) == \
+        pytest.approx((0, -5.41, 5.41))
+
+    curve = TradeReport.equity_curve(trades)
+    assert list(curve['OrderLinkId']) == ['S1', 'S2']
+    assert list(curve['equity']) == pytest.approx([9.6, 4.19])
+    assert list(curve['strategy_equity']) == pytest.approx([9.6, -5.41])
+
+
+def test_refresh_restarts_at_the_oldest_open_trade(database, monkeypatch):
+    report = TradeReport(database)
+    tables = {database.TRADE_SIGNALS_TBL_NAME: signals(), database.ORDERS_TBL_NAME: orders(),
+              database.USER_TRADES_TBL_NAME: user_trades(stop_loss=False),
+              database.CLOSED_PNL_TBL_NAME: closed_pnl(stop_loss=False)}
+    reads = []
+
+    def read(table_name, time_column, since):
+        reads.append(since)
+        df = tables[table_name]
+        return df if since is None else df[df[time_column] >= since]
+    monkeypatch.setattr(report, '_read', read)
+
+    report.refresh()
+    assert list(report.load_trades()['is_open']) == [False, True]
+    assert database.get_sync_cursor(report.REPORT_TRADES_TBL_NAME, report.CURSOR_PAIR) \
+        == at(11).timestamp() - database.SYNC_OVERLAP_SECS
+
+    # The stop loss of S2: only the rows since S2 are read again
+    tables[database.USER_TRADES_TBL_NAME] = user_trades()
+    tables[database.CLOSED_PNL_TBL_NAME] = closed_pnl()
+    reads.clear()
+    report.refresh()
+    assert reads == [dt.datetime.fromtimestamp(at(11).timestamp() - database.SYNC_OVERLAP_SECS)] * 4
+    trades = by_id(report.load_trades())
+    assert list(trades.index) == ['S1', 'S2']
+    assert list(trades['is_open']) == [False, False]
+    assert trades.loc['S2', 'pnl'] == pytest.approx(-5.41)
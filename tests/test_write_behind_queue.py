@@ -0,0 +1,104 @@
+import threading
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+
+from database.WriteBehindQueue import WriteBehindQueue
+
+
+class FakeEngine:
+    """ Records the rows written. A row {'bad': True} fails its transaction, like a constraint violation. """
+
+    def __init__(self):
+        self.rows = []
+        self.unreachable = False
+        # Set to block the next transaction until release is set
+        self.entered = threading.Event()
+        self.release = None
+
+    @contextmanager
+    def begin(self):
+        if self.unreachable:
+            raise sa.exc.OperationalError('INSERT', {}, Exception('connection refused'))
+        rows = []
+        yield FakeConnection(rows)
+        if self.release:
+            self.entered.set()
+            self.release.wait(5)
+            self.release = None
+        self.rows.extend(rows)
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, statement, params):
+        for p in params:
+            if p.get('bad'):
+                raise sa.exc.IntegrityError(statement, p, Exception('duplicate key'))
+        self.rows.extend(p['id'] for p in params)
+
+
+STATEMENT = 'INSERT'
+
+
+def create_queue(engine, max_queued=WriteBehindQueue.MAX_QUEUED):
+    # The writer thread never flushes by itself during a test
+    return WriteBehindQueue(engine, batch_size=10 ** 6, flush_secs=3600, retry_secs=3600, max_queued=max_queued)
+
+
+def test_flush_writes_in_order():
+    engine = FakeEngine()
+    queue = create_queue(engine)
+    for i in range(5):
+        queue.put(STATEMENT, {'id': i})
+    assert queue.flush()
+    assert engine.rows == [0, 1, 2, 3, 4]
+    assert queue.size() == 0
+
+
+def test_unreachable_keeps_operations():
+    engine = FakeEngine()
+    queue = create_queue(engine)
+    queue.put(STATEMENT, {'id': 1})
+    engine.unreachable = True
+    assert not queue.flush()
+    assert queue.size() == 1
+    engine.unreachable = False
+    assert queue.flush()
+    assert engine.rows == [1]
+
+
+def test_bad_row_only_drops_itself():
+    engine = FakeEngine()
+    queue = create_queue(engine)
+    queue.put(STATEMENT, {'id': 1})
+    queue.put(STATEMENT, {'id': 2, 'bad': True})
+    queue.put(STATEMENT, {'id': 3})
+    assert queue.flush()
+    assert engine.rows == [1, 3]
+    assert queue.size() == 0
+
+
+def test_overflow_during_flush_keeps_operations_being_written():
+    engine = FakeEngine()
+    queue = create_queue(engine, max_queued=4)
+    for i in range(2):
+        queue.put(STATEMENT, {'id': i})
+
+    engine.release = threading.Event()
+    flush = threading.Thread(target=queue.flush)
+    flush.start()
+    assert engine.entered.wait(5)
+    # Queue full while 0 and 1 are being written: the oldest operation not in the flush is dropped
+    for i in range(2, 6):
+        queue.put(STATEMENT, {'id': i})
+    engine.release.set()
+    flush.join(5)
+
+    assert engine.rows == [0, 1]
+    assert queue.nb_dropped == 2
+    assert queue.flush()
+    assert engine.rows == [0, 1, 4, 5]
+    assert queue.size() == 0
@@ -1,9 +1,9 @@
 import datetime as dt
 import sys
+import threading
 import time
 from abc import ABC, abstractmethod
 
-import pandas as pd
 import telegram
 
 import api_keys
@@ -52,10 +52,17 @@ class BaseTradeEntry(ABC):
         self.sig_stop_loss_amount = self.get_stop_loss(signal['Side'], signal['EntryPrice'])
         self.sig_take_profit_amount = self.get_take_profit(signal['Side'], signal['EntryPrice'])
 
+        # time.perf_counter() when the signal was detected, set by the Bot
+        self.signal_time = None
+
         # Nb of orders composing this entry
         self.nb_orders = 0
         self.nb_tp_orders = 0
 
+        # Set by abort() when the entry runs in a TradeEntryTask and the bot wants it stopped
+        self._abort_event = threading.Event()
+        self.abort_reason = None
+
     @abstractmethod
     def enter_trade(self):
         pass
@@ -64,6 +71,17 @@ class BaseTradeEntry(ABC):
     def get_current_ob_price(self, side):
         pass
 
+    def abort(self, reason):
+        """
+            Request the trade entry to stop as soon as possible.
+            Can be called from another thread, the entry loop checks abort_requested().
+        """
+        self.abort_reason = reason
+        self._abort_event.set()
+
+    def abort_requested(self):
+        return self._abort_event.is_set()
+
     # @classmethod
     # def f_dec(cls, x):
     #     """
@@ -164,6 +182,22 @@ class BaseTradeEntry(ABC):
         result = self._orders.place_order(tp_order, 'TakeProfit')
         return result['order_id'] if result else None
 
+    def place_tp_orders(self, trade_side, tp_levels):
+        """
+            Take profit ladder: one order per (qty, tp_price) of tp_levels, placed in parallel.
+            Returns the order_id of each order, None for a rejected order, the exception of a failed order.
+        """
+        tp_side = OrderSide.Buy if trade_side == OrderSide.Sell else OrderSide.Sell
+        tp_orders = []
+        for qty, tp_price in tp_levels:
+            self.nb_tp_orders += 1
+            order_link_id = f"{self.signal['OrderLinkId']}.TP.{self.nb_tp_orders}"
+            tp_orders.append(Order(side=tp_side, symbol=self.pair, order_type=OrderType.Limit, qty=qty,
+                                   price=tp_price, reduce_only=True, order_link_id=order_link_id))
+        results = self._orders.place_orders(tp_orders, 'TakeProfit', return_exceptions=True)
+        return [result if isinstance(result, Exception) else result['order_id'] if result else None
+                for result in results]
+
     def set_tp_on_executions(self, main_order_id, validate_tp=False):
         """
             Strangely some executions are never received on the websocket. On the final call to set_tp_on_executions()
@@ -243,11 +277,10 @@ class BaseTradeEntry(ABC):
         elif exec_list and not fixed_tp:
             # We are merging qty for executions that have the same price together
             # Group By: order_id, price => sum(exec_qty)
-            df = pd.DataFrame(exec_list)
-            df = df[['order_id', 'price', 'exec_qty']]
-            df_sums = df.groupby(['order_id', 'price']).sum()
-            df_sums.reset_index(inplace=True)
-            grouped_list = df_sums.to_dict('records')
+            grouped_qty = {}
+            for e in exec_list:
+                key = (e['order_id'], e['price'])
+                grouped_qty[key] = grouped_qty.get(key, 0) + float(e['exec_qty'])
 
             # Print executions
             for e in exec_list:
@@ -255,9 +288,16 @@ class BaseTradeEntry(ABC):
                 self._logger.info(
                     f"Execution: {self.signal['Side']} order[{e['order_id'][-8:]}: price={e['price']:.2f}, "
                     f"qty={e['exec_qty']}, cum_qty={round(self.take_profit_cum_qty + qty, 10)}]")
-            # Place merged tp orders
-            for e in grouped_list:
-                qty = round(float(e['exec_qty']), 10)
-                take_profit = self.get_take_profit(self.signal['Side'], float(e['price']))
-                self.place_tp_order(self.signal['Side'], qty, take_profit)
-                self.take_profit_cum_qty = round(self.take_profit_cum_qty + qty, 10)
+            # Place merged tp orders, all the levels at once
+            tp_levels = [(round(qty, 10), self.get_take_profit(self.signal['Side'], float(price)))
+                         for (_, price), qty in grouped_qty.items()]
+            order_ids = self.place_tp_orders(self.signal['Side'], tp_levels)
+            # Only the levels placed are covered, a failed level is raised once the others are recorded
+            errors = []
+            for (qty, _), order_id in zip(tp_levels, order_ids):
+                if isinstance(order_id, Exception):
+                    errors.append(order_id)
+                elif order_id:
+                    self.take_profit_cum_qty = round(self.take_profit_cum_qty + qty, 10)
+            if errors:
+                raise errors[0]
@@ -46,16 +46,38 @@ class LimitEntry(BaseTradeEntry):
         spread = 100000
         price = 0
         while spread > self.spread_tolerance:
-            if side == OrderSide.Buy:
-                ob, spread = self._orderbook.get_top1()
-                price = float(ob[1]['price']) - self.price_delta
-                # print(f"Orderbook spread={spread} sellers top [{ob[1]['price']}]. Tentative Price: {price}")
-            else:
-                ob, spread = self._orderbook.get_top1()
-                price = float(ob[0]['price']) + self.price_delta
-                # print(f"Orderbook spread={spread}, buyers top [{ob[0]['price']}]. Tentative Price: {price}")
+            ob, spread = self._orderbook.get_top1()
+            price = self.price_from_top(side, float(ob[0]['price']), float(ob[1]['price']), self.price_delta)
+            # print(f"Orderbook spread={spread} top [{ob[0]['price']}, {ob[1]['price']}]. Tentative Price: {price}")
+        return price
+
+    # The repricing and abort rules below are static so the replay simulator
+    # (trade_entry/LimitEntrySimulator.py) applies exactly the same logic.
+
+    @staticmethod
+    def price_from_top(side, best_bid, best_ask, price_delta):
+        """
+            Price of the PostOnly order for a given top of the orderbook: price_delta away from the opposite side.
+            With a 1 tick spread the order joins the best level on our side.
+        """
+        if side == OrderSide.Buy:
+            price = best_ask - price_delta
+        else:
+            price = best_bid + price_delta
         return round(price, 10)  # We need to round to avoid: 3323.05 - 0.05 = 3323.0499999999997
 
+    @staticmethod
+    def is_better_price(side, new_price, cur_price):
+        return (side == OrderSide.Buy and new_price > cur_price) or (side == OrderSide.Sell and new_price < cur_price)
+
+    @staticmethod
+    def time_abort_crossed(elapsed_time, abort_seconds):
+        return round(elapsed_time, 1) > abort_seconds
+
+    @staticmethod
+    def price_abort_crossed(current_price, trade_start_price, abort_price_diff):
+        return abs(round(current_price - trade_start_price, 2)) > abort_price_diff
+
     def place_limit_order(self):
         """
             The first time we place a limit order for this trade entry, trade_start_price=0.
@@ -88,6 +110,8 @@ class LimitEntry(BaseTradeEntry):
             stop_loss=stop_loss,
             order_link_id=order_link_id
         )
+        if self.nb_orders == 1:
+            order.signal_time = self.signal_time
         order.order_id = self._orders.place_order(order, 'TradeEntry')['order_id']
         time.sleep(self.PAUSE_TIME)
         return order
@@ -96,8 +120,7 @@ class LimitEntry(BaseTradeEntry):
         new_entry_price = self.get_entry_price(self.signal['Side'])
         new_stop_loss = self.get_stop_loss(self.signal['Side'], new_entry_price)
         # Re-validate that the update is really required
-        if (self.signal['Side'] == OrderSide.Buy and new_entry_price > cur_order_price) \
-                or (self.signal['Side'] == OrderSide.Sell and new_entry_price < cur_order_price):
+        if self.is_better_price(self.signal['Side'], new_entry_price, cur_order_price):
             result = self._exchange.replace_active_order(
                 symbol=self.pair,
                 order_id=order_id,
@@ -156,10 +179,9 @@ class LimitEntry(BaseTradeEntry):
 
             elapsed_time = time.time() - start_time
             current_price = self.get_current_ob_price(self.signal['Side'])
-            price_diff = abs(round(current_price - trade_start_price, 2))
 
             # Crossed time threshold, abort.
-            if round(elapsed_time, 1) > self.abort_seconds:
+            if self.time_abort_crossed(elapsed_time, self.abort_seconds):
                 status = self.cancel_order(order_id)
                 if status == OrderStatus.Cancelled:
                     self.adjust_tp_order(order_id)
@@ -176,7 +198,7 @@ class LimitEntry(BaseTradeEntry):
                     break
 
             # Crossed price threshold, abort.
-            if price_diff > abort_price_diff:
+            if self.price_abort_crossed(current_price, trade_start_price, abort_price_diff):
                 status = self.cancel_order(order_id)
                 if status == OrderStatus.Cancelled:
                     self.adjust_tp_order(order_id)
@@ -198,6 +220,15 @@ class LimitEntry(BaseTradeEntry):
                                           f'abort_price={abort_price:.2f}')
                     break
 
+            # Abort requested by the bot (ex: new opposing signal), abort.
+            if self.abort_requested():
+                status = self.cancel_order(order_id)
+                if status == OrderStatus.Cancelled:
+                    self.adjust_tp_order(order_id)
+                    cum_trade_qty += cum_exec_qty
+                    self._logger.info(f'{self.side_l_s} Limit Entry Aborting. {self.abort_reason}')
+                    break
+
             # Check order status and take action
             # Order Statuses: Created, New, PartiallyFilled, Filled, Rejected, PendingCancel, Cancelled
             match order_status:
@@ -233,6 +264,12 @@ class LimitEntry(BaseTradeEntry):
                     #                        f'take_profit_cum_qty={self.take_profit_cum_qty}')
                     #     raise AssertionError
 
+                    # Do not place a new order if the bot asked for the entry to stop
+                    if self.abort_requested():
+                        self._logger.info(f"{order_status} {self.side_l_s} Order[{order_id[-8:]}: "
+                                          f"qty={cum_exec_qty}/{order_qty}]. Limit Entry Aborting. {self.abort_reason}")
+                        break
+
                     ob_price = self.get_current_ob_price(self.signal['Side'])
                     self._logger.info(
                         f"{order_status} {self.side_l_s} Order[{order_id[-8:]}: qty={cum_exec_qty}/{order_qty}, "
@@ -353,7 +390,6 @@ class LimitEntry(BaseTradeEntry):
                                   f"qty={self.take_profit_cum_qty}, tp_price={self.sig_take_profit_amount:.2f}]")
 
 
-
 """
     Testing Limit Order Trade Entries
 """
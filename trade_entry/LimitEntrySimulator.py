@@ -0,0 +1,406 @@
+"""
+    Queue-position aware replay of LimitEntry maker entries on recorded orderbook data.
+
+    A candle backtest cannot tell if a PostOnly order at top +/- tick_size would have been filled before
+    the abort_time_candle_ratio/abort_price_pct thresholds. This simulator replays the recorded
+    orderBookL2_25 deltas and trades, and runs the LimitEntry rules on them:
+     - the order price is LimitEntry.price_from_top(), only placed when the spread <= spread_tolerance
+     - the order is amended when LimitEntry.is_better_price(), every reprice_secs (LimitEntry.PAUSE_TIME)
+     - the entry aborts on LimitEntry.time_abort_crossed() / LimitEntry.price_abort_crossed()
+     - a PostOnly order or amend that would take liquidity is cancelled and placed again
+
+    Queue position: a new order joins the back of its price level. Trades at our price consume the queue
+    ahead of us first. Size removed from the level without trades (cancels) reduces the queue ahead
+    proportionally. A trade through our price, or the opposite side reaching our price, fills the rest.
+    Orders and amends reach the book after latency_secs.
+
+    The input is an iterable of (timestamp, message) where message is the parsed websocket message of the
+    orderBookL2_25.<pair> and trade.<pair> topics. read_messages() reads them from a MarketDataRecorder
+    recording (.mdl), or a .jsonl or .jsonl.gz file with one {"ts": <seconds>, "msg": <message>} per line.
+
+    Usage:
+        python -m trade_entry.LimitEntrySimulator BTCUSDT data/BTCUSDT.jsonl.gz --every-secs 300 --qty 0.01
+"""
+import argparse
+import gzip
+import time
+
+import pandas as pd
+import rapidjson
+
+import utils
+from Configuration import Configuration
+from enums.BybitEnums import OrderSide
+from exchange.MarketDataRecorder import MarketDataReader
+from trade_entry.BaseTradeEntry import BaseTradeEntry
+from trade_entry.LimitEntry import LimitEntry
+
+
+def read_messages(path, topics=None):
+    """ Yields (timestamp, message) from a MarketDataRecorder .mdl recording, or a .jsonl or .jsonl.gz file """
+    if path.endswith('.mdl'):
+        for ts, source, topic, message in MarketDataReader(path).read(sources=['public'], topics=topics):
+            yield ts, rapidjson.loads(message)
+        return
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as f:
+        for line in f:
+            record = rapidjson.loads(line)
+            yield record['ts'], record['msg']
+
+
+class SimulatedEntry:
+    """ State of one simulated LimitEntry. Prices are floats as returned by LimitEntry.price_from_top(). """
+    # States
+    Waiting = 'Waiting'    # Signal received, waiting for spread <= spread_tolerance
+    Pending = 'Pending'    # Order sent, not in the book yet
+    Live = 'Live'          # Order resting in the book
+    Done = 'Done'
+
+    def __init__(self, signal_ts, side, qty, ref_price):
+        self.signal_ts = signal_ts
+        self.side = side
+        self.qty = qty
+        self.ref_price = ref_price
+        self.state = self.Waiting
+
+        self.start_ts = None
+        self.trade_start_price = None
+        self.abort_price_diff = None
+        self.price = None
+        self.pending_price = None
+        self.pending_ts = None
+        self.next_check_ts = signal_ts
+
+        self.queue_ahead = 0.0
+        self.level_size = 0.0
+
+        self.filled_qty = 0.0
+        self.filled_value = 0.0
+        self.first_fill_ts = None
+        self.end_ts = None
+        self.outcome = None
+        self.nb_orders = 0
+        self.nb_amends = 0
+        self.nb_rejects = 0
+
+    def remaining(self):
+        return self.qty - self.filled_qty
+
+    def fill(self, ts, qty):
+        qty = min(qty, self.remaining())
+        if qty <= 0:
+            return
+        if self.first_fill_ts is None:
+            self.first_fill_ts = ts
+        self.filled_qty += qty
+        self.filled_value += qty * self.price
+        if self.remaining() <= 1e-12:
+            self.finish(ts, 'filled')
+
+    def finish(self, ts, outcome):
+        self.state = self.Done
+        self.end_ts = ts
+        self.outcome = outcome
+
+    def result(self):
+        avg_price = self.filled_value / self.filled_qty if self.filled_qty else None
+        if avg_price is None:
+            slippage = None
+        elif self.side == OrderSide.Buy:
+            slippage = avg_price - self.ref_price
+        else:
+            slippage = self.ref_price - avg_price
+        return {
+            'signal_time': self.signal_ts,
+            'side': self.side,
+            'outcome': self.outcome,
+            'qty': self.qty,
+            'filled_qty': round(self.filled_qty, 10),
+            'fill_ratio': self.filled_qty / self.qty,
+            'ref_price': self.ref_price,
+            'avg_price': avg_price,
+            'slippage': slippage,
+            'slippage_bps': slippage / self.ref_price * 10000 if slippage is not None else None,
+            'time_to_first_fill': self.first_fill_ts - self.signal_ts if self.first_fill_ts else None,
+            'time_to_fill': self.end_ts - self.signal_ts if self.outcome == 'filled' else None,
+            'duration': self.end_ts - self.signal_ts,
+            'nb_orders': self.nb_orders,
+            'nb_amends': self.nb_amends,
+            'nb_rejects': self.nb_rejects
+        }
+
+
+class LimitEntrySimulator:
+
+    def __init__(self, pair, tick_size, interval=None, abort_time_candle_ratio=None, abort_price_pct=None,
+                 latency_secs=0.05, reprice_secs=BaseTradeEntry.PAUSE_TIME):
+        """
+            Thresholds default to the values of the configuration, like LimitEntry.
+            latency_secs: delay before an order or amend reaches the book
+            reprice_secs: delay between 2 iterations of the LimitEntry loop (repricing and abort checks)
+        """
+        config = Configuration.get_config()
+        interval = interval if interval else config['trading']['interval']
+        if abort_time_candle_ratio is None:
+            abort_time_candle_ratio = float(config['limit_entry']['abort_time_candle_ratio'])
+        if abort_price_pct is None:
+            abort_price_pct = float(config['limit_entry']['abort_price_pct'])
+
+        self.pair = pair
+        self.orderbook_topic = f'orderBookL2_25.{pair}'
+        self.trade_topic = f'trade.{pair}'
+        self.tick_size = float(tick_size)
+        # Same values as LimitEntry.__init__()
+        self.price_delta = self.tick_size
+        self.spread_tolerance = float(self.price_delta * 2)
+        self.abort_seconds = utils.convert_interval_to_sec(interval) * float(abort_time_candle_ratio)
+        self.abort_price_pct = float(abort_price_pct) / 100
+        self.latency_secs = latency_secs
+        self.reprice_secs = reprice_secs
+
+        self.bids = {}
+        self.asks = {}
+        self.best_bid = 0.0
+        self.best_ask = 0.0
+
+    def run(self, messages, signals, qty):
+        """
+            messages: iterable of (timestamp, message), sorted by timestamp
+            signals: list of (timestamp, side)
+            Returns a DataFrame with one row per simulated entry.
+        """
+        signals = sorted(signals)
+        next_signal = 0
+        active = []
+        results = []
+        last_ts = None
+
+        for ts, msg in messages:
+            last_ts = ts
+            topic = msg.get('topic')
+            if topic == self.orderbook_topic:
+                self._apply_book(msg)
+                for entry in active:
+                    if entry.state == SimulatedEntry.Live:
+                        self._on_book(entry, ts)
+            elif topic == self.trade_topic:
+                for trade in msg['data']:
+                    price = float(trade['price'])
+                    size = float(trade['size'])
+                    for entry in active:
+                        if entry.state == SimulatedEntry.Live and trade['side'] != entry.side:
+                            self._on_trade(entry, ts, price, size)
+            else:
+                continue
+
+            if not self.best_bid or not self.best_ask:
+                continue
+
+            while next_signal < len(signals) and signals[next_signal][0] <= ts:
+                signal_ts, side = signals[next_signal]
+                next_signal += 1
+                active.append(SimulatedEntry(signal_ts, side, qty, (self.best_bid + self.best_ask) / 2))
+
+            for entry in active:
+                if entry.state == SimulatedEntry.Pending and ts >= entry.pending_ts:
+                    self._order_reaches_book(entry, ts)
+                if entry.state != SimulatedEntry.Done and ts >= entry.next_check_ts:
+                    self._loop_iteration(entry, ts)
+
+            if any(entry.state == SimulatedEntry.Done for entry in active):
+                results.extend(e.result() for e in active if e.state == SimulatedEntry.Done)
+                active = [e for e in active if e.state != SimulatedEntry.Done]
+
+        for entry in active:
+            entry.finish(last_ts, 'end_of_data')
+            results.append(entry.result())
+        return pd.DataFrame(results)
+
+    """
+        ----------------------------------------------------------------------------
+           Orderbook
+        ----------------------------------------------------------------------------
+    """
+
+    def _apply_book(self, msg):
+        bids = self.bids
+        asks = self.asks
+        if msg['type'] == 'snapshot':
+            bids.clear()
+            asks.clear()
+            for entry in msg['data']['order_book']:
+                (bids if entry['side'] == OrderSide.Buy else asks)[float(entry['price'])] = float(entry['size'])
+        else:
+            data = msg['data']
+            for entry in data['delete']:
+                (bids if entry['side'] == OrderSide.Buy else asks).pop(float(entry['price']), None)
+            for entry in data['update']:
+                (bids if entry['side'] == OrderSide.Buy else asks)[float(entry['price'])] = float(entry['size'])
+            for entry in data['insert']:
+                (bids if entry['side'] == OrderSide.Buy else asks)[float(entry['price'])] = float(entry['size'])
+        self.best_bid = max(bids) if bids else 0.0
+        self.best_ask = min(asks) if asks else 0.0
+
+    def _displayed_size(self, side, price):
+        return (self.bids if side == OrderSide.Buy else self.asks).get(price, 0.0)
+
+    def _crosses(self, side, price):
+        """ The order would take liquidity """
+        return (side == OrderSide.Buy and price >= self.best_ask) or (side == OrderSide.Sell and price <= self.best_bid)
+
+    """
+        ----------------------------------------------------------------------------
+           Entry Simulation
+        ----------------------------------------------------------------------------
+    """
+
+    def _entry_price(self, side):
+        """ LimitEntry.get_entry_price() without the wait: None while the spread is too large """
+        if self.best_ask - self.best_bid > self.spread_tolerance:
+            return None
+        return LimitEntry.price_from_top(side, self.best_bid, self.best_ask, self.price_delta)
+
+    def _send_order(self, entry, ts, price, amend=False):
+        entry.pending_price = price
+        entry.pending_ts = ts + self.latency_secs
+        if amend:
+            entry.nb_amends += 1
+        else:
+            entry.nb_orders += 1
+            entry.state = SimulatedEntry.Pending
+
+    def _order_reaches_book(self, entry, ts):
+        """ New order or amend arriving at the exchange """
+        price = entry.pending_price
+        entry.pending_price = None
+        entry.pending_ts = None
+        if self._crosses(entry.side, price):
+            # PostOnly cancelled, LimitEntry places a new order
+            entry.nb_rejects += 1
+            entry.state = SimulatedEntry.Waiting
+            return
+        entry.price = price
+        entry.state = SimulatedEntry.Live
+        entry.level_size = self._displayed_size(entry.side, price)
+        entry.queue_ahead = entry.level_size
+
+    def _loop_iteration(self, entry, ts):
+        """ One iteration of the LimitEntry.enter_trade() loop """
+        entry.next_check_ts = ts + self.reprice_secs
+
+        if entry.start_ts is not None:
+            current_price = self.best_ask if entry.side == OrderSide.Buy else self.best_bid
+            if LimitEntry.time_abort_crossed(ts - entry.start_ts, self.abort_seconds):
+                entry.finish(ts, 'abort_time')
+                return
+            if LimitEntry.price_abort_crossed(current_price, entry.trade_start_price, entry.abort_price_diff):
+                entry.finish(ts, 'abort_price')
+                return
+
+        if entry.state == SimulatedEntry.Waiting:
+            price = self._entry_price(entry.side)
+            if price is not None:
+                if entry.start_ts is None:
+                    entry.start_ts = ts
+                    entry.trade_start_price = price
+                    entry.abort_price_diff = round(self.abort_price_pct * price, 2)
+                self._send_order(entry, ts, price)
+        elif entry.state == SimulatedEntry.Live and entry.pending_price is None:
+            price = self._entry_price(entry.side)
+            if price is not None and LimitEntry.is_better_price(entry.side, price, entry.price):
+                self._send_order(entry, ts, price, amend=True)
+        elif entry.state == SimulatedEntry.Live and ts >= entry.pending_ts:
+            self._order_reaches_book(entry, ts)
+
+    def _on_book(self, entry, ts):
+        if entry.pending_price is not None and ts >= entry.pending_ts:
+            self._order_reaches_book(entry, ts)
+            if entry.state != SimulatedEntry.Live:
+                return
+
+        # Opposite side reached our price
+        if self._crosses(entry.side, entry.price):
+            entry.fill(ts, entry.remaining())
+            return
+
+        # Size removed without trades at our level are cancels, spread evenly in the queue
+        size = self._displayed_size(entry.side, entry.price)
+        if size < entry.level_size and entry.level_size > 0:
+            entry.queue_ahead *= size / entry.level_size
+        entry.level_size = size
+
+    def _on_trade(self, entry, ts, price, size):
+        """ Trade by a taker on the opposite side of the entry """
+        if (entry.side == OrderSide.Buy and price < entry.price) or \
+                (entry.side == OrderSide.Sell and price > entry.price):
+            entry.fill(ts, entry.remaining())
+        elif price == entry.price:
+            consumed = min(size, entry.queue_ahead)
+            entry.queue_ahead -= consumed
+            entry.level_size = max(0.0, entry.level_size - size)
+            if size > consumed:
+                entry.fill(ts, size - consumed)
+
+
+def summarize(df):
+    """ Fill probability, time-to-fill and slippage distributions of the simulated entries """
+    percentiles = [0.1, 0.25, 0.5, 0.75, 0.9]
+    summary = []
+    for side, side_df in df.groupby('side'):
+        summary.append(f'\n{side}: {len(side_df)} entries')
+        summary.append(f"Fill probability: {(side_df['outcome'] == 'filled').mean():.1%}, "
+                       f"partial or full fill: {(side_df['filled_qty'] > 0).mean():.1%}")
+        summary.append(f"Outcomes: {side_df['outcome'].value_counts().to_dict()}")
+        summary.append(side_df[['time_to_first_fill', 'time_to_fill', 'slippage', 'slippage_bps', 'nb_amends']]
+                       .describe(percentiles=percentiles).round(3).to_string())
+    return '\n'.join(summary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded orderbook data through the LimitEntry logic.')
+    parser.add_argument('pair')
+    parser.add_argument('file', help='recorded messages, .mdl, .jsonl or .jsonl.gz')
+    parser.add_argument('--tick-size', type=float, default=0.5)
+    parser.add_argument('--qty', type=float, default=0.01)
+    parser.add_argument('--every-secs', type=float, default=300, help='one Buy and one Sell signal every x seconds')
+    parser.add_argument('--interval', default=None)
+    parser.add_argument('--abort-time-candle-ratio', type=float, default=None)
+    parser.add_argument('--abort-price-pct', type=float, default=None)
+    parser.add_argument('--latency-secs', type=float, default=0.05)
+    parser.add_argument('--reprice-secs', type=float, default=BaseTradeEntry.PAUSE_TIME)
+    parser.add_argument('--output', default=None, help='csv file for the simulated entries')
+    args = parser.parse_args()
+
+    simulator = LimitEntrySimulator(args.pair, args.tick_size, interval=args.interval,
+                                    abort_time_candle_ratio=args.abort_time_candle_ratio,
+                                    abort_price_pct=args.abort_price_pct, latency_secs=args.latency_secs,
+                                    reprice_secs=args.reprice_secs)
+
+    # The signal times need the time range of the file
+    first_ts = last_ts = None
+    for ts, _ in read_messages(args.file):
+        first_ts = ts if first_ts is None else first_ts
+        last_ts = ts
+    if first_ts is None:
+        print(f'No data in {args.file}.')
+        return
+    signals = []
+    ts = first_ts + args.every_secs
+    while ts < last_ts:
+        signals.extend([(ts, OrderSide.Buy), (ts, OrderSide.Sell)])
+        ts += args.every_secs
+
+    start = time.time()
+    df = simulator.run(read_messages(args.file, topics=[simulator.orderbook_topic, simulator.trade_topic]),
+                       signals, args.qty)
+    print(f'Replayed {utils.seconds_to_human_readable(last_ts - first_ts)} of data, {len(df)} entries '
+          f'in {time.time() - start:.1f}s.')
+    if len(df):
+        print(summarize(df))
+        if args.output:
+            df.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -79,6 +79,8 @@ class MarketEntry(BaseTradeEntry):
         order_link_id = f"{self.signal['OrderLinkId']}.{self.nb_orders}"
         order = Order(side=side, symbol=self.pair, order_type=OrderType.Market, qty=qty,
                       price=price, stop_loss=stop_loss, order_link_id=order_link_id)
+        if self.nb_orders == 1:
+            order.signal_time = self.signal_time
         order_id = self._orders.place_order(order, 'TradeEntry')['order_id']
         return order_id
 
@@ -0,0 +1,71 @@
+import threading
+import time
+
+from enums.BybitEnums import OrderSide
+from logging_.Logger import Logger
+
+
+class TradeEntryTask:
+    """
+        Runs a trade entry (LimitEntry, MarketEntry) in a background thread.
+
+        A maker entry can last up to abort_time_candle_ratio x interval. Running it in
+        the background lets the bot main loop keep consuming candles and evaluating
+        signals while the entry is in progress. The main loop polls the task with
+        is_running() and can ask the entry to abort with cancel(), for example when
+        a new opposing signal is received.
+    """
+
+    def __init__(self, trade_entry):
+        self._logger = Logger.get_module_logger(__name__)
+        self.trade_entry = trade_entry
+        self.signal = trade_entry.signal
+        self.side = self.signal['Side']
+        self.side_l_s = 'Long' if self.side == OrderSide.Buy else 'Short'
+
+        # Values returned by trade_entry.enter_trade(): (qty, avg_price)
+        self.result = None
+        # Exception raised by the trade entry, if any. Re-raised in the main thread by the bot.
+        self.exception = None
+
+        self.start_time = 0.0
+        self.end_time = 0.0
+        self._thread = threading.Thread(target=self._run, name=f"TradeEntry-{self.signal['OrderLinkId']}")
+        self._thread.daemon = True
+
+    def start(self):
+        self.start_time = time.time()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.result = self.trade_entry.enter_trade()
+        except Exception as e:
+            self._logger.exception(e)
+            self.exception = e
+        finally:
+            self.end_time = time.time()
+
+    def is_running(self):
+        return self._thread.is_alive()
+
+    def is_cancelled(self):
+        return self.trade_entry.abort_requested()
+
+    def cancel(self, reason):
+        """
+            Ask the trade entry to abort. The entry cancels its active order at the next iteration of
+            its loop and keeps the take profit order(s) of what has already been filled.
+        """
+        if self.is_running() and not self.is_cancelled():
+            self._logger.info(f'Requesting {self.side_l_s} trade entry abort: {reason}')
+            self.trade_entry.abort(reason)
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+        return not self.is_running()
+
+    def elapsed_time(self):
+        end_time = self.end_time if self.end_time else time.time()
+        return end_time - self.start_time